@@ -9,6 +9,7 @@ DATA_DIR = os.path.join(BASE_DIR, 'data')
 DB_PATH = os.path.join(DATA_DIR, 'course_system.db')
 VECTOR_DB_PATH = os.path.join(DATA_DIR, 'vector_store')
 UPLOAD_DIR = os.path.join(DATA_DIR, 'uploads')
+UPLOAD_OBJECTS_DIR = os.path.join(UPLOAD_DIR, 'objects')  # 按内容SHA-256存放的上传文件
 
 # 创建必要的目录
 os.makedirs(DATA_DIR, exist_ok=True)
@@ -18,23 +19,88 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 # DeepSeek API配置
 DEEPSEEK_API_KEY = "XXXXXXXX"  # 需要用户填写
 DEEPSEEK_API_BASE = "https://api.deepseek.com/v1"
+DEEPSEEK_MODEL = "deepseek-chat"
 
 # 数据库配置
 DATABASE_URL = f"sqlite:///{DB_PATH}"
+DB_PROFILE = "performance"  # SQLite连接参数方案，见 DB_PROFILES
+DB_PROFILES = {
+    # WAL模式下读写互不阻塞；synchronous=NORMAL 时提交不再每次fsync（断电可能丢失最近的提交，但不会损坏数据库）
+    'performance': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,  # 负数表示KB，约64MB
+        'mmap_size': 256 * 1024 * 1024,
+        'busy_timeout': 5000,  # 毫秒
+        'temp_store': 'MEMORY',
+    },
+    # WAL模式但每次提交都fsync
+    'safe': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'busy_timeout': 5000,
+    },
+    # SQLite默认设置
+    'default': {},
+}
+DB_POOL_SIZE = 5  # 连接池保持的连接数
+DB_MAX_OVERFLOW = 10  # 连接池满时允许额外创建的连接数
+DB_POOL_TIMEOUT = 30  # 等待空闲连接的超时（秒）
 
 # GUI配置
 WINDOW_WIDTH = 1200
 WINDOW_HEIGHT = 800
 THEME = "dark-blue"
+UI_LOADER_THREADS = 4  # 界面后台加载数据的线程数
+UI_POLL_INTERVAL = 50  # 界面线程检查后台任务结果的间隔（毫秒）
 
 # AI配置
 MAX_TOKENS = 2000
 TEMPERATURE = 0.7
+AI_MAX_CONCURRENCY = 8  # 同时进行的AI请求数上限
+AI_REQUEST_TIMEOUT = 60  # 单次AI请求超时（秒）
+AI_MAX_RETRIES = 2  # 网络错误或限流时的重试次数
+AI_GRADING_BATCH_SIZE = 5  # 主观题批改时每次请求包含的题目数
+AI_QUIZ_BATCH_SIZE = 5  # 生成测验时每次请求生成的题目数
 EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_BACKEND = "hash"  # 'hash': 本地哈希向量化；'api': 调用Embedding接口（不可用时自动退回本地）
+EMBEDDING_DIM = 256  # 本地哈希向量维度
+EMBEDDING_API_KEY = DEEPSEEK_API_KEY
+EMBEDDING_API_BASE = DEEPSEEK_API_BASE
+EMBEDDING_BATCH_SIZE = 64
+
+# AI回复缓存配置
+AI_CACHE_ENABLED = True
+AI_CACHE_PATH = os.path.join(DATA_DIR, 'ai_cache.db')
+AI_CACHE_MAX_ENTRIES = 5000  # 超出后按最久未访问淘汰
+AI_CACHE_TTL = 7 * 24 * 3600  # 秒
+AI_CACHE_MAX_TEMPERATURE = 0.3  # 温度不高于此值的调用默认缓存
+
+# 相似问题复用配置
+QA_DEDUP_ENABLED = True
+# 语义复用的余弦相似度阈值，只在使用 api 向量化器时生效，需用实测数据确定；
+# None 时只复用归一化后完全相同的问题（本地哈希向量只反映字面相似，
+# "list和tuple的区别"与"list和dict的区别"相似度约0.86，不能用于判断语义）
+QA_DEDUP_THRESHOLD = None
+
+# 文档导入配置
+SUPPORTED_DOCUMENT_TYPES = ('.pdf', '.docx', '.txt')
+EXTRACT_WORKERS = None  # 批量导入时提取文本的进程数，None 为CPU核数
+PDF_PAGES_PER_TASK = 50  # 批量导入时大PDF按此页数拆分给多个进程
+
+# 检索配置
+CHUNK_SIZE = 500  # 文档分块大小（字符数）
+CHUNK_OVERLAP = 50  # 相邻分块重叠字符数
+CHUNK_FLUSH_SIZE = 500  # 切分文档时每积累这么多片段写入一次数据库
+RETRIEVAL_TOP_K = 8  # 每次检索最多选取的片段数
+BM25_K1 = 1.5
+BM25_B = 0.75
+RETRIEVAL_INDEX_CACHE_SIZE = 16  # 内存中缓存的课程索引数
 
 # 测验配置
 QUIZ_QUESTION_COUNT = 10
 QUIZ_TIME_LIMIT = 30  # 分钟
+QUIZ_DEDUP_THRESHOLD = 0.9  # 生成的题目之间余弦相似度不低于此值时视为重复
 
 # 角色定义
 ROLE_STUDENT = "student"
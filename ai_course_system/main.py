@@ -3,6 +3,7 @@ AI线上课程系统 - 主程序入口（修复版）
 """
 import sys
 import os
+import multiprocessing
 
 # 获取程序运行目录（支持打包后的exe）
 if getattr(sys, 'frozen', False):
@@ -94,4 +95,5 @@ def main():
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()
@@ -3,12 +3,12 @@
 """
 from .database import Base, engine, SessionLocal, init_db
 from .user import User
-from .course import Course, CourseEnrollment, CourseDocument
+from .course import Course, CourseEnrollment, CourseDocument, DocumentContent, DocumentChunk
 from .qa import QARecord
 from .quiz import Quiz, Question, QuizAttempt, Answer
 
 __all__ = [
     'Base', 'engine', 'SessionLocal', 'init_db',
-    'User', 'Course', 'CourseEnrollment', 'CourseDocument',
+    'User', 'Course', 'CourseEnrollment', 'CourseDocument', 'DocumentContent', 'DocumentChunk',
     'QARecord', 'Quiz', 'Question', 'QuizAttempt', 'Answer'
 ]
@@ -1,7 +1,8 @@
 """
 课程相关模型
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+import zlib
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, LargeBinary, Boolean
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -9,6 +10,9 @@ from .database import Base
 
 class Course(Base):
     __tablename__ = 'courses'
+    __table_args__ = (
+        Index('ix_courses_teacher_id', 'teacher_id'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(100), nullable=False)
@@ -31,6 +35,11 @@ class Course(Base):
 class CourseEnrollment(Base):
     """课程选课关系表"""
     __tablename__ = 'course_enrollments'
+    __table_args__ = (
+        # 同一学生对同一课程只能有一条选课记录
+        Index('uq_course_enrollments_student_course', 'student_id', 'course_id', unique=True),
+        Index('ix_course_enrollments_course_id', 'course_id'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     student_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -46,19 +55,121 @@ class CourseEnrollment(Base):
 
 
 class CourseDocument(Base):
-    """课程文档表"""
+    """
+    课程文档表
+
+    提取的文本压缩后单独存放在 document_contents 表中，只在访问 content 时读取，
+    查询文档列表时不会读取文本。
+    """
     __tablename__ = 'course_documents'
+    __table_args__ = (
+        Index('ix_course_documents_course_id', 'course_id'),
+        Index('ix_course_documents_content_hash', 'content_hash'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     course_id = Column(Integer, ForeignKey('courses.id'), nullable=False)
     filename = Column(String(255), nullable=False)
     filepath = Column(String(500), nullable=False)
     file_type = Column(String(20))  # 'pdf', 'docx', 'txt'
-    content = Column(Text)  # 提取的文本内容
+    content_hash = Column(String(64))  # 文件内容的SHA-256，相同文件复用提取与索引结果
+    extracted = Column(Boolean)  # 文本是否提取成功，只有提取成功的文档会被复用（旧文档为 NULL）
     uploaded_at = Column(DateTime, default=datetime.now)
 
     # 关系
     course = relationship("Course", back_populates="documents")
+    # 片段由索引服务批量删除，删除文档时不再逐条删除
+    chunks = relationship("DocumentChunk", back_populates="document", cascade="save-update, merge", passive_deletes='all')
+    # 删除文档时不加载文本，由服务层批量删除
+    body = relationship("DocumentContent", uselist=False, cascade="save-update, merge", passive_deletes='all')
+
+    @property
+    def content(self):
+        """提取的文本内容（首次访问时读取并解压）"""
+        return self.body.text if self.body is not None else None
+
+    @content.setter
+    def content(self, value):
+        if self.body is None:
+            self.body = DocumentContent(text=value)
+        else:
+            self.body.text = value
 
     def __repr__(self):
         return f"<CourseDocument(id={self.id}, filename='{self.filename}')>"
+
+
+class DocumentContent(Base):
+    """文档文本表（zlib压缩的UTF-8文本）"""
+    __tablename__ = 'document_contents'
+
+    document_id = Column(Integer, ForeignKey('course_documents.id'), primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+
+    def __init__(self, text=None, **kwargs):
+        super().__init__(**kwargs)
+        if text is not None:
+            self.text = text
+
+    @staticmethod
+    def compress(text):
+        """压缩文本"""
+        return zlib.compress(text.encode('utf-8'))
+
+    @staticmethod
+    def decompress(data):
+        """解压文本"""
+        return zlib.decompress(data).decode('utf-8')
+
+    @staticmethod
+    def compress_segments(segments, blocks):
+        """
+        逐段压缩文本，不拼接完整文本
+
+        原样产出各段，压缩后的数据块追加到 blocks；全部产出后 b"".join(blocks) 即为压缩数据。
+
+        Args:
+            segments: 文本分段
+            blocks: 接收压缩数据块的列表
+
+        Yields:
+            str: 原样产出的文本分段
+        """
+        compressor = zlib.compressobj()
+        for segment in segments:
+            block = compressor.compress(segment.encode('utf-8'))
+            if block:
+                blocks.append(block)
+            yield segment
+        blocks.append(compressor.flush())
+
+    @property
+    def text(self):
+        return self.decompress(self.data)
+
+    @text.setter
+    def text(self, value):
+        self.data = self.compress(value or "")
+
+    def __repr__(self):
+        return f"<DocumentContent(document_id={self.document_id}, size={len(self.data or b'')})>"
+
+
+class DocumentChunk(Base):
+    """文档检索片段表（上传时预先切分并统计词频）"""
+    __tablename__ = 'document_chunks'
+    # 片段ID只增不减（不复用已删除的ID），检索服务以 (片段数, 最大片段ID) 判断索引是否变化
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    document_id = Column(Integer, ForeignKey('course_documents.id'), nullable=False, index=True)
+    course_id = Column(Integer, ForeignKey('courses.id'), nullable=False, index=True)
+    chunk_index = Column(Integer, nullable=False)  # 片段在文档中的序号
+    text = Column(Text, nullable=False)
+    term_freqs = Column(Text)  # JSON格式存储词频
+
+    # 关系
+    document = relationship("CourseDocument", back_populates="chunks")
+
+    def __repr__(self):
+        return f"<DocumentChunk(document_id={self.document_id}, chunk_index={self.chunk_index})>"
@@ -1,28 +1,75 @@
 """
 数据库基础配置
 """
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import DATABASE_URL
+from config import (DATABASE_URL, DB_PROFILE, DB_PROFILES,
+                    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT)
+
+
+def create_db_engine(url=DATABASE_URL, profile=DB_PROFILE):
+    """
+    创建数据库引擎，并在每个新连接上应用 SQLite 参数方案
+
+    Args:
+        url: 数据库URL
+        profile: config.DB_PROFILES 中的方案名
+
+    Returns:
+        Engine: 数据库引擎
+    """
+    pragmas = DB_PROFILES[profile]
+    connect_args = {"check_same_thread": False}
+
+    if url in ("sqlite://", "sqlite:///:memory:"):
+        # 内存数据库只存在于单个连接中
+        db_engine = create_engine(url, echo=False, connect_args=connect_args, poolclass=StaticPool)
+    else:
+        db_engine = create_engine(
+            url,
+            echo=False,
+            connect_args=connect_args,
+            poolclass=QueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT
+        )
+
+    @event.listens_for(db_engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+    return db_engine
+
 
 # 创建数据库引擎
-engine = create_engine(DATABASE_URL, echo=False, connect_args={"check_same_thread": False})
+engine = create_db_engine()
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 后台任务的会话工厂：提交后不使对象过期，任务返回的对象在会话关闭后仍可读取
+TaskSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
 # 创建基类
 Base = declarative_base()
 
 
 def init_db():
-    """初始化数据库，创建所有表"""
+    """初始化数据库：创建所有表，并对已有数据库执行未应用的迁移"""
     from . import user, course, qa, quiz
+    from .migrations import run_migrations
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
 
 
 def get_db():
@@ -32,3 +79,41 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+@contextmanager
+def session_scope():
+    """
+    工作单元：为一个后台任务提供独立的数据库会话
+
+    Session 不是线程安全的，后台线程不能使用界面线程的会话。正常结束时提交，
+    出现异常时回滚，最后关闭会话；会话中加载的对象随之脱离会话，
+    已加载的属性仍可读取，未加载的关联对象需要在查询时预先加载。
+
+    Yields:
+        Session: 数据库会话
+    """
+    db = TaskSessionLocal()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def run_in_session(func, *args, **kwargs):
+    """
+    在独立的数据库会话中执行函数（供后台线程使用）
+
+    Args:
+        func: 函数 func(db, *args, **kwargs)
+        *args, **kwargs: 传给函数的其他参数
+
+    Returns:
+        函数的返回值（其中的ORM对象已脱离会话）
+    """
+    with session_scope() as db:
+        return func(db, *args, **kwargs)
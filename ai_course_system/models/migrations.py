@@ -0,0 +1,202 @@
+"""
+数据库迁移 - 为已部署的数据库补充新增的列、索引和表
+
+create_all 只会创建不存在的表，已有表的结构变化需要在这里按版本号登记迁移。
+每个迁移在独立的事务中执行并写入 schema_version 表，必须可以在新建的数据库
+（create_all 已建好最新结构）上重复执行而不出错。
+"""
+import sqlite3
+from datetime import datetime
+from sqlalchemy import inspect, text
+from .course import DocumentContent
+
+# 已登记的迁移：(版本号, 说明, 迁移函数)，按版本号升序执行
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """
+    登记迁移的装饰器
+
+    Args:
+        version: 版本号（递增的整数）
+        description: 迁移说明
+    """
+    def decorator(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+
+def _has_column(conn, table, column):
+    return column in {c['name'] for c in inspect(conn).get_columns(table)}
+
+
+@migration(1, "问答记录增加 reused_from_id 列")
+def _add_qa_reused_from(conn):
+    if not _has_column(conn, 'qa_records', 'reused_from_id'):
+        conn.execute(text("ALTER TABLE qa_records ADD COLUMN reused_from_id INTEGER REFERENCES qa_records (id)"))
+
+
+@migration(2, "为常用查询列建立索引，选课记录去重")
+def _add_query_indexes(conn):
+    # 建唯一索引前删除重复的选课记录（保留最早的一条）
+    conn.execute(text(
+        "DELETE FROM course_enrollments WHERE id NOT IN "
+        "(SELECT MIN(id) FROM course_enrollments GROUP BY student_id, course_id)"
+    ))
+    statements = [
+        "CREATE INDEX IF NOT EXISTS ix_courses_teacher_id ON courses (teacher_id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_course_enrollments_student_course "
+        "ON course_enrollments (student_id, course_id)",
+        "CREATE INDEX IF NOT EXISTS ix_course_enrollments_course_id ON course_enrollments (course_id)",
+        "CREATE INDEX IF NOT EXISTS ix_course_documents_course_id ON course_documents (course_id)",
+        "CREATE INDEX IF NOT EXISTS ix_qa_records_user_course_created ON qa_records (user_id, course_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_qa_records_course_created ON qa_records (course_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_quizzes_course_id ON quizzes (course_id)",
+        "CREATE INDEX IF NOT EXISTS ix_questions_quiz_id ON questions (quiz_id)",
+        "CREATE INDEX IF NOT EXISTS ix_quiz_attempts_student_started ON quiz_attempts (student_id, started_at)",
+        "CREATE INDEX IF NOT EXISTS ix_quiz_attempts_student_quiz_completed "
+        "ON quiz_attempts (student_id, quiz_id, is_completed)",
+        "CREATE INDEX IF NOT EXISTS ix_quiz_attempts_quiz_completed ON quiz_attempts (quiz_id, is_completed)",
+        "CREATE INDEX IF NOT EXISTS ix_answers_attempt_id ON answers (attempt_id)",
+        "CREATE INDEX IF NOT EXISTS ix_answers_question_id ON answers (question_id)",
+    ]
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+@migration(3, "测验统计使用覆盖索引")
+def _add_quiz_stats_indexes(conn):
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_quiz_attempts_quiz_stats "
+        "ON quiz_attempts (quiz_id, is_completed, score, total_points)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_answers_question_stats "
+        "ON answers (question_id, attempt_id, is_correct, points_earned)"
+    ))
+    # 新索引的前缀与旧索引相同，旧索引不再需要
+    conn.execute(text("DROP INDEX IF EXISTS ix_quiz_attempts_quiz_completed"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_answers_question_id"))
+
+
+@migration(4, "学生全部课程的问答历史按时间分页")
+def _add_qa_user_created_index(conn):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_qa_records_user_created ON qa_records (user_id, created_at)"))
+
+
+@migration(5, "课程文档增加 content_hash 列")
+def _add_document_content_hash(conn):
+    if not _has_column(conn, 'course_documents', 'content_hash'):
+        conn.execute(text("ALTER TABLE course_documents ADD COLUMN content_hash VARCHAR(64)"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_course_documents_content_hash ON course_documents (content_hash)"
+    ))
+
+
+@migration(6, "文档文本压缩后移到 document_contents 表")
+def _move_document_content(conn):
+    if not _has_column(conn, 'course_documents', 'content'):
+        return
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS document_contents ("
+        "document_id INTEGER NOT NULL PRIMARY KEY REFERENCES course_documents (id), data BLOB NOT NULL)"
+    ))
+
+    # 按ID分批读取，避免一次把全部文本读入内存
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            "SELECT id, content FROM course_documents "
+            "WHERE id > :last_id AND content IS NOT NULL ORDER BY id LIMIT 100"
+        ), {'last_id': last_id}).fetchall()
+        if not rows:
+            break
+        conn.execute(
+            text("INSERT OR REPLACE INTO document_contents (document_id, data) VALUES (:id, :data)"),
+            [{'id': row.id, 'data': DocumentContent.compress(row.content)} for row in rows]
+        )
+        last_id = rows[-1].id
+
+    # SQLite 3.35 起支持删除列；更早的版本清空旧列
+    if sqlite3.sqlite_version_info >= (3, 35, 0):
+        conn.execute(text("ALTER TABLE course_documents DROP COLUMN content"))
+    else:
+        conn.execute(text("UPDATE course_documents SET content = NULL"))
+
+
+@migration(7, "文档片段ID改为 AUTOINCREMENT，不再复用已删除的ID")
+def _autoincrement_document_chunks(conn):
+    sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'document_chunks'")).scalar()
+    if sql is None or 'AUTOINCREMENT' in sql.upper():
+        return
+    # SQLite 不能修改已有列的定义，需要重建表
+    conn.execute(text(
+        "CREATE TABLE document_chunks_new ("
+        "id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, "
+        "document_id INTEGER NOT NULL REFERENCES course_documents (id), "
+        "course_id INTEGER NOT NULL REFERENCES courses (id), "
+        "chunk_index INTEGER NOT NULL, "
+        "text TEXT NOT NULL, "
+        "term_freqs TEXT)"
+    ))
+    conn.execute(text(
+        "INSERT INTO document_chunks_new (id, document_id, course_id, chunk_index, text, term_freqs) "
+        "SELECT id, document_id, course_id, chunk_index, text, term_freqs FROM document_chunks"
+    ))
+    conn.execute(text("DROP TABLE document_chunks"))
+    conn.execute(text("ALTER TABLE document_chunks_new RENAME TO document_chunks"))
+    conn.execute(text("CREATE INDEX ix_document_chunks_document_id ON document_chunks (document_id)"))
+    conn.execute(text("CREATE INDEX ix_document_chunks_course_id ON document_chunks (course_id)"))
+
+
+@migration(8, "课程文档增加 extracted 列，只复用提取成功的文档")
+def _add_document_extracted(conn):
+    # 已有文档无法确认文本与内容哈希是否一致，保持 NULL，不作为复用来源
+    if not _has_column(conn, 'course_documents', 'extracted'):
+        conn.execute(text("ALTER TABLE course_documents ADD COLUMN extracted BOOLEAN"))
+
+
+@migration(9, "学生已完成的测验按完成时间分页")
+def _add_attempt_submitted_index(conn):
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_quiz_attempts_student_completed_submitted "
+        "ON quiz_attempts (student_id, is_completed, submitted_at)"
+    ))
+
+
+def run_migrations(engine):
+    """
+    执行尚未应用的迁移，有迁移执行后运行 ANALYZE 更新查询优化器的统计信息
+
+    没有待执行的迁移时只查询一次版本号。
+
+    Args:
+        engine: 数据库引擎
+
+    Returns:
+        list: 本次执行的迁移版本号
+    """
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_version ("
+            "version INTEGER PRIMARY KEY, description TEXT, applied_at DATETIME)"
+        ))
+        current = conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+    pending = [m for m in MIGRATIONS if m[0] > current]
+    for version, description, func in pending:
+        # 每个迁移单独提交，失败时已完成的迁移不会重复执行
+        with engine.begin() as conn:
+            func(conn)
+            conn.execute(
+                text("INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {'v': version, 'd': description, 't': datetime.now()}
+            )
+
+    if pending:
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+    return [m[0] for m in pending]
@@ -1,7 +1,7 @@
 """
 问答记录模型
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -10,6 +10,13 @@ from .database import Base
 class QARecord(Base):
     """问答记录表"""
     __tablename__ = 'qa_records'
+    __table_args__ = (
+        # 学生的问答历史（可按课程筛选），按时间排序
+        Index('ix_qa_records_user_course_created', 'user_id', 'course_id', 'created_at'),
+        Index('ix_qa_records_user_created', 'user_id', 'created_at'),
+        # 课程的问答历史，按时间排序
+        Index('ix_qa_records_course_created', 'course_id', 'created_at'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -17,6 +24,7 @@ class QARecord(Base):
     question = Column(Text, nullable=False)
     answer = Column(Text, nullable=False)
     context = Column(Text)  # 检索到的相关文档内容
+    reused_from_id = Column(Integer, ForeignKey('qa_records.id'))  # 复用了哪条相似问题的回答（为空表示AI生成）
     created_at = Column(DateTime, default=datetime.now)
 
     # 关系
@@ -1,8 +1,8 @@
 """
 测验相关模型
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, Boolean, Index, func, select
+from sqlalchemy.orm import relationship, column_property
 from datetime import datetime
 from .database import Base
 
@@ -10,6 +10,9 @@ from .database import Base
 class Quiz(Base):
     """测验表"""
     __tablename__ = 'quizzes'
+    __table_args__ = (
+        Index('ix_quizzes_course_id', 'course_id'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     course_id = Column(Integer, ForeignKey('courses.id'), nullable=False)
@@ -31,6 +34,9 @@ class Quiz(Base):
 class Question(Base):
     """题目表"""
     __tablename__ = 'questions'
+    __table_args__ = (
+        Index('ix_questions_quiz_id', 'quiz_id'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     quiz_id = Column(Integer, ForeignKey('quizzes.id'), nullable=False)
@@ -52,6 +58,15 @@ class Question(Base):
 class QuizAttempt(Base):
     """测验尝试记录表"""
     __tablename__ = 'quiz_attempts'
+    __table_args__ = (
+        # 学生的测验记录，按时间排序
+        Index('ix_quiz_attempts_student_started', 'student_id', 'started_at'),
+        Index('ix_quiz_attempts_student_quiz_completed', 'student_id', 'quiz_id', 'is_completed'),
+        # 学生已完成的测验按完成时间游标分页
+        Index('ix_quiz_attempts_student_completed_submitted', 'student_id', 'is_completed', 'submitted_at'),
+        # 测验统计只统计已完成的尝试；包含分数列，聚合、中位数和分数段查询只需读索引
+        Index('ix_quiz_attempts_quiz_stats', 'quiz_id', 'is_completed', 'score', 'total_points'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     quiz_id = Column(Integer, ForeignKey('quizzes.id'), nullable=False)
@@ -74,13 +89,18 @@ class QuizAttempt(Base):
 class Answer(Base):
     """学生答案表"""
     __tablename__ = 'answers'
+    __table_args__ = (
+        Index('ix_answers_attempt_id', 'attempt_id'),
+        # 每题正确率统计只需读索引
+        Index('ix_answers_question_stats', 'question_id', 'attempt_id', 'is_correct', 'points_earned'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     attempt_id = Column(Integer, ForeignKey('quiz_attempts.id'), nullable=False)
     question_id = Column(Integer, ForeignKey('questions.id'), nullable=False)
     student_answer = Column(Text)
     is_correct = Column(Boolean)
-    points_earned = Column(Float, default=0.0)
+    points_earned = Column(Float)  # 为空表示待重新批改
     ai_feedback = Column(Text)  # AI批改反馈
 
     # 关系
@@ -89,3 +109,13 @@ class Answer(Base):
 
     def __repr__(self):
         return f"<Answer(id={self.id}, is_correct={self.is_correct})>"
+
+
+# 尝试中待重新批改的题目数（得分未计入 score），默认不加载，查询时用 undefer 读取
+QuizAttempt.pending_count = column_property(
+    select(func.count(Answer.id)).where(
+        Answer.attempt_id == QuizAttempt.id,
+        Answer.points_earned.is_(None)
+    ).correlate_except(Answer).scalar_subquery(),
+    deferred=True
+)
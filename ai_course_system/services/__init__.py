@@ -6,5 +6,12 @@ from .document_service import DocumentService
 from .course_service import CourseService
 from .quiz_service import QuizService
 from .qa_service import QAService
+from .dashboard_service import DashboardService
+from .indexing_service import IndexingService
+from .retrieval_service import RetrievalService
+from .vector_store import VectorStore
 
-__all__ = ['AIService', 'DocumentService', 'CourseService', 'QuizService', 'QAService']
+__all__ = [
+    'AIService', 'DocumentService', 'CourseService', 'QuizService', 'QAService',
+    'DashboardService', 'IndexingService', 'RetrievalService', 'VectorStore'
+]
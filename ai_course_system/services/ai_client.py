@@ -0,0 +1,229 @@
+"""
+AI客户端 - 进程内共享的异步连接与并发控制
+"""
+import sys
+import os
+import queue
+import asyncio
+import threading
+from openai import AsyncOpenAI
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (DEEPSEEK_API_KEY, DEEPSEEK_API_BASE, DEEPSEEK_MODEL,
+                    AI_MAX_CONCURRENCY, AI_REQUEST_TIMEOUT, AI_MAX_RETRIES)
+
+# 流式输出结束标记
+_STREAM_END = object()
+
+
+class _StreamError:
+    """流式输出中转发给调用方的异常"""
+
+    def __init__(self, error):
+        self.error = error
+
+
+class AIClient:
+    """
+    共享的AI客户端
+
+    内部在后台线程运行一个事件循环，所有请求复用同一个 AsyncOpenAI 客户端
+    （及其保持连接的HTTP连接池），并通过信号量限制同时进行的请求数。
+    同步方法供界面和服务层直接调用，*_many 方法并发执行多个请求。
+    """
+
+    def __init__(self, api_key=DEEPSEEK_API_KEY, base_url=DEEPSEEK_API_BASE,
+                 max_concurrency=AI_MAX_CONCURRENCY, timeout=AI_REQUEST_TIMEOUT,
+                 max_retries=AI_MAX_RETRIES):
+        self.timeout = timeout
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="ai-client", daemon=True)
+        self._thread.start()
+
+        async def setup():
+            # 客户端与信号量在事件循环线程中创建
+            self._client = AsyncOpenAI(api_key=api_key, base_url=base_url,
+                                       timeout=timeout, max_retries=max_retries)
+            self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        self.run(setup())
+
+    def run(self, coro):
+        """
+        在客户端的事件循环中执行协程并等待结果
+
+        Args:
+            coro: 协程对象
+
+        Returns:
+            协程的返回值
+        """
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("不能在AI客户端的事件循环线程中同步等待")
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def acomplete(self, messages, model=DEEPSEEK_MODEL, timeout=None, **params):
+        """
+        异步调用聊天接口
+
+        Args:
+            messages: 消息列表
+            model: 模型名称
+            timeout: 本次调用的超时（秒），默认使用客户端配置
+            **params: 其他接口参数（temperature、max_tokens、response_format 等）
+
+        Returns:
+            str: 回复内容
+        """
+        async with self._semaphore:
+            response = await self._client.chat.completions.create(
+                model=model,
+                messages=messages,
+                timeout=timeout or self.timeout,
+                **params
+            )
+        return response.choices[0].message.content
+
+    def complete(self, messages, model=DEEPSEEK_MODEL, timeout=None, **params):
+        """
+        同步调用聊天接口，参数同 acomplete
+
+        Returns:
+            str: 回复内容
+        """
+        return self.run(self.acomplete(messages, model=model, timeout=timeout, **params))
+
+    def complete_many(self, requests, return_exceptions=True, on_result=None):
+        """
+        并发调用聊天接口（同时进行的请求数受信号量限制）
+
+        Args:
+            requests: 请求参数字典列表，每项为 acomplete 的关键字参数
+            return_exceptions: 为 True 时失败的请求以异常对象返回，不影响其他请求
+            on_result: 每个请求完成时调用 on_result(下标, 回复或异常)，在事件循环线程中执行
+
+        Returns:
+            list: 与 requests 顺序一致的回复内容（或异常）
+        """
+        async def complete_one(index, request):
+            try:
+                result = await self.acomplete(**request)
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                result = e
+            if on_result:
+                on_result(index, result)
+            return result
+
+        async def gather():
+            return await asyncio.gather(*(complete_one(i, request) for i, request in enumerate(requests)))
+
+        return self.run(gather()) if requests else []
+
+    def stream(self, messages, model=DEEPSEEK_MODEL, timeout=None, **params):
+        """
+        流式调用聊天接口，在调用线程中逐段产出增量文本
+
+        Args:
+            messages: 消息列表
+            model: 模型名称
+            timeout: 本次调用的超时（秒）
+            **params: 其他接口参数
+
+        Yields:
+            str: 增量文本
+        """
+        output = queue.Queue()
+
+        async def produce():
+            try:
+                async with self._semaphore:
+                    stream = await self._client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        timeout=timeout or self.timeout,
+                        stream=True,
+                        **params
+                    )
+                    try:
+                        async for chunk in stream:
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                output.put(chunk.choices[0].delta.content)
+                    finally:
+                        await stream.close()
+            except Exception as e:
+                output.put(_StreamError(e))
+            finally:
+                output.put(_STREAM_END)
+
+        future = asyncio.run_coroutine_threadsafe(produce(), self._loop)
+        try:
+            while True:
+                item = output.get()
+                if item is _STREAM_END:
+                    break
+                if isinstance(item, _StreamError):
+                    raise item.error
+                yield item
+        finally:
+            # 调用方提前停止读取时取消请求并释放连接
+            future.cancel()
+
+    async def aembed(self, texts, model):
+        """
+        异步调用Embedding接口
+
+        Args:
+            texts: 文本列表
+            model: 模型名称
+
+        Returns:
+            list: 向量列表
+        """
+        async with self._semaphore:
+            response = await self._client.embeddings.create(model=model, input=texts, timeout=self.timeout)
+        return [item.embedding for item in response.data]
+
+    def embed_many(self, batches, model):
+        """
+        并发向量化多批文本
+
+        Args:
+            batches: 文本列表的列表
+            model: 模型名称
+
+        Returns:
+            list: 与 batches 顺序一致的向量列表
+        """
+        async def gather():
+            return await asyncio.gather(*(self.aembed(batch, model) for batch in batches))
+
+        return self.run(gather()) if batches else []
+
+    def close(self):
+        """关闭连接池并停止事件循环"""
+        self.run(self._client.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_ai_client(api_key=DEEPSEEK_API_KEY, base_url=DEEPSEEK_API_BASE):
+    """
+    获取进程内共享的AI客户端（相同接口地址与密钥共用一个连接池）
+
+    Args:
+        api_key: API密钥
+        base_url: 接口地址
+
+    Returns:
+        AIClient: 客户端对象
+    """
+    with _clients_lock:
+        client = _clients.get((api_key, base_url))
+        if client is None:
+            client = _clients[(api_key, base_url)] = AIClient(api_key, base_url)
+        return client
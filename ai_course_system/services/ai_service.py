@@ -1,26 +1,91 @@
 """
 AI服务 - DeepSeek API集成
 """
-from openai import OpenAI
+import re
 import sys
 import os
+import json
+import math
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import DEEPSEEK_API_KEY, DEEPSEEK_API_BASE, MAX_TOKENS, TEMPERATURE
+from config import (DEEPSEEK_MODEL, MAX_TOKENS, TEMPERATURE,
+                    AI_CACHE_ENABLED, AI_CACHE_MAX_TEMPERATURE, AI_GRADING_BATCH_SIZE,
+                    AI_QUIZ_BATCH_SIZE)
+from .ai_client import get_ai_client
+from .cache_service import get_response_cache
+
+# AI调用失败时返回内容的前缀
+AI_ERROR_PREFIX = "AI服务调用失败"
+
+# 主观题评分标准
+_GRADING_CRITERIA = """评分标准：
+- 完全正确：10分
+- 基本正确但有小瑕疵：7-9分
+- 部分正确：4-6分
+- 基本错误但有可取之处：1-3分
+- 完全错误：0分"""
+
+
+def extract_json(text):
+    """
+    从AI回复中提取JSON（容忍代码块标记和前后的说明文字）
+
+    Args:
+        text: AI回复
+
+    Returns:
+        dict | list | None: 解析结果，无法解析时返回 None
+    """
+    if not text:
+        return None
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+
+    decoder = json.JSONDecoder()
+    for match in re.finditer(r'[\[{]', text):
+        try:
+            return decoder.raw_decode(text, match.start())[0]
+        except ValueError:
+            continue
+    return None
+
+
+def split_question_types(count):
+    """
+    按比例把题目数量分配到各题型（选择题约五成、判断题约三成、其余为简答题）
+
+    Args:
+        count: 题目总数
+
+    Returns:
+        dict: 题型 -> 数量（不含数量为0的题型）
+    """
+    choice = math.ceil(count * 0.5)
+    true_false = min(round(count * 0.3), count - choice)
+    counts = {
+        'choice': choice,
+        'true_false': true_false,
+        'short_answer': count - choice - true_false
+    }
+    return {question_type: n for question_type, n in counts.items() if n > 0}
 
 
 class AIService:
     """AI服务类，封装DeepSeek API调用"""
 
     def __init__(self):
-        self.api_key = DEEPSEEK_API_KEY
-        self.api_base = DEEPSEEK_API_BASE
-        # 使用新版 OpenAI 客户端
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url=self.api_base
-        )
+        # 所有服务实例共用同一个客户端与连接池
+        self.client = get_ai_client()
+
+    @staticmethod
+    def _get_cache(temperature, use_cache):
+        """按缓存规则返回回复缓存（不使用缓存时返回 None）"""
+        if use_cache is None:
+            use_cache = temperature <= AI_CACHE_MAX_TEMPERATURE
+        return get_response_cache() if use_cache and AI_CACHE_ENABLED else None
 
-    def chat(self, messages, temperature=TEMPERATURE, max_tokens=MAX_TOKENS):
+    def chat(self, messages, temperature=TEMPERATURE, max_tokens=MAX_TOKENS, use_cache=None):
         """
         调用AI聊天接口
         
@@ -28,32 +93,113 @@ class AIService:
             messages: 消息列表，格式 [{"role": "user", "content": "..."}]
             temperature: 温度参数
             max_tokens: 最大token数
+            use_cache: 是否使用回复缓存，默认仅缓存低温度（确定性较强）的调用
             
         Returns:
             str: AI回复内容
         """
-        try:
-            response = self.client.chat.completions.create(
-                model="deepseek-chat",
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            return f"AI服务调用失败: {str(e)}"
+        return self.chat_many([messages], temperature, max_tokens, use_cache)[0]
 
-    def answer_question(self, question, context=""):
+    def chat_many(self, message_lists, temperature=TEMPERATURE, max_tokens=MAX_TOKENS, use_cache=None,
+                  on_result=None, json_mode=False, cache_check=None):
         """
-        基于上下文回答问题
+        并发调用AI聊天接口，缓存命中的请求不再发送
         
         Args:
-            question: 用户问题
-            context: 相关文档上下文
+            message_lists: 消息列表的列表，每项为一次独立的调用
+            temperature: 温度参数
+            max_tokens: 最大token数
+            use_cache: 是否使用回复缓存，规则同 chat
+            on_result: 每个调用得到结果时调用 on_result(下标, 回复内容)，可能在后台线程中执行
+            json_mode: 是否要求接口输出JSON对象（提示词中需说明JSON格式）
+            cache_check: 检查回复是否可用 cache_check(下标, 回复内容)，返回 False 的回复不写入缓存
             
         Returns:
-            str: AI回答
+            list: 与 message_lists 顺序一致的回复内容，失败的调用返回错误说明
+        """
+        cache = self._get_cache(temperature, use_cache)
+        response_format = {'type': 'json_object'} if json_mode else None
+        results = [None] * len(message_lists)
+        keys = [None] * len(message_lists)
+        pending = []
+
+        for i, messages in enumerate(message_lists):
+            if cache is not None:
+                keys[i] = cache.make_key(DEEPSEEK_MODEL, messages, temperature, max_tokens, response_format)
+                results[i] = cache.get(keys[i])
+            if results[i] is None:
+                pending.append(i)
+            elif on_result:
+                on_result(i, results[i])
+
+        def on_response(j, response):
+            i = pending[j]
+            if isinstance(response, Exception):
+                results[i] = f"{AI_ERROR_PREFIX}: {str(response)}"
+            else:
+                results[i] = response
+            if on_result:
+                on_result(i, results[i])
+
+        requests = []
+        for i in pending:
+            request = {
+                'messages': message_lists[i],
+                'temperature': temperature,
+                'max_tokens': max_tokens
+            }
+            if response_format:
+                request['response_format'] = response_format
+            requests.append(request)
+        self.client.complete_many(requests, on_result=on_response)
+
+        if cache is not None:
+            for i in pending:
+                if results[i] and not results[i].startswith(AI_ERROR_PREFIX) and (
+                        cache_check is None or cache_check(i, results[i])):
+                    cache.set(keys[i], results[i])
+        return results
+
+    def chat_stream(self, messages, temperature=TEMPERATURE, max_tokens=MAX_TOKENS, use_cache=None):
         """
+        流式调用AI聊天接口，逐段产出增量文本
+        
+        Args:
+            messages: 消息列表
+            temperature: 温度参数
+            max_tokens: 最大token数
+            use_cache: 是否使用回复缓存，规则同 chat；命中时一次性产出完整回复
+            
+        Yields:
+            str: 增量文本
+
+        Raises:
+            RuntimeError: AI调用失败（包括输出一部分后中断），已产出的部分回复应丢弃
+        """
+        cache = self._get_cache(temperature, use_cache)
+
+        if cache is not None:
+            cache_key = cache.make_key(DEEPSEEK_MODEL, messages, temperature, max_tokens)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        parts = []
+        try:
+            for delta in self.client.stream(messages, temperature=temperature, max_tokens=max_tokens):
+                parts.append(delta)
+                yield delta
+        except Exception as e:
+            # 错误说明不作为回复内容产出，由调用方丢弃已显示的部分回复
+            raise RuntimeError(f"{AI_ERROR_PREFIX}: {str(e)}") from e
+
+        content = "".join(parts)
+        if cache is not None and content:
+            cache.set(cache_key, content)
+
+    def _build_answer_messages(self, question, context):
+        """构造基于上下文回答问题的消息"""
         system_prompt = """你是一个专业的AI助教，负责回答学生关于课程内容的问题。
 请基于提供的课程资料回答问题，如果资料中没有相关信息，请诚实地告知学生。
 回答要清晰、准确、有条理。"""
@@ -65,71 +211,168 @@ class AIService:
 
 请基于上述课程资料回答学生的问题。"""
 
-        messages = [
+        return [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_message}
         ]
 
-        return self.chat(messages)
-
-    def generate_quiz_questions(self, knowledge_point, context, count=10):
+    def answer_question(self, question, context="", use_cache=None):
         """
-        生成测验题目
+        基于上下文回答问题
         
         Args:
-            knowledge_point: 知识点
-            context: 课程内容
-            count: 题目数量
+            question: 用户问题
+            context: 相关文档上下文
+            use_cache: 是否使用回复缓存，规则同 chat（默认温度下回答带有随机性，不缓存）
             
         Returns:
-            list: 题目列表
+            str: AI回答
         """
-        system_prompt = """你是一个专业的试题生成专家。请根据给定的知识点和课程内容生成测验题目。
-题目类型包括：选择题、判断题、简答题。
-返回格式为JSON数组，每个题目包含：
-- type: 题目类型 (choice/true_false/short_answer)
-- question: 题目内容
-- options: 选项（选择题和判断题需要）
-- correct_answer: 正确答案
-- explanation: 答案解析"""
+        return self.chat(self._build_answer_messages(question, context), use_cache=use_cache)
+
+    def answer_question_stream(self, question, context="", use_cache=None):
+        """
+        基于上下文流式回答问题
+        
+        Args:
+            question: 用户问题
+            context: 相关文档上下文
+            use_cache: 是否使用回复缓存，规则同 chat
+            
+        Yields:
+            str: 增量文本
+
+        Raises:
+            RuntimeError: AI调用失败，同 chat_stream
+        """
+        yield from self.chat_stream(self._build_answer_messages(question, context), use_cache=use_cache)
+
+    def _build_quiz_messages(self, knowledge_point, context, question_type, count):
+        """构造生成某一类型题目的消息"""
+        type_rules = {
+            'choice': '单项选择题，options 为4个选项文本的数组，correct_answer 必须与其中一个选项完全相同',
+            'true_false': '判断题，options 固定为 ["正确", "错误"]，correct_answer 为 "正确" 或 "错误"',
+            'short_answer': '简答题，options 为 null，correct_answer 为参考答案要点'
+        }
+        system_prompt = f"""你是一个专业的试题生成专家。请根据给定的知识点和课程内容生成测验题目。
+题目类型：{type_rules[question_type]}。
+题目之间不要重复，考查角度尽量不同。
+只返回JSON对象，格式为：
+{{"questions": [{{"question": "题目内容", "options": 选项, "correct_answer": "正确答案", "explanation": "答案解析"}}]}}"""
 
         user_message = f"""知识点：{knowledge_point}
 
 课程内容：
 {context}
 
-请生成{count}道测验题目，包括选择题、判断题和简答题。"""
+请生成{count}道题目。"""
 
-        messages = [
+        return [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_message}
         ]
 
-        response = self.chat(messages, temperature=0.7)
-        
-        # 这里应该解析JSON，为了简化，返回原始响应
-        # 实际使用时需要添加JSON解析逻辑
-        return response
+    @staticmethod
+    def _normalize_quiz_question(item, question_type):
+        """
+        校验并规范化AI生成的单道题目
+
+        Args:
+            item: 解析出的题目字典
+            question_type: 题目类型
+
+        Returns:
+            dict | None: 规范化后的题目，不合法时返回 None
+        """
+        if not isinstance(item, dict):
+            return None
+        question = item.get('question')
+        correct_answer = item.get('correct_answer')
+        explanation = item.get('explanation')
+        if not isinstance(question, str) or not question.strip():
+            return None
+        if isinstance(correct_answer, bool):
+            correct_answer = '正确' if correct_answer else '错误'
+        if not isinstance(correct_answer, str) or not correct_answer.strip():
+            return None
+        correct_answer = correct_answer.strip()
+        options = None
+
+        if question_type == 'choice':
+            options = item.get('options')
+            if not isinstance(options, list) or len(options) < 2:
+                return None
+            options = [str(option).strip() for option in options]
+            if len(set(options)) < len(options):
+                return None
+            if correct_answer not in options:
+                # 答案给成选项字母（如 "B" 或 "B."）时换成对应选项
+                letter = correct_answer.rstrip('.．、)） ').upper()
+                if len(letter) != 1 or not 'A' <= letter < chr(ord('A') + len(options)):
+                    return None
+                correct_answer = options[ord(letter) - ord('A')]
+        elif question_type == 'true_false':
+            options = ['正确', '错误']
+            if correct_answer.lower() in ('正确', '对', '是', 'true', 't', '√'):
+                correct_answer = '正确'
+            elif correct_answer.lower() in ('错误', '错', '否', 'false', 'f', '×'):
+                correct_answer = '错误'
+            else:
+                return None
 
-    def grade_answer(self, question, correct_answer, student_answer):
+        return {
+            'type': question_type,
+            'question': question.strip(),
+            'options': options,
+            'correct_answer': correct_answer,
+            'explanation': explanation.strip() if isinstance(explanation, str) else ''
+        }
+
+    def generate_quiz_questions(self, knowledge_point, context, count=10):
         """
-        批改主观题答案
+        生成测验题目
+        
+        按题型分配数量，每类题目再按 AI_QUIZ_BATCH_SIZE 拆分成多个子请求并发生成，
+        总耗时约为单次请求的延迟。每类多生成约两成，供去重后补足数量。
         
         Args:
-            question: 题目
-            correct_answer: 标准答案
-            student_answer: 学生答案
+            knowledge_point: 知识点
+            context: 课程内容
+            count: 题目数量
             
         Returns:
-            dict: 包含分数和反馈
+            list: 题目字典列表（type、question、options、correct_answer、explanation），
+                  按题型分组；AI不可用时可能为空
         """
-        system_prompt = """你是一个专业的作业批改老师。请评估学生的答案，给出分数（0-10分）和详细反馈。
-评分标准：
-- 完全正确：10分
-- 基本正确但有小瑕疵：7-9分
-- 部分正确：4-6分
-- 基本错误但有可取之处：1-3分
-- 完全错误：0分
+        requests = []
+        for question_type, type_count in split_question_types(count).items():
+            target = type_count + math.ceil(type_count * 0.2)
+            for start in range(0, target, AI_QUIZ_BATCH_SIZE):
+                requests.append((question_type, min(AI_QUIZ_BATCH_SIZE, target - start)))
+
+        responses = self.chat_many(
+            [self._build_quiz_messages(knowledge_point, context, question_type, batch_count)
+             for question_type, batch_count in requests],
+            temperature=0.7,
+            json_mode=True
+        )
+
+        questions = []
+        for (question_type, _), response in zip(requests, responses):
+            data = extract_json(response)
+            items = data.get('questions') if isinstance(data, dict) else data
+            if not isinstance(items, list):
+                continue
+            for item in items:
+                question = self._normalize_quiz_question(item, question_type)
+                if question:
+                    questions.append(question)
+        return questions
+
+    def _build_grading_messages(self, question, correct_answer, student_answer):
+        """构造批改单道主观题的消息（批量批改解析失败时使用）"""
+        system_prompt = f"""你是一个专业的作业批改老师。请评估学生的答案，给出分数（0-10分）和详细反馈。
+{_GRADING_CRITERIA}
 
 返回格式：
 分数：X分
@@ -143,31 +386,153 @@ class AIService:
 
 请给出评分和反馈。"""
 
-        messages = [
+        return [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_message}
         ]
 
-        response = self.chat(messages, temperature=0.3)
+    def _build_batch_grading_messages(self, items):
+        """构造一次批改多道主观题的消息，要求按编号返回JSON"""
+        system_prompt = f"""你是一个专业的作业批改老师。请逐题评估学生的答案，给出分数（0-10分）和反馈。
+{_GRADING_CRITERIA}
+
+只返回JSON对象，格式为：
+{{"results": [{{"id": 题目编号, "score": 分数, "feedback": "评价和建议"}}]}}
+每道题都必须有一条结果，id 与题目编号一致，score 为0到10之间的数字。"""
+
+        parts = []
+        for number, (question, correct_answer, student_answer) in enumerate(items, 1):
+            parts.append(f"""【题目{number}】
+题目：{question}
+标准答案：{correct_answer}
+学生答案：{student_answer}""")
+
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": "\n\n".join(parts)}
+        ]
+
+    @staticmethod
+    def _parse_grade(response):
+        """
+        从批改回复中提取分数（0-10）和反馈
+
+        Returns:
+            dict | None: 分数和反馈；AI调用失败或回复中没有分数时返回 None（不能给出默认分数）
+        """
+        if not response or response.startswith(AI_ERROR_PREFIX):
+            return None
+        for line in response.split('\n'):
+            if '分数' in line or '得分' in line:
+                numbers = re.findall(r'\d+(?:\.\d+)?', line)
+                if numbers:
+                    return {
+                        'score': min(max(float(numbers[0]), 0.0), 10.0),
+                        'feedback': response
+                    }
+        return None
+
+    @staticmethod
+    def _parse_batch_grades(response, count):
+        """
+        解析批量批改的JSON回复
+
+        Args:
+            response: AI回复
+            count: 本批题目数
+
+        Returns:
+            dict: 题目下标 -> 批改结果，格式不合法的题目不包含在内
+        """
+        try:
+            results = json.loads(response)['results']
+        except (ValueError, TypeError, KeyError):
+            return {}
+        if not isinstance(results, list):
+            return {}
+
+        grades = {}
+        for item in results:
+            if not isinstance(item, dict):
+                continue
+            number, score, feedback = item.get('id'), item.get('score'), item.get('feedback')
+            if isinstance(number, str) and number.isdigit():
+                number = int(number)
+            if not isinstance(number, int) or not 1 <= number <= count:
+                continue
+            if isinstance(score, bool) or not isinstance(score, (int, float)) or not 0 <= score <= 10:
+                continue
+            if not isinstance(feedback, str):
+                continue
+            grades[number - 1] = {'score': float(score), 'feedback': feedback}
+        return grades
+
+    def grade_answer(self, question, correct_answer, student_answer, use_cache=None):
+        """
+        批改主观题答案
         
-        # 解析分数和反馈
-        # 简化处理，实际应该用正则表达式提取
-        lines = response.split('\n')
-        score = 5.0  # 默认分数
-        feedback = response
+        Args:
+            question: 题目
+            correct_answer: 标准答案
+            student_answer: 学生答案
+            use_cache: 是否使用回复缓存，默认缓存（批改温度较低），传 False 强制重新批改
+            
+        Returns:
+            dict | None: 包含分数（0-10分）和反馈，无法批改时为 None
+        """
+        return self.grade_answers([(question, correct_answer, student_answer)], use_cache)[0]
+
+    def grade_answers(self, items, use_cache=None, on_result=None, batch_size=AI_GRADING_BATCH_SIZE):
+        """
+        批量批改主观题
         
-        for line in lines:
-            if '分数' in line or '得分' in line:
-                try:
-                    # 尝试提取数字
-                    import re
-                    numbers = re.findall(r'\d+', line)
-                    if numbers:
-                        score = float(numbers[0])
-                except:
-                    pass
+        每 batch_size 道题合并为一次请求（共用系统提示词），要求返回JSON并逐题校验；
+        各批并发发送。解析失败的题目再单独批改；仍然失败（如AI服务不可用）的题目
+        结果为 None，由调用方记为待重新批改。格式不合法的回复不写入缓存，重试时会重新请求。
         
-        return {
-            'score': score,
-            'feedback': feedback
-        }
+        Args:
+            items: (题目, 标准答案, 学生答案) 元组列表
+            use_cache: 是否使用回复缓存，规则同 grade_answer
+            on_result: 每道题批改完成时调用 on_result(下标, 批改结果)，可能在后台线程中执行
+            batch_size: 每次请求包含的题目数
+            
+        Returns:
+            list: 与 items 顺序一致的批改结果字典（分数和反馈），无法批改的题目为 None
+        """
+        grades = [None] * len(items)
+        batches = [list(range(start, min(start + batch_size, len(items))))
+                   for start in range(0, len(items), batch_size)]
+
+        def on_batch(b, response):
+            for j, grade in self._parse_batch_grades(response, len(batches[b])).items():
+                i = batches[b][j]
+                grades[i] = grade
+                if on_result:
+                    on_result(i, grade)
+
+        self.chat_many(
+            [self._build_batch_grading_messages([items[i] for i in batch]) for batch in batches],
+            temperature=0.3,
+            use_cache=use_cache,
+            on_result=on_batch,
+            json_mode=True,
+            cache_check=lambda b, response: len(self._parse_batch_grades(response, len(batches[b]))) == len(batches[b])
+        )
+
+        # 未能解析的题目逐题批改
+        failed = [i for i, grade in enumerate(grades) if grade is None]
+
+        def on_single(j, response):
+            i = failed[j]
+            grades[i] = self._parse_grade(response)
+            if on_result:
+                on_result(i, grades[i])
+
+        self.chat_many(
+            [self._build_grading_messages(*items[i]) for i in failed],
+            temperature=0.3,
+            use_cache=use_cache,
+            on_result=on_single,
+            cache_check=lambda j, response: self._parse_grade(response) is not None
+        )
+        return grades
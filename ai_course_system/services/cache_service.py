@@ -0,0 +1,156 @@
+"""
+AI回复缓存服务
+"""
+import sys
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import AI_CACHE_PATH, AI_CACHE_MAX_ENTRIES, AI_CACHE_TTL
+
+
+class ResponseCache:
+    """
+    持久化的AI回复缓存（LRU淘汰 + 过期时间）
+
+    存储在独立的SQLite文件中，避免与业务数据库争用写锁。
+    """
+
+    def __init__(self, path=AI_CACHE_PATH, max_entries=AI_CACHE_MAX_ENTRIES, ttl=AI_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_response_cache_accessed_at ON response_cache (accessed_at)"
+            )
+
+    @staticmethod
+    def make_key(model, messages, temperature, max_tokens, response_format=None):
+        """
+        生成缓存键：消息内容去除首尾空白并合并连续空白后参与哈希
+
+        Args:
+            model: 模型名称
+            messages: 消息列表
+            temperature: 温度参数
+            max_tokens: 最大token数
+            response_format: 输出格式要求（如JSON模式）
+
+        Returns:
+            str: 缓存键
+        """
+        normalized = [
+            {'role': m['role'], 'content': " ".join(str(m['content']).split())}
+            for m in messages
+        ]
+        payload = {
+            'model': model,
+            'messages': normalized,
+            'temperature': round(float(temperature), 4),
+            'max_tokens': max_tokens
+        }
+        if response_format:
+            payload['response_format'] = response_format
+        payload = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        读取缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            str | None: 命中时返回缓存的回复
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE response_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, response):
+        """
+        写入缓存，超出容量时淘汰最久未访问的条目
+
+        Args:
+            key: 缓存键
+            response: 回复内容
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM response_cache WHERE key IN "
+                    "(SELECT key FROM response_cache ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM response_cache")
+
+    def stats(self):
+        """
+        获取缓存统计
+
+        Returns:
+            dict: 命中数、未命中数、命中率和条目数
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': entries
+        }
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """
+    获取进程内共享的回复缓存
+
+    Returns:
+        ResponseCache: 缓存对象
+    """
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+        return _response_cache
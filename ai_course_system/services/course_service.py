@@ -4,12 +4,14 @@
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from sqlalchemy.orm import Session
-from models.course import Course, CourseEnrollment, CourseDocument
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, joinedload
+from models.course import Course, CourseEnrollment, CourseDocument, DocumentContent
 from models.user import User
 from auth.decorators import require_role
 from auth.permissions import PermissionHelper
 from .document_service import DocumentService
+from .indexing_service import IndexingService
 from datetime import datetime
 
 
@@ -19,6 +21,7 @@ class CourseService:
     def __init__(self, db: Session):
         self.db = db
         self.doc_service = DocumentService()
+        self.indexing_service = IndexingService(db)
 
     def create_course(self, teacher_id: int, name: str, description: str = ""):
         """
@@ -54,6 +57,23 @@ class CourseService:
         """
         return self.db.query(Course).filter_by(teacher_id=teacher_id).all()
 
+    def get_teacher_courses_with_counts(self, teacher_id: int):
+        """
+        获取教师创建的所有课程及各课程的资料数（一次查询，不加载文档）
+
+        Args:
+            teacher_id: 教师ID
+
+        Returns:
+            list: (课程, 资料数) 列表
+        """
+        document_count = select(func.count()).select_from(CourseDocument).where(
+            CourseDocument.course_id == Course.id
+        ).scalar_subquery()
+        return [tuple(row) for row in self.db.query(Course, document_count).filter(
+            Course.teacher_id == teacher_id
+        ).all()]
+
     def get_student_courses(self, student_id: int):
         """
         获取学生已选的所有课程
@@ -62,10 +82,13 @@ class CourseService:
             student_id: 学生ID
             
         Returns:
-            list: 课程列表
+            list: 课程列表（按选课顺序，已加载授课教师）
         """
-        enrollments = self.db.query(CourseEnrollment).filter_by(student_id=student_id).all()
-        return [enrollment.course for enrollment in enrollments]
+        return self.db.query(Course).join(
+            CourseEnrollment, CourseEnrollment.course_id == Course.id
+        ).filter(
+            CourseEnrollment.student_id == student_id
+        ).options(joinedload(Course.teacher)).order_by(CourseEnrollment.id).all()
 
     def enroll_student(self, student_id: int, course_id: int):
         """
@@ -95,15 +118,19 @@ class CourseService:
         self.db.commit()
         return enrollment
 
-    def upload_document(self, course_id: int, teacher_id: int, filepath: str, filename: str):
+    def upload_document(self, course_id: int, teacher_id: int, filepath: str, filename: str,
+                        content_hash: str = None):
         """
         上传课程文档（仅教师）
+
+        已上传过相同内容（SHA-256 相同）且提取成功的文件时直接复用其文本、片段和向量，不再重新提取。
         
         Args:
             course_id: 课程ID
             teacher_id: 教师ID
             filepath: 文件路径
             filename: 文件名
+            content_hash: 文件内容SHA-256，为 None 时读取文件计算
             
         Returns:
             CourseDocument: 文档对象
@@ -112,11 +139,7 @@ class CourseService:
         if not PermissionHelper.can_manage_course(self.db, teacher_id, course_id):
             raise PermissionError("无权上传此课程的文档")
         
-        # 提取文本内容
-        content = self.doc_service.extract_text(filepath)
-        
         # 获取文件类型
-        import os
         file_type = os.path.splitext(filename)[1][1:]  # 去掉点号
         
         # 创建文档记录
@@ -125,16 +148,144 @@ class CourseService:
             filename=filename,
             filepath=filepath,
             file_type=file_type,
-            content=content
+            content_hash=content_hash or self.doc_service.file_hash(filepath)
         )
+        source = self._find_same_content(document.content_hash)
         self.db.add(document)
+        self.db.flush()
+
+        if source is not None:
+            # 直接复制压缩后的文本，不解压
+            document.body = DocumentContent(data=source.body.data)
+            document.extracted = True
+            chunks = self.indexing_service.copy_chunks(source, document)
+            self.db.commit()
+            self.indexing_service.index_vectors(document, chunks, source)
+            self.db.refresh(document)
+            return document
+
+        # 逐页/逐段提取文本，同时切分并压缩，不在内存中拼接完整文本
+        blocks = []
+        segments = DocumentContent.compress_segments(self.doc_service.iter_text_segments(filepath), blocks)
+        try:
+            chunks = self.indexing_service.build_chunks(document, segments)
+            document.body = DocumentContent(data=b"".join(blocks))
+            document.extracted = True
+        except Exception as e:
+            # 与 extract_text 一致：解析失败时保存错误说明，已分批写入的片段作废
+            self.indexing_service.remove_document(document)
+            document.content = self.doc_service.describe_extract_error(filepath, e)
+            document.extracted = False
+            chunks = self.indexing_service.build_chunks(document)
+
+        # 只为新文档建立索引，与文档记录在同一事务中提交
         self.db.commit()
+        self.indexing_service.index_vectors(document, chunks)
+
         self.db.refresh(document)
         return document
 
+    def bulk_upload_documents(self, course_id: int, teacher_id: int, paths, progress_callback=None):
+        """
+        批量导入课程文档（仅教师）
+
+        目录会展开为其中所有支持的文档；文本由多个进程并行提取，
+        全部文档记录与片段在一个事务中提交，向量存储只写入一次。
+
+        Args:
+            course_id: 课程ID
+            teacher_id: 教师ID
+            paths: 文件或目录路径列表
+            progress_callback: 提取进度回调 progress_callback(已完成任务数, 任务总数)
+
+        Returns:
+            list: 新建的文档对象列表
+        """
+        # 验证权限
+        if not PermissionHelper.can_manage_course(self.db, teacher_id, course_id):
+            raise PermissionError("无权上传此课程的文档")
+
+        files = self.doc_service.collect_files(paths)
+        if not files:
+            return []
+
+        # 存入内容寻址存储并链接到课程目录（不同目录下的同名文件链接为不同的文件名）
+        stored = []
+        for filepath in files:
+            filename = os.path.basename(filepath)
+            saved_path, content_hash = self.doc_service.store_file(filepath, filename, course_id)
+            stored.append((filename, saved_path, content_hash))
+
+        # 已上传过的内容复用已有文档；本批中重复的内容只提取一次
+        hashes = {content_hash for _, _, content_hash in stored}
+        sources = {}
+        for document in self.db.query(CourseDocument).filter(
+            CourseDocument.content_hash.in_(hashes),
+            CourseDocument.extracted.is_(True)
+        ).order_by(CourseDocument.id):
+            sources.setdefault(document.content_hash, document)
+
+        # 从内容寻址存储中的文件提取，提取的文本与哈希对应的内容一致
+        to_extract = {}
+        for filename, _, content_hash in stored:
+            if content_hash not in sources:
+                to_extract.setdefault(content_hash, self.doc_service.object_path(content_hash, filename))
+        extracted = dict(zip(
+            to_extract,
+            self.doc_service.extract_texts(list(to_extract.values()), progress_callback=progress_callback)
+        ))
+
+        documents = []
+        for filename, saved_path, content_hash in stored:
+            document = CourseDocument(
+                course_id=course_id,
+                filename=filename,
+                filepath=saved_path,
+                file_type=os.path.splitext(filename)[1][1:],
+                content_hash=content_hash
+            )
+            if content_hash in sources:
+                document.body = DocumentContent(data=sources[content_hash].body.data)
+                document.extracted = True
+            else:
+                document.content, document.extracted = extracted[content_hash]
+            documents.append(document)
+        self.db.add_all(documents)
+        self.db.flush()
+
+        documents_chunks = []
+        document_sources = {}
+        for document in documents:
+            source = sources.get(document.content_hash)
+            if source is None:
+                documents_chunks.append((document, self.indexing_service.build_chunks(document)))
+            else:
+                documents_chunks.append((document, self.indexing_service.copy_chunks(source, document)))
+                document_sources[document.id] = source
+        self.db.commit()
+        self.indexing_service.index_new_documents(documents_chunks, document_sources)
+        return documents
+
+    def _find_same_content(self, content_hash: str):
+        """
+        查找内容相同且提取成功的已有文档（最早上传的一份）
+
+        提取失败的文档只保存了错误说明，不复用，相同文件再次上传时重新提取。
+
+        Args:
+            content_hash: 文件内容SHA-256
+
+        Returns:
+            CourseDocument: 文档对象，不存在时返回 None
+        """
+        return self.db.query(CourseDocument).filter(
+            CourseDocument.content_hash == content_hash,
+            CourseDocument.extracted.is_(True)
+        ).order_by(CourseDocument.id).first()
+
     def get_course_documents(self, course_id: int):
         """
-        获取课程的所有文档
+        获取课程的所有文档（只读取文档信息，文本在访问 content 时才读取）
         
         Args:
             course_id: 课程ID
@@ -158,8 +309,38 @@ class CourseService:
         
         course = self.db.query(Course).filter_by(id=course_id).first()
         if course:
+            self.indexing_service.remove_course(course_id)
+            self.db.query(DocumentContent).filter(DocumentContent.document_id.in_(
+                select(CourseDocument.id).where(CourseDocument.course_id == course_id)
+            )).delete()
             self.db.delete(course)
             self.db.commit()
+            # 数据库提交成功后再删除向量，提交失败时向量保持不变
+            self.indexing_service.remove_course_vectors(course_id)
+
+    def delete_document(self, document_id: int, teacher_id: int):
+        """
+        删除课程文档及其索引（仅教师）
+        
+        Args:
+            document_id: 文档ID
+            teacher_id: 教师ID
+        """
+        document = self.db.query(CourseDocument).filter_by(id=document_id).first()
+        if not document:
+            raise ValueError("文档不存在")
+
+        # 验证权限
+        if not PermissionHelper.can_manage_course(self.db, teacher_id, document.course_id):
+            raise PermissionError("无权删除此课程的文档")
+
+        course_id = document.course_id
+        self.indexing_service.remove_document(document)
+        self.db.query(DocumentContent).filter_by(document_id=document_id).delete()
+        self.db.delete(document)
+        self.db.commit()
+        # 数据库提交成功后再删除向量
+        self.indexing_service.remove_document_vectors(course_id, document_id)
 
     def get_course_by_id(self, course_id: int):
         """
@@ -0,0 +1,156 @@
+"""
+数据统计服务
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+from models.course import Course, CourseEnrollment, CourseDocument
+from models.qa import QARecord
+from models.quiz import Quiz, QuizAttempt, Answer
+from models.user import User
+
+# SQLite整数主键的最大值
+_MAX_ID = 2 ** 63 - 1
+
+
+class DashboardService:
+    """
+    数据统计服务类
+
+    统计数据用固定数量的聚合查询得到，查询次数与课程数、学生数无关。
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @staticmethod
+    def _count(model, course_column):
+        """按课程计数的关联子查询（走 course_id 索引）"""
+        return select(func.count()).select_from(model).where(course_column == Course.id).scalar_subquery()
+
+    def get_teacher_summary(self, teacher_id: int, student_preview: int = 10):
+        """
+        获取教师的课程统计汇总
+
+        Args:
+            teacher_id: 教师ID
+            student_preview: 每门课程返回的学生姓名数
+
+        Returns:
+            dict: 汇总数据（课程数、选课人次、试卷数、提问数）及每门课程的统计，
+                  courses 中每项包含 id、name、student_count、document_count、
+                  quiz_count、question_count、student_names
+        """
+        rows = self.db.query(
+            Course.id,
+            Course.name,
+            self._count(CourseEnrollment, CourseEnrollment.course_id).label('student_count'),
+            self._count(CourseDocument, CourseDocument.course_id).label('document_count'),
+            self._count(Quiz, Quiz.course_id).label('quiz_count'),
+            self._count(QARecord, QARecord.course_id).label('question_count')
+        ).filter(Course.teacher_id == teacher_id).order_by(Course.id).all()
+
+        courses = [{
+            'id': row.id,
+            'name': row.name,
+            'student_count': row.student_count,
+            'document_count': row.document_count,
+            'quiz_count': row.quiz_count,
+            'question_count': row.question_count,
+            'student_names': []
+        } for row in rows]
+
+        if courses and student_preview > 0:
+            names = self._first_student_names(teacher_id, student_preview)
+            for course in courses:
+                course['student_names'] = names.get(course['id'], [])
+
+        return {
+            'course_count': len(courses),
+            'total_students': sum(c['student_count'] for c in courses),
+            'total_quizzes': sum(c['quiz_count'] for c in courses),
+            'total_questions': sum(c['question_count'] for c in courses),
+            'courses': courses
+        }
+
+    def get_student_summary(self, student_id: int):
+        """
+        获取学生的学习统计（一次聚合查询）
+
+        Args:
+            student_id: 学生ID
+
+        Returns:
+            dict: 已选课程数、提问次数、完成测验数、平均分（没有完成的测验时为 None）、
+                  待批改题目数（未计入平均分）
+        """
+        course_count = select(func.count()).select_from(CourseEnrollment).where(
+            CourseEnrollment.student_id == student_id
+        ).scalar_subquery()
+        question_count = select(func.count()).select_from(QARecord).where(
+            QARecord.user_id == student_id
+        ).scalar_subquery()
+        pending_count = select(func.count()).select_from(Answer).join(
+            QuizAttempt, Answer.attempt_id == QuizAttempt.id
+        ).where(
+            QuizAttempt.student_id == student_id,
+            QuizAttempt.is_completed == True,
+            Answer.points_earned.is_(None)
+        ).scalar_subquery()
+
+        row = self.db.query(
+            course_count.label('course_count'),
+            question_count.label('question_count'),
+            pending_count.label('pending_count'),
+            func.count(QuizAttempt.id).label('completed_quizzes'),
+            func.avg(QuizAttempt.score).label('average_score')
+        ).filter(
+            QuizAttempt.student_id == student_id,
+            QuizAttempt.is_completed == True
+        ).one()
+
+        return {
+            'course_count': row.course_count,
+            'question_count': row.question_count,
+            'completed_quizzes': row.completed_quizzes,
+            'average_score': row.average_score,
+            'pending_count': row.pending_count
+        }
+
+    def _first_student_names(self, teacher_id: int, limit: int):
+        """
+        一次查询取出教师每门课程最早选课的若干名学生姓名
+
+        先对每门课程取第 limit 条选课记录的ID作为上界，再按 (course_id, id) 索引
+        只读取上界以内的记录；相比 ROW_NUMBER() 窗口函数不需要扫描全部选课记录。
+
+        Args:
+            teacher_id: 教师ID
+            limit: 每门课程的人数
+
+        Returns:
+            dict: 课程ID -> 学生姓名列表（按选课顺序）
+        """
+        nth_id = select(CourseEnrollment.id).where(
+            CourseEnrollment.course_id == Course.id
+        ).order_by(CourseEnrollment.id).offset(limit - 1).limit(1).scalar_subquery()
+
+        cutoffs = self.db.query(
+            Course.id.label('course_id'),
+            # 选课人数不足 limit 时不设上界
+            func.coalesce(nth_id, _MAX_ID).label('cutoff')
+        ).filter(Course.teacher_id == teacher_id).subquery()
+
+        rows = self.db.query(cutoffs.c.course_id, User.real_name).join(
+            CourseEnrollment,
+            and_(CourseEnrollment.course_id == cutoffs.c.course_id, CourseEnrollment.id <= cutoffs.c.cutoff)
+        ).join(User, User.id == CourseEnrollment.student_id).order_by(
+            cutoffs.c.course_id, CourseEnrollment.id
+        ).all()
+
+        names = {}
+        for course_id, real_name in rows:
+            names.setdefault(course_id, []).append(real_name)
+        return names
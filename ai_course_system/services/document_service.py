@@ -3,16 +3,138 @@
 """
 import os
 import sys
+import codecs
+import hashlib
+import shutil
+import tempfile
+from collections import namedtuple
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import fitz  # PyMuPDF
 from docx import Document
 import numpy as np
-from config import UPLOAD_DIR
+from config import UPLOAD_DIR, UPLOAD_OBJECTS_DIR, SUPPORTED_DOCUMENT_TYPES, EXTRACT_WORKERS, PDF_PAGES_PER_TASK
+
+
+# 计算哈希、复制文件时每次读取的字节数
+_FILE_BLOCK_SIZE = 1024 * 1024
+
+# 文本文件每次读取的字符数
+_TEXT_BLOCK_SIZE = 64 * 1024
+
+# 各类文件提取失败时保存的说明
+_ERROR_PREFIXES = {
+    '.pdf': "PDF解析失败",
+    '.docx': "Word文档解析失败",
+    '.doc': "Word文档解析失败",
+    '.txt': "文本文件读取失败",
+}
+
+# 批量提取的结果：ok 为 False 时 text 为错误说明
+ExtractedText = namedtuple('ExtractedText', ['text', 'ok'])
+
+
+def _iter_pdf_pages(filepath, start=0, end=None):
+    """逐页产出PDF第 start 页到第 end 页（不含）的文本，出错时抛出异常"""
+    with fitz.open(filepath) as doc:
+        end = doc.page_count if end is None else min(end, doc.page_count)
+        for i in range(start, end):
+            yield doc[i].get_text()
+
+
+def _read_pdf_pages(filepath, start=0, end=None):
+    """读取PDF第 start 页到第 end 页（不含）的文本，出错时抛出异常"""
+    return "".join(_iter_pdf_pages(filepath, start, end))
+
+
+def _iter_docx_paragraphs(filepath):
+    """逐段产出Word文档的文本（每段以换行结尾）"""
+    for paragraph in Document(filepath).paragraphs:
+        yield paragraph.text + "\n"
+
+
+def _detect_text_encoding(filepath):
+    """逐块校验文件是否为UTF-8编码，否则按GBK读取"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        with open(filepath, 'rb') as f:
+            while True:
+                block = f.read(_TEXT_BLOCK_SIZE)
+                decoder.decode(block, final=not block)
+                if not block:
+                    return 'utf-8'
+    except UnicodeDecodeError:
+        return 'gbk'
+
+
+def _iter_txt_blocks(filepath):
+    """按固定大小逐块产出文本文件的内容"""
+    with open(filepath, 'r', encoding=_detect_text_encoding(filepath)) as f:
+        while True:
+            block = f.read(_TEXT_BLOCK_SIZE)
+            if not block:
+                break
+            yield block
+
+
+def _extract_task(filepath, start, end):
+    """
+    进程池中执行的提取任务
+
+    start 为 None 时提取整个文件，否则只读取PDF的一段页码；出错时抛出异常由调用方处理。
+    """
+    if start is None:
+        return "".join(DocumentService.iter_text_segments(filepath))
+    return _read_pdf_pages(filepath, start, end)
 
 
 class DocumentService:
     """文档处理服务类"""
 
+    @staticmethod
+    def iter_text_segments(filepath):
+        """
+        逐段产出文件的文本：PDF按页，Word按段落，文本文件按固定大小的块
+
+        调用方可以边读取边切分、建立索引，不需要先拼出完整文本；
+        需要完整文本时用 "".join() 一次拼接。
+
+        Args:
+            filepath: 文件路径
+
+        Yields:
+            str: 一段文本
+
+        Raises:
+            ValueError: 不支持的文件格式
+            Exception: 文件解析失败
+        """
+        ext = os.path.splitext(filepath)[1].lower()
+
+        if ext == '.pdf':
+            return _iter_pdf_pages(filepath)
+        elif ext in ['.docx', '.doc']:
+            return _iter_docx_paragraphs(filepath)
+        elif ext == '.txt':
+            return _iter_txt_blocks(filepath)
+        else:
+            raise ValueError("不支持的文件格式")
+
+    @staticmethod
+    def describe_extract_error(filepath, error):
+        """
+        提取失败时代替文本内容保存的说明
+
+        Args:
+            filepath: 文件路径
+            error: iter_text_segments 抛出的异常
+
+        Returns:
+            str: 错误说明
+        """
+        prefix = _ERROR_PREFIXES.get(os.path.splitext(filepath)[1].lower())
+        return f"{prefix}: {str(error)}" if prefix else str(error)
+
     @staticmethod
     def extract_text_from_pdf(filepath):
         """
@@ -25,12 +147,7 @@ class DocumentService:
             str: 提取的文本内容
         """
         try:
-            doc = fitz.open(filepath)
-            text = ""
-            for page in doc:
-                text += page.get_text()
-            doc.close()
-            return text
+            return _read_pdf_pages(filepath)
         except Exception as e:
             return f"PDF解析失败: {str(e)}"
 
@@ -46,18 +163,14 @@ class DocumentService:
             str: 提取的文本内容
         """
         try:
-            doc = Document(filepath)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text
+            return "".join(_iter_docx_paragraphs(filepath))
         except Exception as e:
             return f"Word文档解析失败: {str(e)}"
 
     @staticmethod
     def extract_text_from_txt(filepath):
         """
-        从文本文件读取内容
+        从文本文件读取内容（UTF-8，否则按GBK）
         
         Args:
             filepath: 文本文件路径
@@ -66,14 +179,9 @@ class DocumentService:
             str: 文件内容
         """
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return f.read()
-        except:
-            try:
-                with open(filepath, 'r', encoding='gbk') as f:
-                    return f.read()
-            except Exception as e:
-                return f"文本文件读取失败: {str(e)}"
+            return "".join(_iter_txt_blocks(filepath))
+        except Exception as e:
+            return f"文本文件读取失败: {str(e)}"
 
     @staticmethod
     def extract_text(filepath):
@@ -84,43 +192,288 @@ class DocumentService:
             filepath: 文件路径
             
         Returns:
-            str: 提取的文本内容
+            str: 提取的文本内容（失败时为错误说明）
         """
-        ext = os.path.splitext(filepath)[1].lower()
-        
-        if ext == '.pdf':
-            return DocumentService.extract_text_from_pdf(filepath)
-        elif ext in ['.docx', '.doc']:
-            return DocumentService.extract_text_from_docx(filepath)
-        elif ext == '.txt':
-            return DocumentService.extract_text_from_txt(filepath)
+        try:
+            return "".join(DocumentService.iter_text_segments(filepath))
+        except Exception as e:
+            return DocumentService.describe_extract_error(filepath, e)
+
+    @staticmethod
+    def extract_texts(filepaths, max_workers=EXTRACT_WORKERS, pages_per_task=PDF_PAGES_PER_TASK,
+                      progress_callback=None):
+        """
+        用多个进程并行提取多个文件的文本
+
+        超过 pages_per_task 页的PDF按页码范围拆成多个任务，分给不同进程提取后按顺序拼接。
+        只有一个任务时直接在当前进程中提取，不启动进程池。
+
+        Args:
+            filepaths: 文件路径列表
+            max_workers: 进程数，None 为CPU核数
+            pages_per_task: 每个PDF任务的页数
+            progress_callback: 每完成一个任务调用 progress_callback(已完成任务数, 任务总数)
+
+        Returns:
+            list: 与 filepaths 顺序一致的 ExtractedText(文本, 是否成功)，提取失败的文件文本为错误说明
+        """
+        # 任务：(文件下标, 起始页, 结束页)，起始页为 None 表示整个文件
+        tasks = []
+        for i, filepath in enumerate(filepaths):
+            page_count = 0
+            if os.path.splitext(filepath)[1].lower() == '.pdf':
+                try:
+                    with fitz.open(filepath) as doc:
+                        page_count = doc.page_count
+                except Exception:
+                    page_count = 0
+            if page_count > pages_per_task:
+                tasks.extend((i, start, start + pages_per_task) for start in range(0, page_count, pages_per_task))
+            else:
+                tasks.append((i, None, None))
+
+        parts = [None] * len(tasks)
+        if len(tasks) <= 1:
+            for n, (i, start, end) in enumerate(tasks):
+                try:
+                    parts[n] = _extract_task(filepaths[i], start, end)
+                except Exception as e:
+                    parts[n] = e
+            if progress_callback and tasks:
+                progress_callback(1, 1)
         else:
-            return "不支持的文件格式"
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    executor.submit(_extract_task, filepaths[i], start, end): n
+                    for n, (i, start, end) in enumerate(tasks)
+                }
+                for done, future in enumerate(as_completed(futures), 1):
+                    try:
+                        parts[futures[future]] = future.result()
+                    except Exception as e:
+                        parts[futures[future]] = e
+                    if progress_callback:
+                        progress_callback(done, len(tasks))
+
+        # 按文件拼接各段文本，任一段失败时整个文件记为解析失败
+        texts = [[] for _ in filepaths]
+        for (i, _, _), part in zip(tasks, parts):
+            texts[i].append(part)
+        results = []
+        for filepath, file_parts in zip(filepaths, texts):
+            error = next((part for part in file_parts if isinstance(part, Exception)), None)
+            if error is None:
+                results.append(ExtractedText("".join(file_parts), True))
+            else:
+                results.append(ExtractedText(DocumentService.describe_extract_error(filepath, error), False))
+        return results
 
     @staticmethod
-    def save_uploaded_file(file_data, filename, course_id):
+    def collect_files(paths):
         """
-        保存上传的文件
-        
+        展开目录，返回其中所有支持的文档（按路径排序）
+
         Args:
-            file_data: 文件数据
-            filename: 文件名
-            course_id: 课程ID
-            
+            paths: 文件或目录路径列表
+
         Returns:
-            str: 保存的文件路径
+            list: 文件路径列表
+        """
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                for root, _, names in os.walk(path):
+                    files.extend(os.path.join(root, name) for name in sorted(names)
+                                 if os.path.splitext(name)[1].lower() in SUPPORTED_DOCUMENT_TYPES)
+            elif os.path.splitext(path)[1].lower() in SUPPORTED_DOCUMENT_TYPES:
+                files.append(path)
+        return sorted(files)
+
+    @staticmethod
+    def file_hash(filepath):
+        """
+        计算文件内容的SHA-256（分块读取）
+
+        Args:
+            filepath: 文件路径
+
+        Returns:
+            str: 十六进制哈希值
+        """
+        digest = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for block in iter(lambda: f.read(_FILE_BLOCK_SIZE), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def object_path(content_hash, filename):
+        """
+        内容寻址存储中的文件路径（保留扩展名以便按类型提取）
+
+        存储文件写入后不再改变，其内容始终与 content_hash 一致。
+
+        Args:
+            content_hash: 文件内容SHA-256
+            filename: 文件名（只取扩展名）
+
+        Returns:
+            str: 存储文件路径
+        """
+        ext = os.path.splitext(filename)[1].lower()
+        return os.path.join(UPLOAD_OBJECTS_DIR, content_hash[:2], content_hash + ext)
+
+    @staticmethod
+    def _temp_path(directory):
+        """在目标目录创建临时文件（写完后改名为目标文件，中断时不会留下不完整的文件）"""
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        os.close(fd)
+        return tmp_path
+
+    @staticmethod
+    def _copy_and_hash(src, dst, progress_callback=None):
+        """
+        分块复制文件并同时计算SHA-256
+
+        复用同一块缓冲区读写，内存占用与文件大小无关；写完后同步到磁盘。
+
+        Args:
+            src: 源文件路径
+            dst: 目标文件路径
+            progress_callback: 复制进度回调 progress_callback(已复制字节数, 总字节数)
+
+        Returns:
+            str: 十六进制哈希值
+        """
+        digest = hashlib.sha256()
+        total = os.path.getsize(src)
+        copied = 0
+        buffer = bytearray(_FILE_BLOCK_SIZE)
+        view = memoryview(buffer)
+        with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+            while True:
+                size = fin.readinto(buffer)
+                if not size:
+                    break
+                digest.update(view[:size])
+                fout.write(view[:size])
+                copied += size
+                if progress_callback:
+                    progress_callback(copied, total)
+            fout.flush()
+            os.fsync(fout.fileno())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _commit_object(tmp_path, object_path):
+        """把写好的临时文件改名为存储文件；已存在相同内容时丢弃临时文件"""
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        if os.path.exists(object_path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, object_path)
+
+    @staticmethod
+    def _link_to_course(object_path, filename, course_id):
+        """
+        在课程目录中建立指向存储文件的硬链接（不支持硬链接时复制）
+
+        先在临时文件名上建立链接再改名。课程目录中已有内容不同的同名文件时
+        改用 "文件名_序号.扩展名"，不覆盖其他文档的文件。
+
+        Returns:
+            str: 课程目录中的文件路径
         """
-        # 创建课程专属目录
         course_dir = os.path.join(UPLOAD_DIR, f"course_{course_id}")
-        os.makedirs(course_dir, exist_ok=True)
-        
-        # 保存文件
+        name, ext = os.path.splitext(filename)
         filepath = os.path.join(course_dir, filename)
-        with open(filepath, 'wb') as f:
-            f.write(file_data)
-        
+        n = 0
+        while os.path.exists(filepath):
+            if os.path.samefile(filepath, object_path):
+                return filepath
+            n += 1
+            filepath = os.path.join(course_dir, f"{name}_{n}{ext}")
+
+        tmp_path = DocumentService._temp_path(course_dir)
+        os.remove(tmp_path)
+        try:
+            try:
+                os.link(object_path, tmp_path)
+            except OSError:
+                shutil.copyfile(object_path, tmp_path)
+            os.replace(tmp_path, filepath)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
         return filepath
 
+    @staticmethod
+    def store_file(filepath, filename, course_id, progress_callback=None):
+        """
+        把文件存入内容寻址存储并链接到课程目录
+
+        文件分块复制到临时文件，复制的同时计算SHA-256，完成后改名为存储文件，
+        只读取源文件一遍。相同内容的文件在磁盘上只保存一份，上传到多个课程时
+        各课程目录中是指向它的硬链接。
+
+        Args:
+            filepath: 源文件路径
+            filename: 保存的文件名
+            course_id: 课程ID
+            progress_callback: 复制进度回调 progress_callback(已复制字节数, 总字节数)
+
+        Returns:
+            tuple: (课程目录中的文件路径, 内容SHA-256)
+        """
+        tmp_path = DocumentService._temp_path(UPLOAD_OBJECTS_DIR)
+        try:
+            content_hash = DocumentService._copy_and_hash(filepath, tmp_path, progress_callback)
+            object_path = DocumentService.object_path(content_hash, filename)
+            DocumentService._commit_object(tmp_path, object_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return DocumentService._link_to_course(object_path, filename, course_id), content_hash
+
+    @staticmethod
+    def iter_chunks(segments, chunk_size=500, overlap=50):
+        """
+        对逐段产出的文本增量分块，结果与 chunk_text 对完整文本分块相同
+
+        只缓存尚未输出的末尾部分，内存占用与分块大小和单段长度有关，与文本总长度无关。
+
+        Args:
+            segments: 文本段的可迭代对象
+            chunk_size: 每块大小（字符数）
+            overlap: 重叠大小
+
+        Yields:
+            str: 文本块（跳过只含空白的块）
+        """
+        step = chunk_size - overlap
+        buffer = ""
+        for segment in segments:
+            buffer += segment
+            # 输出缓冲区中所有完整的分块，再丢弃下一块起点之前的内容
+            start = 0
+            while start + chunk_size <= len(buffer):
+                chunk = buffer[start:start + chunk_size]
+                if chunk.strip():
+                    yield chunk
+                start += step
+            buffer = buffer[start:]
+
+        # 剩余不足一块的内容
+        start = 0
+        while start < len(buffer):
+            chunk = buffer[start:start + chunk_size]
+            if chunk.strip():
+                yield chunk
+            start += step
+
     @staticmethod
     def chunk_text(text, chunk_size=500, overlap=50):
         """
@@ -134,15 +487,4 @@ class DocumentService:
         Returns:
             list: 文本块列表
         """
-        chunks = []
-        start = 0
-        text_length = len(text)
-        
-        while start < text_length:
-            end = start + chunk_size
-            chunk = text[start:end]
-            if chunk.strip():
-                chunks.append(chunk)
-            start += (chunk_size - overlap)
-        
-        return chunks
+        return list(DocumentService.iter_chunks([text], chunk_size, overlap))
@@ -0,0 +1,111 @@
+"""
+文本向量化服务
+"""
+import sys
+import os
+import math
+import logging
+import zlib
+from collections import Counter
+from functools import lru_cache
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (EMBEDDING_BACKEND, EMBEDDING_MODEL, EMBEDDING_DIM,
+                    EMBEDDING_API_KEY, EMBEDDING_API_BASE, EMBEDDING_BATCH_SIZE)
+from .ai_client import get_ai_client
+from .tokenizer import tokenize
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=200000)
+def _hash_term(term):
+    """词项哈希，返回 (维度下标, 符号)"""
+    h = zlib.crc32(term.encode('utf-8'))
+    return h >> 1, 1.0 if h & 1 else -1.0
+
+
+class HashingEmbedder:
+    """
+    本地确定性向量化：对字符二元组/单词做带符号的特征哈希
+
+    不依赖网络，同一文本在任何机器上得到相同向量，可在API不可用时替代。
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+        self.name = f"hash-{dim}"
+
+    def embed(self, texts):
+        """
+        向量化文本
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            np.ndarray: 形状为 (len(texts), dim) 的单位向量矩阵
+        """
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term, freq in Counter(tokenize(text)).items():
+                h, sign = _hash_term(term)
+                vectors[row, h % self.dim] += sign * (1.0 + math.log(freq))
+        return _normalize(vectors)
+
+
+class APIEmbedder:
+    """通过OpenAI兼容的Embedding接口向量化"""
+
+    def __init__(self, model=EMBEDDING_MODEL):
+        self.model = model
+        self.name = f"api-{model}"
+        self.client = get_ai_client(EMBEDDING_API_KEY, EMBEDDING_API_BASE)
+
+    def embed(self, texts):
+        """
+        向量化文本
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            np.ndarray: 单位向量矩阵
+        """
+        # 分批并发请求
+        batches = [texts[start:start + EMBEDDING_BATCH_SIZE] for start in range(0, len(texts), EMBEDDING_BATCH_SIZE)]
+        rows = [vector for batch in self.client.embed_many(batches, self.model) for vector in batch]
+        return _normalize(np.asarray(rows, dtype=np.float32))
+
+
+def _normalize(vectors):
+    """按行L2归一化，全零行保持为零"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+_default_embedder = None
+
+
+def get_embedder():
+    """
+    获取进程内共享的向量化器
+
+    配置为 api 时先试探接口，不可用则退回本地哈希向量化。
+
+    Returns:
+        HashingEmbedder | APIEmbedder: 向量化器
+    """
+    global _default_embedder
+    if _default_embedder is None:
+        embedder = HashingEmbedder()
+        if EMBEDDING_BACKEND == 'api':
+            try:
+                api_embedder = APIEmbedder()
+                api_embedder.embed(["ping"])
+                embedder = api_embedder
+            except Exception as e:
+                logger.warning("Embedding接口不可用，使用本地向量化: %s", e)
+        _default_embedder = embedder
+    return _default_embedder
@@ -0,0 +1,270 @@
+"""
+索引服务 - 文档上传时预先计算检索结构
+"""
+import sys
+import os
+import json
+import threading
+from collections import Counter, namedtuple
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models.course import CourseDocument, DocumentChunk
+from config import CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_FLUSH_SIZE
+from .document_service import DocumentService
+from .tokenizer import tokenize
+from .vector_store import VectorStore
+
+
+# 已写入数据库的片段中建立向量索引需要的字段
+ChunkText = namedtuple('ChunkText', ['id', 'chunk_index', 'text'])
+
+
+class IndexingService:
+    """
+    索引服务类
+
+    每个文档在上传时只处理一次：切分片段、统计词频写入 document_chunks 表，
+    片段向量写入课程向量存储。检索时只读取这些预先计算的结果。
+    """
+
+    # 本进程内已检查过旧文档补建索引的课程
+    _backfilled_courses = set()
+    # 多个后台任务同时检索同一课程时只补建一次
+    _backfill_lock = threading.Lock()
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def build_chunks(self, document, segments=None):
+        """
+        切分文档并统计每个片段的词频（不提交）
+
+        片段每 CHUNK_FLUSH_SIZE 个写入一次数据库并移出会话，词频等数据随即释放，
+        只保留建立向量索引需要的片段序号和文本。
+
+        Args:
+            document: 文档对象（需已写入数据库）
+            segments: 文档文本的分段（如 DocumentService.iter_text_segments 的结果），
+                      边读取边切分；默认切分 document.content
+
+        Returns:
+            list: ChunkText(片段ID, 片段序号, 文本) 列表
+        """
+        chunks = []
+        if segments is None:
+            if not document.content:
+                return chunks
+            segments = [document.content]
+
+        batch = []
+        for index, text in enumerate(DocumentService.iter_chunks(segments, CHUNK_SIZE, CHUNK_OVERLAP)):
+            batch.append(DocumentChunk(
+                document_id=document.id,
+                course_id=document.course_id,
+                chunk_index=index,
+                text=text,
+                term_freqs=json.dumps(Counter(tokenize(text)), ensure_ascii=False)
+            ))
+            if len(batch) >= CHUNK_FLUSH_SIZE:
+                self._flush_chunks(batch, chunks)
+        self._flush_chunks(batch, chunks)
+        return chunks
+
+    def _flush_chunks(self, batch, chunks):
+        """把一批片段写入数据库（不提交）并移出会话，分配的ID与文本记入 chunks"""
+        if not batch:
+            return
+        self.db.add_all(batch)
+        self.db.flush()
+        for chunk in batch:
+            chunks.append(ChunkText(chunk.id, chunk.chunk_index, chunk.text))
+            self.db.expunge(chunk)
+        batch.clear()
+
+    def copy_chunks(self, source, document):
+        """
+        复制相同内容文档的片段与词频，不重新切分和分词（不提交）
+
+        Args:
+            source: 内容相同的已有文档
+            document: 新文档对象（需已分配ID）
+
+        Returns:
+            list: ChunkText(片段ID, 片段序号, 文本) 列表
+        """
+        rows = self.db.query(
+            DocumentChunk.chunk_index, DocumentChunk.text, DocumentChunk.term_freqs
+        ).filter_by(document_id=source.id).order_by(DocumentChunk.chunk_index).all()
+        chunks = []
+        self._flush_chunks([DocumentChunk(
+            document_id=document.id,
+            course_id=document.course_id,
+            chunk_index=row.chunk_index,
+            text=row.text,
+            term_freqs=row.term_freqs
+        ) for row in rows], chunks)
+        return chunks
+
+    @staticmethod
+    def _reusable_vectors(store, source, count):
+        """内容相同的已有文档的片段向量（向量化器不同或片段数不一致时返回 None）"""
+        if source is None or count == 0:
+            return None
+        vectors = VectorStore(source.course_id, store.embedder).get_document_vectors(source.id)
+        return vectors if vectors is not None and len(vectors) == count else None
+
+    def _add_vectors(self, store, documents_chunks, sources):
+        """向量化片段并追加到存储；内容相同的已有文档的向量直接复用"""
+        if store.needs_rebuild():
+            # 片段已写入数据库，重建时一并向量化
+            self.rebuild_course_vectors(store.course_id)
+            return
+
+        chunk_ids = []
+        document_ids = []
+        reused = []
+        pending = []
+        for document, chunks in documents_chunks:
+            vectors = self._reusable_vectors(store, sources.get(document.id), len(chunks))
+            if vectors is None:
+                pending.extend(chunk.text for chunk in chunks)
+            reused.append(vectors)
+            chunk_ids.extend(chunk.id for chunk in chunks)
+            document_ids.extend([document.id] * len(chunks))
+        if not chunk_ids:
+            return
+
+        # 需要向量化的片段合并为一次调用，再按文档顺序与复用的向量拼接
+        embedded = store.embedder.embed(pending) if pending else None
+        blocks = []
+        offset = 0
+        for (document, chunks), vectors in zip(documents_chunks, reused):
+            if vectors is None and chunks:
+                vectors = embedded[offset:offset + len(chunks)]
+                offset += len(chunks)
+            if vectors is not None:
+                blocks.append(vectors)
+        store.add_chunks(chunk_ids, document_ids, np.concatenate(blocks).astype(np.float32))
+
+    def index_vectors(self, document, chunks, source=None):
+        """
+        将文档片段写入课程向量存储（重复索引时先移除旧向量）
+
+        Args:
+            document: 文档对象
+            chunks: ChunkText 列表
+            source: 内容相同的已有文档，其向量直接复用
+        """
+        store = VectorStore(document.course_id)
+        store.remove_document(document.id)
+        self._add_vectors(store, [(document, chunks)], {document.id: source} if source else {})
+
+    def index_new_documents(self, documents_chunks, sources=None):
+        """
+        将多个新文档的片段一次追加到课程向量存储
+
+        Args:
+            documents_chunks: (文档对象, ChunkText 列表) 列表，文档须属于同一课程且尚未建立向量索引
+            sources: 文档ID -> 内容相同的已有文档，其向量直接复用
+        """
+        if not documents_chunks:
+            return
+        self._add_vectors(VectorStore(documents_chunks[0][0].course_id), documents_chunks, sources or {})
+
+    def index_document(self, document):
+        """
+        为单个文档建立索引
+
+        Args:
+            document: 文档对象（需已分配ID）
+        """
+        chunks = self.build_chunks(document)
+        self.db.commit()
+        self.index_vectors(document, chunks)
+
+    def remove_document(self, document):
+        """
+        删除文档的片段（不提交）；提交成功后再调用 remove_document_vectors 删除向量
+
+        Args:
+            document: 文档对象
+        """
+        self.db.query(DocumentChunk).filter_by(document_id=document.id).delete()
+        self.db.expire(document, ['chunks'])
+
+    @staticmethod
+    def remove_document_vectors(course_id: int, document_id: int):
+        """
+        从课程向量存储中删除文档的向量
+
+        Args:
+            course_id: 课程ID
+            document_id: 文档ID
+        """
+        VectorStore(course_id).remove_document(document_id)
+
+    def remove_course(self, course_id: int):
+        """
+        删除课程的全部片段（不提交）；提交成功后再调用 remove_course_vectors 删除向量
+
+        Args:
+            course_id: 课程ID
+        """
+        self.db.query(DocumentChunk).filter_by(course_id=course_id).delete()
+
+    def remove_course_vectors(self, course_id: int):
+        """
+        删除课程的向量存储
+
+        Args:
+            course_id: 课程ID
+        """
+        VectorStore(course_id).clear()
+        self._backfilled_courses.discard(course_id)
+
+    def rebuild_course_vectors(self, course_id: int):
+        """
+        从数据库中的片段重建课程的向量存储（旧格式的存储或向量化器变更后调用）
+
+        Args:
+            course_id: 课程ID
+        """
+        store = VectorStore(course_id)
+        store.clear()
+        result = self.db.execute(
+            select(DocumentChunk.id, DocumentChunk.document_id, DocumentChunk.text).where(
+                DocumentChunk.course_id == course_id
+            ).order_by(DocumentChunk.id).execution_options(yield_per=CHUNK_FLUSH_SIZE)
+        )
+        # 分批向量化并追加，不一次读入全部片段
+        for rows in result.partitions():
+            store.add_chunks([row.id for row in rows], [row.document_id for row in rows],
+                             store.embedder.embed([row.text for row in rows]))
+
+    def ensure_course_indexed(self, course_id: int):
+        """
+        为索引功能上线前上传的旧文档补建索引（每个课程每个进程只检查一次），
+        向量存储为旧格式或向量化器已变更时从数据库重建
+
+        Args:
+            course_id: 课程ID
+        """
+        if course_id in self._backfilled_courses and not VectorStore(course_id).needs_rebuild():
+            return
+
+        with self._backfill_lock:
+            if course_id not in self._backfilled_courses:
+                indexed = self.db.query(DocumentChunk.document_id).filter_by(course_id=course_id)
+                documents = self.db.query(CourseDocument).filter(
+                    CourseDocument.course_id == course_id,
+                    ~CourseDocument.id.in_(indexed)
+                ).all()
+
+                for document in documents:
+                    self.index_document(document)
+                self._backfilled_courses.add(course_id)
+
+            if VectorStore(course_id).needs_rebuild():
+                self.rebuild_course_vectors(course_id)
@@ -1,11 +1,16 @@
 """
 问答服务
 """
-from sqlalchemy.orm import Session
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session, joinedload
+from models.course import Course
 from models.qa import QARecord
-from models.course import CourseDocument
-from .ai_service import AIService
+from models.user import User
+from .ai_service import AIService, AI_ERROR_PREFIX
+from .retrieval_service import RetrievalService
+from .similar_question_service import SimilarQuestionService
 from auth.permissions import PermissionHelper
+from config import QA_DEDUP_ENABLED
 
 
 class QAService:
@@ -14,6 +19,8 @@ class QAService:
     def __init__(self, db: Session):
         self.db = db
         self.ai_service = AIService()
+        self.retrieval_service = RetrievalService(db)
+        self.similar_service = SimilarQuestionService(db)
 
     def ask_question(self, user_id: int, course_id: int, question: str):
         """
@@ -25,79 +32,202 @@ class QAService:
             question: 问题内容
             
         Returns:
-            dict: 包含答案和上下文的字典
+            dict: 包含答案和上下文的字典，reused_from 为复用的历史记录ID（AI生成时为 None）
         """
-        # 获取课程相关文档
-        documents = self.db.query(CourseDocument).filter_by(course_id=course_id).all()
-        
-        # 简单的关键词匹配检索（实际应该使用向量数据库）
-        context = self._retrieve_relevant_context(question, documents)
+        # 同课程中已有足够相似的问题时直接复用其回答
+        source = self._find_reusable_record(course_id, question)
+        if source:
+            self._save_record(user_id, course_id, question, source.answer, source.context, source.id)
+            return {
+                'answer': source.answer,
+                'context': source.context,
+                'reused_from': source.id
+            }
+
+        # 从预先计算的课程索引中检索最相关的文档片段
+        context = self._retrieve_relevant_context(question, course_id)
         
         # 调用AI获取答案
         answer = self.ai_service.answer_question(question, context)
         
-        # 保存问答记录
+        # 保存问答记录（调用失败的回答不保存）
+        if not answer.startswith(AI_ERROR_PREFIX):
+            self._save_record(user_id, course_id, question, answer, context[:500] if context else "")
+        
+        return {
+            'answer': answer,
+            'context': context,
+            'reused_from': None
+        }
+
+    def ask_question_stream(self, user_id: int, course_id: int, question: str):
+        """
+        提问并流式获取AI回答，回答结束后保存问答记录
+        
+        Args:
+            user_id: 用户ID
+            course_id: 课程ID
+            question: 问题内容
+            
+        Yields:
+            str: 回答的增量文本
+
+        Raises:
+            RuntimeError: AI调用失败（包括输出一部分后中断），不保存问答记录，已产出的部分回复应丢弃
+        """
+        source = self._find_reusable_record(course_id, question)
+        if source:
+            self._save_record(user_id, course_id, question, source.answer, source.context, source.id)
+            yield source.answer
+            return
+
+        context = self._retrieve_relevant_context(question, course_id)
+
+        parts = []
+        # 调用失败时异常直接抛出，不完整的回答不保存，也就不会被相似问题复用
+        for delta in self.ai_service.answer_question_stream(question, context):
+            parts.append(delta)
+            yield delta
+
+        self._save_record(user_id, course_id, question, "".join(parts), context[:500] if context else "")
+
+    def _find_reusable_record(self, course_id: int, question: str):
+        """查找可复用回答的相似历史问题"""
+        if not QA_DEDUP_ENABLED:
+            return None
+        similar = self.similar_service.find_similar(course_id, question)
+        return similar[0] if similar else None
+
+    def _save_record(self, user_id, course_id, question, answer, context, reused_from_id=None):
+        """保存问答记录"""
         qa_record = QARecord(
             user_id=user_id,
             course_id=course_id,
             question=question,
             answer=answer,
-            context=context[:500] if context else ""  # 只保存部分上下文
+            context=context,  # 只保存部分上下文
+            reused_from_id=reused_from_id
         )
         self.db.add(qa_record)
         self.db.commit()
-        
-        return {
-            'answer': answer,
-            'context': context
-        }
+        return qa_record
 
-    def _retrieve_relevant_context(self, question: str, documents: list, max_length: int = 2000):
+    def _retrieve_relevant_context(self, question: str, course_id: int, max_length: int = 2000):
         """
         检索相关文档内容
         
         Args:
             question: 问题
-            documents: 文档列表
+            course_id: 课程ID
             max_length: 最大上下文长度
             
         Returns:
             str: 相关文档内容
         """
-        # 简化版：提取问题中的关键词，在文档中搜索
-        # 实际应该使用FAISS等向量数据库进行语义检索
-        
-        if not documents:
-            return "暂无课程资料"
-        
-        # 合并所有文档内容
-        all_content = ""
-        for doc in documents:
-            if doc.content:
-                all_content += f"\n\n【{doc.filename}】\n{doc.content}"
-        
-        # 简单截取前max_length个字符
-        # 实际应该基于相关性选择最相关的片段
-        if len(all_content) > max_length:
-            return all_content[:max_length] + "..."
-        
-        return all_content
+        context = self.retrieval_service.retrieve(question, course_id, max_length)
+        return context or "暂无课程资料"
 
-    def get_user_qa_history(self, user_id: int, course_id: int = None):
+    def get_user_qa_history(self, user_id: int, course_id: int = None, limit: int = None, offset: int = 0):
         """
-        获取用户的问答历史
+        获取用户的问答历史（按时间倒序，同时加载课程名称）
         
         Args:
             user_id: 用户ID
             course_id: 课程ID（可选）
+            limit: 最多返回的条数（可选，默认全部）
+            offset: 跳过的条数
             
         Returns:
             list: 问答记录列表
         """
-        query = self.db.query(QARecord).filter_by(user_id=user_id)
+        query = self.db.query(QARecord).options(
+            joinedload(QARecord.course).load_only(Course.name)
+        ).filter_by(user_id=user_id)
         if course_id:
             query = query.filter_by(course_id=course_id)
-        return query.order_by(QARecord.created_at.desc()).all()
+        query = query.order_by(QARecord.created_at.desc(), QARecord.id.desc())
+        if limit is not None:
+            query = query.limit(limit).offset(offset)
+        return query.all()
+
+    @staticmethod
+    def _keyset_page(query, cursor, page_size):
+        """
+        按 (created_at, id) 倒序取一页记录
+
+        Args:
+            query: 已设置筛选条件的查询
+            cursor: 上一页最后一条记录的 (created_at, id)，首页为 None
+            page_size: 每页条数
+
+        Returns:
+            tuple: (记录列表, 下一页游标)，没有更多记录时游标为 None
+        """
+        if cursor is not None:
+            query = query.filter(tuple_(QARecord.created_at, QARecord.id) < tuple_(*cursor))
+        # 多取一条判断是否还有下一页
+        records = query.order_by(QARecord.created_at.desc(), QARecord.id.desc()).limit(page_size + 1).all()
+        if len(records) <= page_size:
+            return records, None
+        last = records[page_size - 1]
+        return records[:page_size], (last.created_at, last.id)
+
+    def get_user_qa_page(self, user_id: int, course_id: int = None, cursor=None, page_size: int = 20):
+        """
+        分页获取用户的问答历史（游标分页，同时加载课程名称）
+        
+        Args:
+            user_id: 用户ID
+            course_id: 课程ID（可选）
+            cursor: 上一页返回的游标，首页为 None
+            page_size: 每页条数
+            
+        Returns:
+            tuple: (问答记录列表, 下一页游标)
+        """
+        query = self.db.query(QARecord).options(
+            joinedload(QARecord.course).load_only(Course.name)
+        ).filter(QARecord.user_id == user_id)
+        if course_id:
+            query = query.filter(QARecord.course_id == course_id)
+        return self._keyset_page(query, cursor, page_size)
+
+    def count_user_qa(self, user_id: int, course_id: int = None):
+        """
+        统计用户的问答记录数
+
+        Args:
+            user_id: 用户ID
+            course_id: 课程ID（可选）
+
+        Returns:
+            int: 记录数
+        """
+        query = self.db.query(func.count(QARecord.id)).filter(QARecord.user_id == user_id)
+        if course_id:
+            query = query.filter(QARecord.course_id == course_id)
+        return query.scalar()
+
+    def get_course_qa_page(self, course_id: int, teacher_id: int, cursor=None, page_size: int = 20):
+        """
+        分页获取课程的问答历史（教师查看，游标分页，同时加载提问者姓名）
+        
+        Args:
+            course_id: 课程ID
+            teacher_id: 教师ID
+            cursor: 上一页返回的游标，首页为 None
+            page_size: 每页条数
+            
+        Returns:
+            tuple: (问答记录列表, 下一页游标)
+        """
+        if not PermissionHelper.is_course_teacher(self.db, teacher_id, course_id):
+            raise PermissionError("无权查看此课程的问答记录")
+
+        query = self.db.query(QARecord).options(
+            joinedload(QARecord.user).load_only(User.real_name)
+        ).filter(QARecord.course_id == course_id)
+        return self._keyset_page(query, cursor, page_size)
 
     def get_course_qa_history(self, course_id: int, teacher_id: int):
         """
@@ -118,6 +248,30 @@ class QAService:
             QARecord.created_at.desc()
         ).all()
 
+    def get_course_reuse_stats(self, course_id: int, teacher_id: int):
+        """
+        获取课程提问中复用相似问题回答的统计（教师查看）
+        
+        Args:
+            course_id: 课程ID
+            teacher_id: 教师ID
+            
+        Returns:
+            dict: 提问总数与复用回答数
+        """
+        # 验证权限
+        if not PermissionHelper.is_course_teacher(self.db, teacher_id, course_id):
+            raise PermissionError("无权查看此课程的问答记录")
+
+        total, reused = self.db.query(
+            func.count(QARecord.id),
+            func.count(QARecord.reused_from_id)
+        ).filter(QARecord.course_id == course_id).one()
+        return {
+            'total_questions': total,
+            'reused_answers': reused
+        }
+
     def delete_qa_record(self, record_id: int, user_id: int):
         """
         删除问答记录
@@ -130,3 +284,4 @@ class QAService:
         if record:
             self.db.delete(record)
             self.db.commit()
+            SimilarQuestionService.invalidate(record.course_id)
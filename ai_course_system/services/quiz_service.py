@@ -1,21 +1,40 @@
 """
 测验服务
 """
-from sqlalchemy.orm import Session
+from sqlalchemy import func, case, cast, select, tuple_, Integer
+from sqlalchemy.orm import Session, joinedload, undefer
 from models.quiz import Quiz, Question, QuizAttempt, Answer
-from models.course import CourseDocument
-from .ai_service import AIService
+from .ai_service import AIService, split_question_types
+from .embedding_service import HashingEmbedder
+from .retrieval_service import RetrievalService
+from .similar_question_service import normalize_question
 from auth.permissions import PermissionHelper
+from config import QUIZ_DEDUP_THRESHOLD
 from datetime import datetime
+import numpy as np
 import json
+import math
+
+# 各题型的分值
+_QUESTION_POINTS = {
+    'choice': 10.0,
+    'true_false': 10.0,
+    'short_answer': 20.0
+}
+
+# AI无法批改（服务不可用或回复中没有分数）的主观题的反馈，这类答案的得分记为空
+PENDING_GRADE_FEEDBACK = "AI批改暂不可用，本题待重新批改"
 
 
 class QuizService:
     """测验服务类"""
 
+    _embedder = HashingEmbedder()
+
     def __init__(self, db: Session):
         self.db = db
         self.ai_service = AIService()
+        self.retrieval_service = RetrievalService(db)
 
     def generate_quiz(self, teacher_id: int, course_id: int, title: str, 
                      knowledge_point: str, question_count: int = 10):
@@ -36,9 +55,12 @@ class QuizService:
         if not PermissionHelper.is_course_teacher(self.db, teacher_id, course_id):
             raise PermissionError("无权为此课程生成测验")
         
-        # 获取课程文档作为上下文
-        documents = self.db.query(CourseDocument).filter_by(course_id=course_id).all()
-        context = self._get_course_context(documents)
+        # 从课程索引中检索与知识点相关的片段作为上下文
+        context = self._get_course_context(course_id, knowledge_point)
+        
+        # 先生成题目，再与测验一起保存
+        generated = self.ai_service.generate_quiz_questions(knowledge_point, context, question_count)
+        generated = self._dedupe_questions(generated, question_count)
         
         # 创建测验
         quiz = Quiz(
@@ -48,28 +70,63 @@ class QuizService:
             description=f"关于{knowledge_point}的测验"
         )
         self.db.add(quiz)
-        self.db.commit()
-        self.db.refresh(quiz)
+        self.db.flush()
         
-        # 生成题目（这里简化处理，实际应该调用AI生成）
-        self._generate_sample_questions(quiz.id, knowledge_point, question_count)
+        if generated:
+            self.db.add_all([
+                Question(
+                    quiz_id=quiz.id,
+                    question_type=item['type'],
+                    question_text=item['question'],
+                    options=json.dumps(item['options'], ensure_ascii=False) if item['options'] else None,
+                    correct_answer=item['correct_answer'],
+                    explanation=item['explanation'],
+                    points=_QUESTION_POINTS[item['type']]
+                )
+                for item in generated
+            ])
+            self.db.commit()
+        else:
+            # AI不可用时使用示例题目
+            self._generate_sample_questions(quiz.id, knowledge_point, question_count)
         
+        self.db.refresh(quiz)
         return quiz
 
-    def _get_course_context(self, documents: list, max_length: int = 3000):
+    def _dedupe_questions(self, questions, count):
+        """
+        去除内容相近的题目，并按题型比例截取到所需数量
+        
+        Args:
+            questions: AI生成的题目字典列表
+            count: 所需题目数
+            
+        Returns:
+            list: 去重后的题目列表
+        """
+        if not questions:
+            return []
+
+        vectors = self._embedder.embed([normalize_question(q['question']) for q in questions])
+        quotas = split_question_types(count)
+        kept, kept_vectors = [], []
+        for question, vector in zip(questions, vectors):
+            if quotas.get(question['type'], 0) <= 0:
+                continue
+            if kept_vectors and float(np.max(np.stack(kept_vectors) @ vector)) >= QUIZ_DEDUP_THRESHOLD:
+                continue
+            kept.append(question)
+            kept_vectors.append(vector)
+            quotas[question['type']] -= 1
+        return kept
+
+    def _get_course_context(self, course_id: int, knowledge_point: str, max_length: int = 3000):
         """获取课程上下文"""
-        context = ""
-        for doc in documents:
-            if doc.content:
-                context += doc.content + "\n\n"
-                if len(context) > max_length:
-                    break
-        return context[:max_length]
+        return self.retrieval_service.retrieve(knowledge_point, course_id, max_length)
 
     def _generate_sample_questions(self, quiz_id: int, knowledge_point: str, count: int):
         """
-        生成示例题目（简化版）
-        实际应该调用AI生成
+        生成示例题目（AI生成失败时使用）
         """
         # 选择题示例
         question1 = Question(
@@ -114,6 +171,21 @@ class QuizService:
         """获取课程的所有测验"""
         return self.db.query(Quiz).filter_by(course_id=course_id).all()
 
+    def get_course_quizzes_with_counts(self, course_id: int):
+        """
+        获取课程的所有测验及各测验的题目数（一次查询，不加载题目）
+
+        Args:
+            course_id: 课程ID
+
+        Returns:
+            list: (测验, 题目数) 列表
+        """
+        question_count = select(func.count()).select_from(Question).where(
+            Question.quiz_id == Quiz.id
+        ).scalar_subquery()
+        return [tuple(row) for row in self.db.query(Quiz, question_count).filter(Quiz.course_id == course_id).all()]
+
     def start_quiz(self, student_id: int, quiz_id: int):
         """
         学生开始测验
@@ -149,41 +221,195 @@ class QuizService:
             question_id: 题目ID
             student_answer: 学生答案
         """
-        question = self.db.query(Question).filter_by(id=question_id).first()
-        if not question:
-            raise ValueError("题目不存在")
-        
-        # 判断答案是否正确
-        is_correct = False
-        points_earned = 0.0
-        ai_feedback = ""
-        
-        if question.question_type in ['choice', 'true_false']:
-            # 客观题直接比较
-            is_correct = (student_answer.strip() == question.correct_answer.strip())
-            points_earned = question.points if is_correct else 0.0
-        else:
-            # 主观题使用AI批改
-            result = self.ai_service.grade_answer(
-                question.question_text,
-                question.correct_answer,
-                student_answer
-            )
-            points_earned = result['score']
-            ai_feedback = result['feedback']
-            is_correct = (points_earned >= question.points * 0.6)  # 60%以上算正确
+        self.submit_answers(attempt_id, {question_id: student_answer})
+
+    def submit_answers(self, attempt_id: int, answers: dict, progress_callback=None):
+        """
+        批量提交答案：客观题直接判分，主观题并发调用AI批改，全部答案一次提交
+
+        AI无法批改的主观题得分记为空，反馈为 PENDING_GRADE_FEEDBACK，之后用 regrade_pending 重新批改。
         
+        Args:
+            attempt_id: 尝试ID
+            answers: 题目ID -> 学生答案
+            progress_callback: 进度回调 progress_callback(已批改数, 总数)，可能在后台线程中调用
+            
+        Returns:
+            list: 保存的答案对象列表
+        """
+        questions = {
+            q.id: q for q in self.db.query(Question).filter(Question.id.in_(list(answers))).all()
+        }
+        if len(questions) < len(answers):
+            raise ValueError("题目不存在")
+
+        total = len(answers)
+        graded = 0
+
+        def report():
+            if progress_callback:
+                progress_callback(graded, total)
+
+        results = {}
+        subjective = []
+        for question_id, student_answer in answers.items():
+            question = questions[question_id]
+            if question.question_type in ['choice', 'true_false']:
+                # 客观题直接比较
+                is_correct = (student_answer.strip() == question.correct_answer.strip())
+                results[question_id] = (is_correct, question.points if is_correct else 0.0, "")
+                graded += 1
+            else:
+                subjective.append(question_id)
+        report()
+
+        # 主观题使用AI并发批改
+        def on_graded(i, result):
+            nonlocal graded
+            graded += 1
+            report()
+
+        grades = self.ai_service.grade_answers([
+            (questions[qid].question_text, questions[qid].correct_answer, answers[qid])
+            for qid in subjective
+        ], on_result=on_graded)
+
+        for question_id, grade in zip(subjective, grades):
+            results[question_id] = self._grade_result(questions[question_id], grade)
+
         # 保存答案
-        answer = Answer(
-            attempt_id=attempt_id,
-            question_id=question_id,
-            student_answer=student_answer,
-            is_correct=is_correct,
-            points_earned=points_earned,
-            ai_feedback=ai_feedback
+        records = [
+            Answer(
+                attempt_id=attempt_id,
+                question_id=question_id,
+                student_answer=answers[question_id],
+                is_correct=is_correct,
+                points_earned=points_earned,
+                ai_feedback=ai_feedback
+            )
+            for question_id, (is_correct, points_earned, ai_feedback) in results.items()
+        ]
+        self.db.add_all(records)
+        self.db.commit()
+        return records
+
+    @staticmethod
+    def _grade_result(question, grade):
+        """
+        把AI批改结果折算为 (是否正确, 得分, 反馈)
+
+        Args:
+            question: 题目
+            grade: AI批改结果，为 None 时记为待重新批改（是否正确与得分为空）
+        """
+        if grade is None:
+            return None, None, PENDING_GRADE_FEEDBACK
+        # AI按10分制评分，按题目分值折算
+        points_earned = round(grade['score'] / 10.0 * question.points, 2)
+        is_correct = (points_earned >= question.points * 0.6)  # 60%以上算正确
+        return is_correct, points_earned, grade['feedback']
+
+    def regrade_pending(self, attempt_id: int, progress_callback=None):
+        """
+        重新批改尝试中待批改的主观题，已完成的尝试同时更新总分
+
+        Args:
+            attempt_id: 尝试ID
+            progress_callback: 进度回调 progress_callback(已批改数, 总数)，可能在后台线程中调用
+
+        Returns:
+            int: 仍未能批改的题目数
+        """
+        return self._regrade(Answer.attempt_id == attempt_id, progress_callback=progress_callback)
+
+    def regrade_student_pending(self, student_id: int, progress_callback=None):
+        """
+        重新批改学生已完成的测验中待批改的主观题（学生查看学习记录时自动重试）
+
+        Args:
+            student_id: 学生ID
+            progress_callback: 进度回调 progress_callback(已批改数, 总数)，可能在后台线程中调用
+
+        Returns:
+            int: 仍未能批改的题目数
+        """
+        return self._regrade(
+            QuizAttempt.student_id == student_id,
+            QuizAttempt.is_completed == True,
+            progress_callback=progress_callback
+        )
+
+    def regrade_quiz_pending(self, quiz_id: int, teacher_id: int, progress_callback=None):
+        """
+        重新批改测验所有已完成尝试中待批改的主观题（教师查看统计时自动重试）
+
+        Args:
+            quiz_id: 测验ID
+            teacher_id: 教师ID
+            progress_callback: 进度回调 progress_callback(已批改数, 总数)，可能在后台线程中调用
+
+        Returns:
+            int: 仍未能批改的题目数
+        """
+        quiz = self.get_quiz_by_id(quiz_id)
+        if not quiz:
+            raise ValueError("测验不存在")
+
+        # 验证权限
+        if not PermissionHelper.is_course_teacher(self.db, teacher_id, quiz.course_id):
+            raise PermissionError("无权批改此测验")
+
+        return self._regrade(
+            QuizAttempt.quiz_id == quiz_id,
+            QuizAttempt.is_completed == True,
+            progress_callback=progress_callback
         )
-        self.db.add(answer)
+
+    def _regrade(self, *criteria, progress_callback=None):
+        """
+        重新批改符合条件的待批改答案（一次批量调用AI），更新所在的已完成尝试的总分
+
+        Args:
+            *criteria: 答案及其所属尝试的筛选条件
+            progress_callback: 进度回调 progress_callback(已批改数, 总数)
+
+        Returns:
+            int: 仍未能批改的题目数
+        """
+        pending = self.db.query(Answer).join(QuizAttempt, Answer.attempt_id == QuizAttempt.id).options(
+            joinedload(Answer.question)
+        ).filter(Answer.points_earned.is_(None), *criteria).all()
+        if not pending:
+            return 0
+
+        graded = 0
+
+        def on_graded(i, result):
+            nonlocal graded
+            graded += 1
+            if progress_callback:
+                progress_callback(graded, len(pending))
+
+        grades = self.ai_service.grade_answers([
+            (answer.question.question_text, answer.question.correct_answer, answer.student_answer)
+            for answer in pending
+        ], on_result=on_graded)
+        for answer, grade in zip(pending, grades):
+            answer.is_correct, answer.points_earned, answer.ai_feedback = self._grade_result(answer.question, grade)
+
+        attempts = self.db.query(QuizAttempt).filter(
+            QuizAttempt.id.in_({answer.attempt_id for answer in pending})
+        ).all()
+        for attempt in attempts:
+            if attempt.is_completed:
+                attempt.score = self._attempt_score(attempt)
         self.db.commit()
+        return sum(1 for grade in grades if grade is None)
+
+    @staticmethod
+    def _attempt_score(attempt):
+        """尝试的总分（待批改的题目不计分）"""
+        return sum(answer.points_earned for answer in attempt.answers if answer.points_earned is not None)
 
     def complete_quiz(self, attempt_id: int):
         """
@@ -197,27 +423,81 @@ class QuizService:
             raise ValueError("测验尝试不存在")
         
         # 计算总分
-        total_score = sum(answer.points_earned for answer in attempt.answers)
-        attempt.score = total_score
+        attempt.score = self._attempt_score(attempt)
         attempt.submitted_at = datetime.now()
         attempt.is_completed = True
         self.db.commit()
 
-    def get_student_attempts(self, student_id: int, course_id: int = None):
+    def get_student_attempts(self, student_id: int, course_id: int = None, completed_only: bool = False):
         """
-        获取学生的测验记录
+        获取学生的测验记录（按开始时间倒序，同时加载测验标题和待批改题目数）
         
         Args:
             student_id: 学生ID
             course_id: 课程ID（可选）
+            completed_only: 是否只返回已完成的测验
             
         Returns:
             list: 测验尝试列表
         """
-        query = self.db.query(QuizAttempt).filter_by(student_id=student_id)
+        query = self._student_attempts_query(student_id, course_id)
+        if completed_only:
+            query = query.filter(QuizAttempt.is_completed == True)
+        return query.order_by(QuizAttempt.started_at.desc(), QuizAttempt.id.desc()).all()
+
+    def get_completed_attempt_page(self, student_id: int, course_id: int = None, cursor=None, page_size: int = 20):
+        """
+        分页获取学生已完成的测验记录（按 (完成时间, id) 倒序的游标分页，同时加载测验标题和待批改题目数）
+
+        Args:
+            student_id: 学生ID
+            course_id: 课程ID（可选）
+            cursor: 上一页最后一条记录的 (submitted_at, id)，首页为 None
+            page_size: 每页条数
+
+        Returns:
+            tuple: (测验尝试列表, 下一页游标)，没有更多记录时游标为 None
+        """
+        query = self._student_attempts_query(student_id, course_id).filter(QuizAttempt.is_completed == True)
+        if cursor is not None:
+            query = query.filter(tuple_(QuizAttempt.submitted_at, QuizAttempt.id) < tuple_(*cursor))
+        # 多取一条判断是否还有下一页
+        attempts = query.order_by(
+            QuizAttempt.submitted_at.desc(), QuizAttempt.id.desc()
+        ).limit(page_size + 1).all()
+        if len(attempts) <= page_size:
+            return attempts, None
+        last = attempts[page_size - 1]
+        return attempts[:page_size], (last.submitted_at, last.id)
+
+    def _student_attempts_query(self, student_id: int, course_id: int = None):
+        """学生测验记录的查询（加载测验标题和待批改题目数）"""
+        query = self.db.query(QuizAttempt).options(
+            joinedload(QuizAttempt.quiz).load_only(Quiz.title),
+            undefer(QuizAttempt.pending_count)
+        ).filter(QuizAttempt.student_id == student_id)
+        if course_id:
+            query = query.join(Quiz).filter(Quiz.course_id == course_id)
+        return query
+
+    def count_student_attempts(self, student_id: int, course_id: int = None, completed_only: bool = False):
+        """
+        统计学生的测验记录数（条件同 get_student_attempts）
+
+        Args:
+            student_id: 学生ID
+            course_id: 课程ID（可选）
+            completed_only: 是否只统计已完成的测验
+
+        Returns:
+            int: 记录数
+        """
+        query = self.db.query(func.count(QuizAttempt.id)).filter(QuizAttempt.student_id == student_id)
         if course_id:
             query = query.join(Quiz).filter(Quiz.course_id == course_id)
-        return query.order_by(QuizAttempt.started_at.desc()).all()
+        if completed_only:
+            query = query.filter(QuizAttempt.is_completed == True)
+        return query.scalar()
 
     def get_quiz_statistics(self, quiz_id: int, teacher_id: int):
         """
@@ -228,7 +508,8 @@ class QuizService:
             teacher_id: 教师ID
             
         Returns:
-            dict: 统计数据
+            dict: 统计数据（人数、平均分、最高/最低分、中位数、标准差、分数段分布、每题正确率、
+                  待批改的答案数），全部由SQL聚合计算，不加载尝试记录对象
         """
         quiz = self.get_quiz_by_id(quiz_id)
         if not quiz:
@@ -238,23 +519,120 @@ class QuizService:
         if not PermissionHelper.is_course_teacher(self.db, teacher_id, quiz.course_id):
             raise PermissionError("无权查看此测验的统计数据")
         
-        attempts = self.db.query(QuizAttempt).filter_by(
-            quiz_id=quiz_id,
-            is_completed=True
-        ).all()
-        
-        if not attempts:
+        completed = (QuizAttempt.quiz_id == quiz_id, QuizAttempt.is_completed == True)
+
+        # 基本统计一次聚合查询完成（标准差由平方的均值推出）
+        total, average, max_score, min_score, mean_square = self.db.query(
+            func.count(QuizAttempt.id),
+            func.avg(QuizAttempt.score),
+            func.max(QuizAttempt.score),
+            func.min(QuizAttempt.score),
+            func.avg(QuizAttempt.score * QuizAttempt.score)
+        ).filter(*completed).one()
+
+        if not total:
             return {
                 'total_attempts': 0,
                 'average_score': 0,
                 'max_score': 0,
-                'min_score': 0
+                'min_score': 0,
+                'median_score': 0,
+                'std_dev': 0,
+                'histogram': self._score_histogram({}),
+                'question_stats': self._question_stats(quiz_id, 0),
+                'pending_answers': 0
             }
-        
-        scores = [attempt.score for attempt in attempts]
+
+        # 中位数：按分数排序后只取中间的一到两个值
+        middle = self.db.query(QuizAttempt.score).filter(*completed).order_by(
+            QuizAttempt.score
+        ).offset((total - 1) // 2).limit(2 - total % 2).all()
+        median = sum(row.score for row in middle) / len(middle)
+
+        # 分数段分布：按得分率每10%一段，满分归入最后一段
+        bucket = case(
+            (QuizAttempt.total_points > 0,
+             func.min(cast(QuizAttempt.score * 10 / QuizAttempt.total_points, Integer), 9)),
+            else_=0
+        ).label('bucket')
+        histogram = dict(self.db.query(bucket, func.count()).filter(*completed).group_by(bucket).all())
+
+        question_stats = self._question_stats(quiz_id, total)
         return {
-            'total_attempts': len(attempts),
-            'average_score': sum(scores) / len(scores),
-            'max_score': max(scores),
-            'min_score': min(scores)
+            'total_attempts': total,
+            'average_score': average,
+            'max_score': max_score,
+            'min_score': min_score,
+            'median_score': median,
+            'std_dev': math.sqrt(max(mean_square - average * average, 0.0)),
+            'histogram': self._score_histogram(histogram),
+            'question_stats': question_stats,
+            'pending_answers': sum(question['pending'] for question in question_stats)
         }
+
+    @staticmethod
+    def _score_histogram(counts):
+        """
+        把分数段计数整理为完整的10段分布
+
+        Args:
+            counts: 分数段序号(0-9) -> 人数
+
+        Returns:
+            list: 每段的范围和人数
+        """
+        return [
+            {'range': f"{i * 10}-{i * 10 + 10}%", 'count': counts.get(i, 0)}
+            for i in range(10)
+        ]
+
+    def _question_stats(self, quiz_id: int, total_attempts: int):
+        """
+        统计每道题的作答与正确情况（只统计已完成的尝试）
+
+        待评分的答案（points_earned 为 NULL）不计入平均分和正确率；
+        全部答案待评分时平均分为 None。
+
+        Args:
+            quiz_id: 测验ID
+            total_attempts: 已完成的尝试数，未作答视为答错
+
+        Returns:
+            list: 每道题的统计数据，按题目顺序
+        """
+        questions = self.db.query(Question.id, Question.question_text, Question.points).filter(
+            Question.quiz_id == quiz_id
+        ).order_by(Question.id).all()
+
+        # 按题目顺序扫描答案索引，避免对全部答案排序分组
+        answered = {
+            row.question_id: row
+            for row in self.db.query(
+                Answer.question_id,
+                func.count().label('answered'),
+                func.sum(case((Answer.is_correct == True, 1), else_=0)).label('correct'),
+                func.sum(case((Answer.points_earned.is_(None), 1), else_=0)).label('pending'),
+                func.avg(Answer.points_earned).label('average_points')
+            ).join(QuizAttempt, Answer.attempt_id == QuizAttempt.id).filter(
+                Answer.question_id.in_([q.id for q in questions]),
+                QuizAttempt.is_completed == True
+            ).group_by(Answer.question_id).all()
+        }
+
+        stats = []
+        for question in questions:
+            row = answered.get(question.id)
+            correct = row.correct if row else 0
+            pending = row.pending if row else 0
+            graded = total_attempts - pending
+            stats.append({
+                'question_id': question.id,
+                'question_text': question.question_text,
+                'points': question.points,
+                'answered': row.answered if row else 0,
+                'correct': correct,
+                'pending': pending,
+                'correct_rate': correct / graded if graded else 0,
+                'average_points': row.average_points if row else 0
+            })
+        return stats
@@ -0,0 +1,250 @@
+"""
+检索服务 - BM25与向量检索融合的文档片段检索
+"""
+import sys
+import os
+import json
+import threading
+from collections import Counter, OrderedDict
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models.course import CourseDocument, DocumentChunk
+from config import RETRIEVAL_TOP_K, BM25_K1, BM25_B, RETRIEVAL_INDEX_CACHE_SIZE
+from .indexing_service import IndexingService
+from .tokenizer import tokenize
+from .vector_store import VectorStore
+
+# 倒数排名融合的平滑常数
+_RRF_K = 60
+
+
+class BM25Index:
+    """
+    BM25倒排索引
+
+    构建时为每个词项预先计算好各片段的BM25权重，查询时只需对
+    查询词项的倒排表做向量化累加，因此单次查询与片段总数基本无关。
+    """
+
+    def __init__(self, chunks, term_freqs=None, k1=BM25_K1, b=BM25_B):
+        """
+        Args:
+            chunks: 片段列表，每项为包含 id、document_id、filename、index、text 的字典
+            term_freqs: 与片段一一对应的词频字典列表（预先统计时可省去重复分词）
+            k1: 词频饱和参数
+            b: 长度归一化参数
+        """
+        self.chunks = chunks
+        # 片段ID -> 片段，向量检索只返回片段ID
+        self.chunks_by_id = {chunk['id']: chunk for chunk in chunks}
+        n = len(chunks)
+        self._vocab = {}
+        lengths = np.zeros(n, dtype=np.float32)
+        term_ids = []
+        chunk_ids = []
+        freqs = []
+
+        for i, chunk in enumerate(chunks):
+            chunk_freqs = term_freqs[i] if term_freqs is not None else Counter(tokenize(chunk['text']))
+            lengths[i] = sum(chunk_freqs.values())
+            term_ids.extend(self._vocab.setdefault(term, len(self._vocab)) for term in chunk_freqs)
+            freqs.extend(chunk_freqs.values())
+            chunk_ids.extend([i] * len(chunk_freqs))
+
+        # 按词项排序后的扁平倒排表：词项t的倒排表为 [offsets[t], offsets[t+1])
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids, kind='stable')
+        doc_freqs = np.bincount(term_ids, minlength=len(self._vocab))
+        self._offsets = np.concatenate(([0], np.cumsum(doc_freqs)))
+        self._ids = np.asarray(chunk_ids, dtype=np.int32)[order]
+        freqs = np.asarray(freqs, dtype=np.float32)[order]
+
+        avg_length = float(lengths.mean()) if n else 0.0
+        norm = k1 * (1 - b + b * lengths / avg_length) if avg_length else np.full(n, k1, dtype=np.float32)
+        idf = np.log(1 + (n - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+        self._weights = np.repeat(idf, doc_freqs) * freqs * (k1 + 1) / (freqs + norm[self._ids])
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def search(self, query, top_k=RETRIEVAL_TOP_K):
+        """
+        检索与查询最相关的片段
+
+        Args:
+            query: 查询文本
+            top_k: 返回片段数
+
+        Returns:
+            list: (分数, 片段) 元组列表，按分数降序
+        """
+        if not self.chunks:
+            return []
+
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self._vocab.get(term)
+            if term_id is not None:
+                start, end = self._offsets[term_id], self._offsets[term_id + 1]
+                scores[self._ids[start:end]] += self._weights[start:end]
+
+        top_k = min(top_k, len(scores))
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [(float(scores[i]), self.chunks[i]) for i in candidates if scores[i] > 0]
+
+
+class RetrievalService:
+    """检索服务类，从预先计算的课程索引中按相关性选取上下文"""
+
+    # 进程内的索引缓存：课程ID -> (索引指纹, BM25索引)
+    _index_cache = OrderedDict()
+    _cache_lock = threading.Lock()
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.indexing_service = IndexingService(db)
+
+    def _fingerprint(self, course_id: int):
+        """课程索引指纹：片段数与最大片段ID（片段ID不复用），任何增删都会改变它"""
+        return tuple(self.db.query(
+            func.count(DocumentChunk.id),
+            func.max(DocumentChunk.id)
+        ).filter(DocumentChunk.course_id == course_id).one())
+
+    def get_index(self, course_id: int):
+        """
+        获取课程的BM25索引（索引未变化时复用缓存）
+
+        Args:
+            course_id: 课程ID
+
+        Returns:
+            BM25Index: 索引对象
+        """
+        self.indexing_service.ensure_course_indexed(course_id)
+        fingerprint = self._fingerprint(course_id)
+
+        with self._cache_lock:
+            cached = self._index_cache.get(course_id)
+            if cached is not None and cached[0] == fingerprint:
+                self._index_cache.move_to_end(course_id)
+                return cached[1]
+
+        rows = self.db.query(
+            DocumentChunk.id,
+            DocumentChunk.document_id,
+            DocumentChunk.chunk_index,
+            DocumentChunk.text,
+            DocumentChunk.term_freqs,
+            CourseDocument.filename
+        ).join(CourseDocument, DocumentChunk.document_id == CourseDocument.id).filter(
+            DocumentChunk.course_id == course_id
+        ).order_by(DocumentChunk.id).all()
+
+        chunks = [{
+            'id': row.id,
+            'document_id': row.document_id,
+            'filename': row.filename,
+            'index': row.chunk_index,
+            'text': row.text
+        } for row in rows]
+        term_freqs = [json.loads(row.term_freqs) for row in rows]
+        index = BM25Index(chunks, term_freqs)
+
+        with self._cache_lock:
+            self._index_cache[course_id] = (fingerprint, index)
+            self._index_cache.move_to_end(course_id)
+            while len(self._index_cache) > RETRIEVAL_INDEX_CACHE_SIZE:
+                self._index_cache.popitem(last=False)
+        return index
+
+    def retrieve_chunks(self, question, course_id: int, top_k=RETRIEVAL_TOP_K):
+        """
+        检索与问题最相关的片段（BM25与向量检索融合）
+
+        Args:
+            question: 问题
+            course_id: 课程ID
+            top_k: 最多返回的片段数
+
+        Returns:
+            list: 片段字典列表，按相关性降序
+        """
+        index = self.get_index(course_id)
+        bm25_hits = [chunk for _, chunk in index.search(question, top_k)]
+        # 向量检索返回片段ID，文本取自从数据库加载的索引
+        vector_hits = [index.chunks_by_id[chunk_id] for _, chunk_id in VectorStore(course_id).search(question, top_k)
+                       if chunk_id in index.chunks_by_id]
+        ranked = self.fuse_rankings([bm25_hits, vector_hits])[:top_k]
+
+        # 没有任何片段命中时，退回到按文档顺序取开头的片段
+        if not ranked:
+            ranked = index.chunks[:top_k]
+        return ranked
+
+    def retrieve(self, question, course_id: int, max_length=2000, top_k=RETRIEVAL_TOP_K):
+        """
+        检索与问题最相关的文档片段，并在长度预算内拼接为上下文
+
+        Args:
+            question: 问题
+            course_id: 课程ID
+            max_length: 最大上下文长度
+            top_k: 最多选取的片段数
+
+        Returns:
+            str: 拼接后的上下文
+        """
+        return self.format_context(self.retrieve_chunks(question, course_id, top_k), max_length)
+
+    @staticmethod
+    def fuse_rankings(rankings):
+        """
+        倒数排名融合（RRF）多路检索结果
+
+        Args:
+            rankings: 多个按相关性排列的片段列表
+
+        Returns:
+            list: 融合后的片段列表
+        """
+        scores = {}
+        chunks = {}
+        for ranking in rankings:
+            for rank, chunk in enumerate(ranking):
+                key = (chunk['document_id'], chunk['index'])
+                scores[key] = scores.get(key, 0.0) + 1.0 / (_RRF_K + rank + 1)
+                chunks.setdefault(key, chunk)
+        return [chunks[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+    @staticmethod
+    def format_context(chunks, max_length):
+        """
+        在长度预算内拼接片段
+
+        Args:
+            chunks: 按优先级排列的片段列表
+            max_length: 最大上下文长度
+
+        Returns:
+            str: 拼接后的上下文
+        """
+        parts = []
+        used = 0
+        for chunk in chunks:
+            part = f"【{chunk['filename']}】\n{chunk['text']}"
+            remaining = max_length - used
+            if remaining <= 0:
+                break
+            if len(part) > remaining:
+                # 预算不足以放下完整片段时，只有第一个片段允许截断，其余跳过
+                if not parts:
+                    parts.append(part[:remaining] + "...")
+                    break
+                continue
+            parts.append(part)
+            used += len(part) + 2
+        return "\n\n".join(parts)
@@ -0,0 +1,176 @@
+"""
+相似问题检索服务
+"""
+import re
+import sys
+import os
+import threading
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy.orm import Session
+from models.qa import QARecord
+from config import QA_DEDUP_THRESHOLD
+from .ai_service import AI_ERROR_PREFIX
+from .embedding_service import HashingEmbedder, get_embedder
+
+# 不影响问题含义的疑问/语气成分（注意不能去掉"为什么""怎么"等改变问法的词）
+_FILLER_PATTERN = re.compile(
+    r'请问|请解释一下|请解释|解释一下|介绍一下|说一下|什么是|是什么|什么叫做|什么叫|叫什么|指的是什么|是指什么|'
+    r'[\s?？!！,，.。、:：;；"“”\'‘’]'
+)
+# 句末语气词（只去掉末尾标点之前的，句中的同一个字可能是词的一部分，如"吗啡""呢子""吧台"）
+_TRAILING_PARTICLE_PATTERN = re.compile(r'[吗呢啊呀吧嘛]+(?=[\s?？!！,，.。、:：;；"“”\'‘’]*$)')
+
+
+def normalize_question(question):
+    """
+    归一化问题文本，使"什么是梯度下降"与"梯度下降是什么"得到相同结果
+
+    Args:
+        question: 原始问题
+
+    Returns:
+        str: 归一化后的问题
+    """
+    normalized = _FILLER_PATTERN.sub("", _TRAILING_PARTICLE_PATTERN.sub("", (question or "").lower()))
+    return normalized or (question or "").strip().lower()
+
+
+class _CourseQuestionIndex:
+    """单个课程的问题索引：归一化问题的精确匹配表，以及可选的问题向量（按记录ID增量追加）"""
+
+    def __init__(self):
+        self.max_id = 0
+        # 归一化问题 -> 最早的记录ID
+        self.exact = {}
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.vectors = None
+        self.size = 0
+
+    def append(self, ids, questions, vectors=None):
+        """追加记录，向量容量不足时按倍数扩容"""
+        for record_id, question in zip(ids, questions):
+            self.exact.setdefault(question, record_id)
+        if vectors is None:
+            return
+
+        needed = self.size + len(ids)
+        if self.vectors is None or needed > len(self.ids):
+            capacity = max(needed, 2 * len(self.ids), 64)
+            new_ids = np.zeros(capacity, dtype=np.int64)
+            new_vectors = np.zeros((capacity, vectors.shape[1]), dtype=np.float32)
+            new_ids[:self.size] = self.ids[:self.size]
+            if self.vectors is not None:
+                new_vectors[:self.size] = self.vectors[:self.size]
+            self.ids, self.vectors = new_ids, new_vectors
+        self.ids[self.size:needed] = ids
+        self.vectors[self.size:needed] = vectors
+        self.size = needed
+
+
+class SimilarQuestionService:
+    """
+    相似问题检索服务类
+
+    在同一课程的历史问答中查找可以复用回答的问题：归一化后完全相同的问题直接匹配；
+    配置了 QA_DEDUP_THRESHOLD 且使用 api 向量化器时，再按问题向量的余弦相似度匹配。
+    索引只包含AI生成的原始回答（不含复用记录与调用失败的记录），按记录ID增量同步。
+    """
+
+    # 进程内共享：课程ID -> _CourseQuestionIndex
+    _indexes = {}
+    _lock = threading.Lock()
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @staticmethod
+    def _semantic_embedder():
+        """语义匹配使用的向量化器；未配置阈值或只有本地哈希向量化（只反映字面相似）时返回 None"""
+        if QA_DEDUP_THRESHOLD is None:
+            return None
+        embedder = get_embedder()
+        return None if isinstance(embedder, HashingEmbedder) else embedder
+
+    def _sync(self, course_id: int):
+        """
+        把课程中新增的问答记录追加到索引
+
+        查询数据库和向量化在锁外进行，锁内只更新索引，不同课程的查询互不阻塞。
+        """
+        with self._lock:
+            index = self._indexes.get(course_id)
+            if index is None:
+                index = self._indexes[course_id] = _CourseQuestionIndex()
+            max_id = index.max_id
+
+        rows = self.db.query(
+            QARecord.id,
+            QARecord.question,
+            QARecord.reused_from_id,
+            QARecord.answer.contains(AI_ERROR_PREFIX).label('failed')
+        ).filter(
+            QARecord.course_id == course_id,
+            QARecord.id > max_id
+        ).order_by(QARecord.id).all()
+        if not rows:
+            return index
+
+        originals = [row for row in rows if row.reused_from_id is None and not row.failed]
+        questions = [normalize_question(row.question) for row in originals]
+        embedder = self._semantic_embedder()
+        vectors = embedder.embed(questions) if embedder is not None and originals else None
+
+        with self._lock:
+            # 其他线程已同步过同一批记录，或索引已被丢弃
+            if self._indexes.get(course_id) is index and index.max_id == max_id:
+                index.append([row.id for row in originals], questions, vectors)
+                index.max_id = rows[-1].id
+        return index
+
+    def find_similar(self, course_id: int, question: str, threshold: float = QA_DEDUP_THRESHOLD):
+        """
+        查找课程中可以复用回答的历史问题
+
+        Args:
+            course_id: 课程ID
+            question: 问题内容
+            threshold: 语义匹配的相似度阈值，为 None 时只做精确匹配
+
+        Returns:
+            tuple | None: (问答记录, 相似度)，精确匹配的相似度为 1.0；没有可复用的问题时返回 None
+        """
+        index = self._sync(course_id)
+        normalized = normalize_question(question)
+        embedder = self._semantic_embedder() if threshold is not None else None
+        query_vector = embedder.embed([normalized])[0] if embedder is not None else None
+
+        with self._lock:
+            record_id = index.exact.get(normalized)
+            score = 1.0
+            if record_id is None and query_vector is not None and index.size:
+                scores = index.vectors[:index.size] @ query_vector
+                best = int(np.argmax(scores))
+                if scores[best] >= threshold:
+                    record_id, score = int(index.ids[best]), float(scores[best])
+
+        if record_id is None:
+            return None
+
+        record = self.db.query(QARecord).filter_by(id=record_id).first()
+        if record is None:
+            # 记录已被删除，下次查询时重建该课程的索引
+            self.invalidate(course_id)
+            return None
+        return record, score
+
+    @classmethod
+    def invalidate(cls, course_id: int):
+        """
+        丢弃课程的索引（删除记录后调用）
+
+        Args:
+            course_id: 课程ID
+        """
+        with cls._lock:
+            cls._indexes.pop(course_id, None)
@@ -0,0 +1,30 @@
+"""
+分词工具
+"""
+import re
+
+# 中日韩统一表意文字连续片段，或英文/数字单词
+_TOKEN_PATTERN = re.compile(r'[\u4e00-\u9fff\u3400-\u4dbf]+|[a-zA-Z0-9_]+')
+_CJK_PATTERN = re.compile(r'[\u4e00-\u9fff\u3400-\u4dbf]')
+
+
+def tokenize(text):
+    """
+    中文友好的分词：中文按字符二元组切分，英文按单词切分并转小写
+
+    Args:
+        text: 原始文本
+
+    Returns:
+        list: 词项列表
+    """
+    tokens = []
+    for piece in _TOKEN_PATTERN.findall(text or ""):
+        if _CJK_PATTERN.match(piece):
+            if len(piece) == 1:
+                tokens.append(piece)
+            else:
+                tokens.extend([a + b for a, b in zip(piece, piece[1:])])
+        else:
+            tokens.append(piece.lower())
+    return tokens
@@ -0,0 +1,260 @@
+"""
+向量存储 - 按课程持久化文档片段向量
+"""
+import sys
+import os
+import json
+import glob
+import shutil
+import threading
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import VECTOR_DB_PATH, RETRIEVAL_TOP_K
+from .embedding_service import get_embedder
+
+# 存储格式版本；旧格式（元数据中保存片段文本）需要由索引服务从数据库重建
+_FORMAT = 2
+
+
+class VectorStore:
+    """
+    单个课程的向量存储
+
+    目录结构：
+        course_<id>/meta.json        元数据（格式版本、向量化器、维度、有效行数、文件版本、已删除的文档）
+        course_<id>/vectors_<n>.f32  float32 单位向量矩阵，逐行追加，按内存映射方式读取
+        course_<id>/rows_<n>.i64     每行向量对应的 (片段ID, 文档ID)
+
+    片段文本只保存在数据库中，检索结果只返回片段ID。新增片段追加到文件末尾后再原子替换
+    meta.json 中的有效行数，读取方只映射有效行。删除文档只记录在元数据中，已删除的行
+    超过一半时才把保留的行重写为新版本的文件，读取方持有的旧映射不受影响
+    （Windows 下也不会因文件被映射而替换失败）。
+    """
+
+    # 已加载的存储：目录 -> (meta修改时间, meta, 向量矩阵, 行信息, 有效行掩码)
+    _loaded = {}
+    _lock = threading.Lock()
+
+    def __init__(self, course_id, embedder=None, root=VECTOR_DB_PATH):
+        self.course_id = course_id
+        self.embedder = embedder or get_embedder()
+        self.path = os.path.join(root, f"course_{course_id}")
+        self.meta_path = os.path.join(self.path, "meta.json")
+
+    def _files(self, version):
+        """某个版本的向量文件与行信息文件路径"""
+        return (os.path.join(self.path, f"vectors_{version}.f32"),
+                os.path.join(self.path, f"rows_{version}.i64"))
+
+    def _load(self):
+        """
+        读取元数据、向量矩阵和行信息（元数据未变化时复用已加载的结果）
+
+        Returns:
+            tuple: (meta, 向量矩阵, 行信息, 有效行掩码)；存储不存在时全部为 None，
+                   旧格式的存储只返回 meta
+        """
+        try:
+            mtime = os.stat(self.meta_path).st_mtime_ns
+        except OSError:
+            return None, None, None, None
+
+        cached = self._loaded.get(self.path)
+        if cached and cached[0] == mtime:
+            return cached[1:]
+
+        with open(self.meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('format') != _FORMAT:
+            return meta, None, None, None
+
+        count = meta['rows']
+        if count == 0:
+            vectors = np.zeros((0, meta['dim'] or 0), dtype=np.float32)
+            rows = np.zeros((0, 2), dtype=np.int64)
+        else:
+            vectors_path, rows_path = self._files(meta['version'])
+            try:
+                vectors = np.memmap(vectors_path, dtype=np.float32, mode='r', shape=(count, meta['dim']))
+                rows = np.memmap(rows_path, dtype=np.int64, mode='r', shape=(count, 2))
+            except FileNotFoundError:
+                # 读取元数据后另一个线程重写了新版本并删除了旧文件，按新的元数据重新读取
+                try:
+                    replaced = os.stat(self.meta_path).st_mtime_ns != mtime
+                except OSError:
+                    replaced = True
+                if not replaced:
+                    raise
+                return self._load()
+
+        live = ~np.isin(rows[:, 1], meta['removed_documents']) if meta['removed_documents'] else None
+        self._loaded[self.path] = (mtime, meta, vectors, rows, live)
+        return meta, vectors, rows, live
+
+    def _write_meta(self, meta):
+        """原子替换元数据"""
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+        self._loaded.pop(self.path, None)
+
+    def _rewrite(self, meta, vectors, rows):
+        """把向量和行信息写为新版本的文件并清理旧版本"""
+        os.makedirs(self.path, exist_ok=True)
+        version = meta.get('version', 0) + 1
+        vectors_path, rows_path = self._files(version)
+        np.ascontiguousarray(vectors, dtype=np.float32).tofile(vectors_path)
+        np.ascontiguousarray(rows, dtype=np.int64).tofile(rows_path)
+        self._write_meta(dict(meta, version=version, rows=len(rows), removed_documents=[]))
+
+        # 清理旧版本（仍被映射的文件删除失败时留待下次清理）
+        current = {os.path.basename(vectors_path), os.path.basename(rows_path)}
+        for pattern in ("vectors_*", "rows_*"):
+            for old_file in glob.glob(os.path.join(self.path, pattern)):
+                if os.path.basename(old_file) not in current:
+                    try:
+                        os.remove(old_file)
+                    except OSError:
+                        pass
+
+    def _compact(self, meta, vectors, rows, live):
+        """去掉已删除文档的行，重写为新版本的文件"""
+        self._rewrite(meta, vectors[live], rows[live])
+
+    def _empty_meta(self, dim):
+        return {
+            'format': _FORMAT,
+            'embedder': self.embedder.name,
+            'dim': dim,
+            'version': 0,
+            'rows': 0,
+            'removed_documents': []
+        }
+
+    def needs_rebuild(self):
+        """
+        存储是否需要从数据库重建（旧格式或向量化器已变更，旧向量不可用）
+
+        Returns:
+            bool: 需要重建时为 True；存储不存在时为 False
+        """
+        meta, _, _, _ = self._load()
+        return meta is not None and (meta.get('format') != _FORMAT or meta['embedder'] != self.embedder.name)
+
+    def __len__(self):
+        meta, vectors, _, live = self._load()
+        if vectors is None:
+            return 0
+        return int(live.sum()) if live is not None else len(vectors)
+
+    def get_document_vectors(self, document_id):
+        """
+        读取某个文档全部片段的向量（按片段ID即片段序号排列）
+
+        Args:
+            document_id: 文档ID
+
+        Returns:
+            ndarray | None: 向量矩阵，文档不在存储中或存储需要重建时返回 None
+        """
+        meta, vectors, rows, _ = self._load()
+        if vectors is None or meta['embedder'] != self.embedder.name or document_id in meta['removed_documents']:
+            return None
+        selected = np.flatnonzero(rows[:, 1] == document_id)
+        if not len(selected):
+            return None
+        return np.array(vectors[selected[np.argsort(rows[selected, 0])]])
+
+    def add_chunks(self, chunk_ids, document_ids, chunk_vectors):
+        """
+        追加片段向量（只写入新增的行，不重写已有向量）
+
+        Args:
+            chunk_ids: 片段ID列表
+            document_ids: 与片段一一对应的文档ID列表
+            chunk_vectors: 片段向量矩阵（须由当前向量化器生成）
+        """
+        if not len(chunk_ids):
+            return
+        new_rows = np.column_stack([chunk_ids, document_ids]).astype(np.int64)
+        new_vectors = np.ascontiguousarray(chunk_vectors, dtype=np.float32)
+
+        with self._lock:
+            meta, vectors, rows, live = self._load()
+            if vectors is None or meta['embedder'] != self.embedder.name:
+                # 旧格式或向量化器变更后旧向量不可比，由调用方从数据库重建
+                self._rewrite(self._empty_meta(int(new_vectors.shape[1])), new_vectors, new_rows)
+                return
+
+            if live is not None and np.isin(new_rows[:, 1], meta['removed_documents']).any():
+                # 重新加入已删除的文档时先去掉其旧行
+                self._compact(meta, vectors, rows, live)
+                meta, vectors, rows, live = self._load()
+
+            vectors_path, rows_path = self._files(meta['version'])
+            expected = (meta['rows'] * meta['dim'] * 4, meta['rows'] * 16)
+            sizes = tuple(os.path.getsize(p) if os.path.exists(p) else 0 for p in (vectors_path, rows_path))
+            if meta['rows'] == 0 or sizes != expected:
+                # 空存储，或上次追加中断后文件末尾有未登记的行：整体重写
+                self._rewrite(meta, np.concatenate([vectors, new_vectors]), np.concatenate([rows, new_rows]))
+                return
+
+            # 释放本进程对旧长度的映射后追加，再更新有效行数
+            self._loaded.pop(self.path, None)
+            with open(vectors_path, 'ab') as f:
+                new_vectors.tofile(f)
+            with open(rows_path, 'ab') as f:
+                new_rows.tofile(f)
+            self._write_meta(dict(meta, rows=meta['rows'] + len(new_rows)))
+
+    def remove_document(self, document_id):
+        """
+        删除某个文档的全部片段（记录在元数据中，已删除的行超过一半时重写文件）
+
+        Args:
+            document_id: 文档ID
+        """
+        with self._lock:
+            meta, vectors, rows, live = self._load()
+            if vectors is None or document_id in meta['removed_documents']:
+                return
+            removed = rows[:, 1] == document_id
+            if not removed.any():
+                return
+            live = ~removed if live is None else live & ~removed
+            if live.sum() * 2 < len(rows):
+                self._compact(meta, vectors, rows, live)
+            else:
+                self._write_meta(dict(meta, removed_documents=meta['removed_documents'] + [document_id]))
+
+    def clear(self):
+        """删除整个课程的向量存储"""
+        with self._lock:
+            self._loaded.pop(self.path, None)
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    def search(self, query, top_k=RETRIEVAL_TOP_K):
+        """
+        余弦相似度检索
+
+        Args:
+            query: 查询文本
+            top_k: 返回片段数
+
+        Returns:
+            list: (相似度, 片段ID) 元组列表，按相似度降序
+        """
+        meta, vectors, rows, live = self._load()
+        if vectors is None or not len(vectors) or meta['embedder'] != self.embedder.name:
+            return []
+
+        query_vector = self.embedder.embed([query])[0]
+        scores = vectors @ query_vector
+        if live is not None:
+            scores = np.where(live, scores, -np.inf)
+
+        top_k = min(top_k, len(scores))
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [(float(scores[i]), int(rows[i, 0])) for i in candidates if scores[i] > 0]
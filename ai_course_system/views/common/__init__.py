@@ -0,0 +1,9 @@
+"""
+视图通用组件
+"""
+from .background import BackgroundLoader
+from .paged_loader import PagedLoader
+from .stream_renderer import StreamRenderer
+from .virtual_list import VirtualList
+
+__all__ = ['BackgroundLoader', 'PagedLoader', 'StreamRenderer', 'VirtualList']
@@ -0,0 +1,95 @@
+"""
+后台加载 - 在线程池中查询数据，结果交回界面线程
+"""
+import tkinter
+from concurrent.futures import ThreadPoolExecutor
+from models.database import run_in_session
+from config import UI_LOADER_THREADS, UI_POLL_INTERVAL
+
+# 所有视图共享的加载线程池
+_executor = ThreadPoolExecutor(max_workers=UI_LOADER_THREADS, thread_name_prefix="ui-loader")
+
+
+class BackgroundLoader:
+    """
+    绑定到一个控件的后台加载器
+
+    加载函数 func(db) 在线程池中用独立的数据库会话（session_scope）执行，界面线程通过
+    after() 定时检查结果并调用回调，Tkinter 控件只在界面线程中操作。
+    控件销毁后未完成的任务被取消，已完成的结果被丢弃。
+
+    加载函数返回的ORM对象已脱离会话，只能读取加载时已取到的属性，
+    需要的关联对象应在查询中预先加载。
+    """
+
+    def __init__(self, widget):
+        """
+        Args:
+            widget: 拥有这些任务的控件（用于 after() 调度，销毁时取消任务）
+        """
+        self.widget = widget
+        # 任务名 -> (future, on_done, on_error)
+        self._tasks = {}
+        self._polling = False
+        self._closed = False
+        # 绑定到控件本身（customtkinter 的 bind 会绑定到内部画布）
+        tkinter.Misc.bind(widget, "<Destroy>", self._on_destroy, add="+")
+
+    def submit(self, name, func, on_done, on_error=None):
+        """
+        提交后台加载任务；同名任务未完成时被新任务取代
+
+        Args:
+            name: 任务名
+            func: 加载函数 func(db)，在后台线程执行（需要参数时用 lambda 绑定）
+            on_done: 成功时在界面线程调用 on_done(结果)
+            on_error: 失败时在界面线程调用 on_error(异常)，为 None 时忽略异常
+        """
+        if self._closed:
+            return
+        self.cancel(name)
+        future = _executor.submit(run_in_session, func)
+        self._tasks[name] = (future, on_done, on_error)
+        if not self._polling:
+            self._polling = True
+            self.widget.after(UI_POLL_INTERVAL, self._poll)
+
+    def cancel(self, name=None):
+        """
+        取消任务（已在执行的任务会继续执行，但结果被丢弃）
+
+        Args:
+            name: 任务名，为 None 时取消全部任务
+        """
+        names = list(self._tasks) if name is None else [name]
+        for task_name in names:
+            task = self._tasks.pop(task_name, None)
+            if task:
+                task[0].cancel()
+
+    def _poll(self):
+        """在界面线程中分发已完成任务的结果"""
+        if self._closed:
+            return
+        for name, (future, on_done, on_error) in list(self._tasks.items()):
+            if not future.done():
+                continue
+            del self._tasks[name]
+            error = future.exception()
+            if error is None:
+                on_done(future.result())
+            elif on_error:
+                on_error(error)
+            if self._closed:
+                # 回调中销毁了控件
+                return
+
+        if self._tasks:
+            self.widget.after(UI_POLL_INTERVAL, self._poll)
+        else:
+            self._polling = False
+
+    def _on_destroy(self, event):
+        if event.widget is self.widget:
+            self._closed = True
+            self.cancel()
@@ -0,0 +1,57 @@
+"""
+分页加载组件
+"""
+import customtkinter as ctk
+
+
+class PagedLoader:
+    """
+    "加载更多"式分页：每次只加载并渲染一页记录
+
+    load_page(cursor) 返回 (记录列表, 下一页游标)，游标为 None 表示没有更多记录；
+    首页以 cursor=None 调用。render(parent, 记录) 为单条记录创建控件。
+    """
+
+    def __init__(self, parent, load_page, render, empty_text="暂无记录"):
+        """
+        Args:
+            parent: 放置记录控件的容器
+            load_page: 加载一页记录的函数
+            render: 渲染单条记录的函数
+            empty_text: 没有任何记录时的提示
+        """
+        self.parent = parent
+        self.load_page = load_page
+        self.render = render
+        self.empty_text = empty_text
+        self.count = 0
+        self._cursor = None
+        self._more_btn = ctk.CTkButton(parent, text="加载更多", width=120, command=self.load_more)
+
+    def load_first(self):
+        """
+        加载第一页
+
+        Returns:
+            bool: 是否有记录
+        """
+        self.count = 0
+        self._cursor = None
+        self.load_more()
+        if self.count == 0:
+            ctk.CTkLabel(
+                self.parent,
+                text=self.empty_text,
+                font=ctk.CTkFont(size=14)
+            ).pack(pady=20)
+        return self.count > 0
+
+    def load_more(self):
+        """加载下一页并追加到容器末尾"""
+        self._more_btn.pack_forget()
+        records, self._cursor = self.load_page(self._cursor)
+        for record in records:
+            self.render(self.parent, record)
+        self.count += len(records)
+        if self._cursor is not None:
+            self._more_btn.pack(pady=10)
@@ -0,0 +1,75 @@
+"""
+流式文本渲染器
+"""
+import threading
+
+
+class StreamRenderer:
+    """
+    把后台线程产出的增量文本批量渲染到界面
+
+    后台线程只调用 feed/finish/fail 写入缓冲区，主线程通过 after() 定时取出
+    缓冲区中累积的增量一次性刷新控件，避免逐token跨线程操作Tk。
+    """
+
+    def __init__(self, widget, on_update, on_done=None, on_error=None, interval=50):
+        """
+        Args:
+            widget: 用于调度 after() 的控件，控件销毁后停止刷新
+            on_update: 主线程回调，参数为当前完整文本
+            on_done: 主线程回调，流结束时以完整文本调用
+            on_error: 主线程回调，出错时以异常调用（已显示的部分文本由回调负责清除）
+            interval: 刷新间隔（毫秒）
+        """
+        self.widget = widget
+        self.on_update = on_update
+        self.on_done = on_done
+        self.on_error = on_error
+        self.interval = interval
+        self.text = ""
+        self._pending = []
+        self._finished = False
+        self._error = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """开始定时刷新（主线程调用）"""
+        self.widget.after(self.interval, self._flush)
+
+    def feed(self, delta):
+        """追加增量文本（后台线程调用）"""
+        with self._lock:
+            self._pending.append(delta)
+
+    def finish(self):
+        """标记流结束（后台线程调用）"""
+        with self._lock:
+            self._finished = True
+
+    def fail(self, error):
+        """标记流出错，尚未渲染的增量文本被丢弃（后台线程调用）"""
+        with self._lock:
+            self._error = error
+            self._finished = True
+            self._pending = []
+
+    def _flush(self):
+        """取出累积的增量并刷新控件（主线程）"""
+        if not self.widget.winfo_exists():
+            return
+
+        with self._lock:
+            pending, self._pending = self._pending, []
+            finished, error = self._finished, self._error
+
+        if pending:
+            self.text += "".join(pending)
+            self.on_update(self.text)
+
+        if not finished:
+            self.widget.after(self.interval, self._flush)
+        elif error is not None:
+            if self.on_error:
+                self.on_error(error)
+        elif self.on_done:
+            self.on_done(self.text)
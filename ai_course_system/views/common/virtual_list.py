@@ -0,0 +1,260 @@
+"""
+虚拟滚动列表组件
+"""
+import bisect
+import math
+import tkinter
+from collections import OrderedDict
+import customtkinter as ctk
+
+
+class VirtualList(ctk.CTkFrame):
+    """
+    虚拟滚动列表：只为可见的行创建控件，滚动时复用这些控件显示其他记录
+
+    所有行高度相同（row_height），控件数量只与列表的可见高度有关，与记录总数无关。
+    记录通过 load_page(数据库会话, cursor) 按页加载，返回 (记录列表, 下一页游标)，游标为 None
+    表示没有更多记录；首页以 cursor=None 调用，滚动接近末尾时自动加载下一页。
+    load_page 由 BackgroundLoader 在后台线程中用独立的会话执行，页加载完成前对应的行留空。
+
+    内存中只保留可见区域附近的若干页记录（CACHED_PAGES），其余页被丢弃，只记下
+    每页的起始游标和条数，滚动回来时按游标重新加载。记录总数已知时（load_first
+    的 total），滚动范围按总数设置。
+
+    每行是一个固定高度的 CTkFrame，create_row(行容器) 在其中创建控件并返回
+    控件句柄，update_row(句柄, 记录) 用记录内容更新这些控件。
+    """
+
+    # 距离已加载记录末尾不足这么多行时加载下一页
+    PREFETCH_ROWS = 5
+    # 内存中保留的页数
+    CACHED_PAGES = 4
+
+    def __init__(self, master, loader, load_page, create_row, update_row, row_height=80,
+                 row_spacing=5, empty_text="暂无记录", **kwargs):
+        """
+        Args:
+            master: 父控件
+            loader: 执行 load_page 的后台加载器（BackgroundLoader）
+            load_page: 加载一页记录的函数
+            create_row: 创建行控件的函数
+            update_row: 用记录更新行控件的函数
+            row_height: 行高（像素）
+            row_spacing: 行间距（像素）
+            empty_text: 没有任何记录时的提示
+        """
+        super().__init__(master, **kwargs)
+        self.loader = loader
+        self.load_page = load_page
+        self.create_row = create_row
+        self.update_row = update_row
+        self.row_height = row_height
+        self.row_spacing = row_spacing
+
+        # 每次 load_first 递增，之前请求的页返回时丢弃；为 0 时尚未开始加载
+        self._generation = 0
+        self._reset(None)
+        self._top = 0
+        # 行控件池：[(行容器, 控件句柄, 当前显示的记录下标)]
+        self._rows = []
+
+        self._scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self._scrollbar.pack(side="right", fill="y", padx=(0, 3), pady=3)
+        self._body = ctk.CTkFrame(self, fg_color="transparent")
+        self._body.pack(side="left", fill="both", expand=True, padx=5, pady=5)
+        self._empty_label = ctk.CTkLabel(self._body, text=empty_text, font=ctk.CTkFont(size=14))
+
+        self._body.bind("<Configure>", lambda event: self._layout())
+        self._bind_wheel(self._body)
+
+    def _reset(self, total):
+        """清空已加载的页"""
+        self._total = total
+        # 第k页的起始游标与起始下标；已发现的页数为 len(self._page_starts)
+        self._page_cursors = [None]
+        self._page_starts = []
+        # 已发现的记录数（已知全部页的条数之和）
+        self._known = 0
+        # 是否已发现最后一页
+        self._exhausted = False
+        # 页号 -> 记录列表（最近使用的在末尾）
+        self._pages = OrderedDict()
+        # 正在后台加载的页号
+        self._requested = set()
+
+    @property
+    def _stride(self):
+        return self.row_height + self.row_spacing
+
+    def load_first(self, first_page=None, total=None):
+        """
+        清空列表并加载第一页
+
+        Args:
+            first_page: 已在后台加载好的第一页 (记录列表, 下一页游标)，为 None 时在后台加载
+            total: 记录总数（用于设置滚动范围），为 None 时按已加载的记录数
+        """
+        self._generation += 1
+        self._reset(total)
+        self._top = 0
+        for slot in self._rows:
+            slot[2] = None
+        if first_page is not None:
+            self._add_page(0, *first_page)
+        self._layout()
+
+    def _add_page(self, page, records, next_cursor):
+        """记录一页的内容；首次加载的页同时登记下一页的游标"""
+        if page == len(self._page_starts):
+            self._page_starts.append(self._known)
+            self._known += len(records)
+            if next_cursor is None or not records:
+                self._exhausted = True
+            else:
+                self._page_cursors.append(next_cursor)
+        self._pages[page] = records
+        self._pages.move_to_end(page)
+
+    def _request(self, page):
+        """在后台加载一页（已在加载中时不重复请求），加载完成后重新布局"""
+        if page in self._requested:
+            return
+        self._requested.add(page)
+        generation, cursor = self._generation, self._page_cursors[page]
+
+        def on_done(result):
+            if generation != self._generation:
+                return
+            self._requested.discard(page)
+            self._add_page(page, *result)
+            self._layout()
+
+        def on_error(error):
+            # 下次滚动时重新请求
+            if generation == self._generation:
+                self._requested.discard(page)
+
+        self.loader.submit(
+            f"virtual_list_{id(self)}_{page}",
+            lambda db: self.load_page(db, cursor),
+            on_done,
+            on_error
+        )
+
+    def _evict(self, keep):
+        """丢弃最久未使用的页，只保留 CACHED_PAGES 页（当前可见的页不丢弃）"""
+        for page in list(self._pages):
+            if len(self._pages) <= max(self.CACHED_PAGES, len(keep)):
+                break
+            if page not in keep:
+                del self._pages[page]
+
+    def _record(self, index):
+        """取下标为 index 的记录，所在页已被丢弃时按游标在后台重新加载并返回 None"""
+        page = bisect.bisect_right(self._page_starts, index) - 1
+        records = self._pages.get(page)
+        if records is None:
+            self._request(page)
+            return None
+        self._pages.move_to_end(page)
+        offset = index - self._page_starts[page]
+        return records[offset] if offset < len(records) else None
+
+    def _on_scrollbar(self, *args):
+        """滚动条拖动（moveto）或点击（scroll）"""
+        if args[0] == "moveto":
+            self._scroll_to(float(args[1]) * self._content_height())
+        elif args[0] == "scroll":
+            self._scroll_to(self._top + int(args[1]) * self._stride)
+
+    def _on_wheel(self, event):
+        """鼠标滚轮（Windows/macOS 为 MouseWheel，Linux 为 Button-4/5）"""
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            step = -1
+        else:
+            step = 1
+        self._scroll_to(self._top + step * self._stride)
+        return "break"
+
+    def _bind_wheel(self, widget):
+        """为控件及其全部子控件绑定滚轮事件（滚轮事件只发送给鼠标下方的控件）"""
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            tkinter.Misc.bind(widget, sequence, self._on_wheel, add="+")
+        for child in widget.winfo_children():
+            self._bind_wheel(child)
+
+    def _count(self):
+        """滚动范围内的记录数：已知总数时用总数，否则为已发现的记录数"""
+        if self._exhausted or self._total is None:
+            return self._known
+        return max(self._total, self._known)
+
+    def _content_height(self):
+        return max(self._count() * self._stride, 1)
+
+    def _scroll_to(self, top):
+        max_top = max(self._content_height() - self._body.winfo_height(), 0)
+        top = int(min(max(top, 0), max_top))
+        if top != self._top:
+            self._top = top
+            self._layout()
+
+    def _ensure_pool(self, count):
+        """行控件池的大小随可见高度调整"""
+        while len(self._rows) < count:
+            row = ctk.CTkFrame(self._body, height=self.row_height)
+            row.pack_propagate(False)
+            handle = self.create_row(row)
+            self._bind_wheel(row)
+            self._rows.append([row, handle, None])
+        while len(self._rows) > count:
+            row, _, _ = self._rows.pop()
+            row.destroy()
+
+    def _layout(self):
+        """按当前滚动位置把行控件放到可见的记录上"""
+        if not self._generation:
+            # 尚未调用 load_first
+            return
+
+        if self._exhausted and not self._known:
+            self._empty_label.place(relx=0.5, y=20, anchor="n")
+        else:
+            self._empty_label.place_forget()
+
+        height = self._body.winfo_height()
+        if height <= 1:
+            # 尚未完成布局
+            return
+
+        first = self._top // self._stride
+        visible = math.ceil(height / self._stride) + 1
+
+        # 可见区域及预取范围内的页尚未加载过时在后台加载下一页（键集游标只能逐页向后取得），
+        # 加载完成后再次布局，必要时继续加载；途经的页在布局后丢弃，内存中的页数不随滚动距离增长
+        if not self._exhausted and first + visible + self.PREFETCH_ROWS > self._known:
+            self._request(len(self._page_starts))
+        if self._exhausted and first >= self._known:
+            # 记录总数比实际少（加载期间有记录被删除），回到末尾
+            self._top = max(self._known * self._stride - height, 0)
+            first = self._top // self._stride
+
+        self._ensure_pool(visible)
+        shown_pages = set()
+        for offset, slot in enumerate(self._rows):
+            row, handle, shown = slot
+            index = first + offset
+            record = self._record(index) if index < self._known else None
+            if record is None:
+                row.place_forget()
+                slot[2] = None
+                continue
+            shown_pages.add(bisect.bisect_right(self._page_starts, index) - 1)
+            if shown != index:
+                self.update_row(handle, record)
+                slot[2] = index
+            row.place(x=0, y=index * self._stride - self._top, relwidth=1)
+        self._evict(shown_pages)
+
+        total = self._content_height()
+        self._scrollbar.set(self._top / total, min((self._top + height) / total, 1.0))
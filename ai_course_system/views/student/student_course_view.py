@@ -4,6 +4,7 @@
 import customtkinter as ctk
 from tkinter import messagebox
 from services.course_service import CourseService
+from views.common import BackgroundLoader
 
 
 class StudentCourseView(ctk.CTkFrame):
@@ -14,7 +15,8 @@ class StudentCourseView(ctk.CTkFrame):
         self.user = user
         self.db = db
         self.course_service = CourseService(db)
-        
+        self.loader = BackgroundLoader(self)
+
         self.setup_ui()
 
     def setup_ui(self):
@@ -48,8 +50,21 @@ class StudentCourseView(ctk.CTkFrame):
         for widget in self.course_list_frame.winfo_children():
             widget.destroy()
 
-        # 获取学生的课程
-        courses = self.course_service.get_student_courses(self.user.id)
+        loading_label = ctk.CTkLabel(self.course_list_frame, text="正在加载...", font=ctk.CTkFont(size=14))
+        loading_label.pack(pady=20)
+
+        # 在后台获取学生的课程
+        self.loader.submit(
+            "courses",
+            lambda db: CourseService(db).get_student_courses(self.user.id),
+            self.show_courses,
+            lambda error: loading_label.configure(text=f"加载失败: {error}")
+        )
+
+    def show_courses(self, courses):
+        """显示课程列表"""
+        for widget in self.course_list_frame.winfo_children():
+            widget.destroy()
 
         if not courses:
             ctk.CTkLabel(
@@ -2,9 +2,13 @@
 学生数据看板视图
 """
 import customtkinter as ctk
+from services.dashboard_service import DashboardService
 from services.qa_service import QAService
 from services.quiz_service import QuizService
-from services.course_service import CourseService
+from views.common import BackgroundLoader, VirtualList
+
+# 历史记录每页条数
+PAGE_SIZE = 20
 
 
 class StudentDashboardView(ctk.CTkFrame):
@@ -14,10 +18,8 @@ class StudentDashboardView(ctk.CTkFrame):
         super().__init__(parent)
         self.user = user
         self.db = db
-        self.qa_service = QAService(db)
-        self.quiz_service = QuizService(db)
-        self.course_service = CourseService(db)
-        
+        self.loader = BackgroundLoader(self)
+
         self.setup_ui()
 
     def setup_ui(self):
@@ -34,20 +36,10 @@ class StudentDashboardView(ctk.CTkFrame):
         stats_frame = ctk.CTkFrame(self)
         stats_frame.pack(fill="x", padx=20, pady=10)
 
-        # 获取统计数据
-        courses = self.course_service.get_student_courses(self.user.id)
-        qa_records = self.qa_service.get_user_qa_history(self.user.id)
-        quiz_attempts = self.quiz_service.get_student_attempts(self.user.id)
-        completed_quizzes = [a for a in quiz_attempts if a.is_completed]
-
-        # 统计卡片
-        self.create_stat_card(stats_frame, "已选课程", str(len(courses)), 0)
-        self.create_stat_card(stats_frame, "提问次数", str(len(qa_records)), 1)
-        self.create_stat_card(stats_frame, "完成测验", str(len(completed_quizzes)), 2)
-        
-        if completed_quizzes:
-            avg_score = sum(a.score for a in completed_quizzes) / len(completed_quizzes)
-            self.create_stat_card(stats_frame, "平均分", f"{avg_score:.1f}", 3)
+        # 统计数据和历史记录的第一页在后台加载
+        self.stats_frame = stats_frame
+        self.loading_label = ctk.CTkLabel(stats_frame, text="正在加载统计数据...", font=ctk.CTkFont(size=14))
+        self.loading_label.pack(pady=20)
 
         # 详细记录区域
         details_frame = ctk.CTkFrame(self)
@@ -59,11 +51,64 @@ class StudentDashboardView(ctk.CTkFrame):
 
         # 问答历史标签
         qa_tab = tabview.add("问答历史")
-        self.show_qa_history(qa_tab, qa_records)
+        self.show_paged_history(
+            qa_tab,
+            "qa_history",
+            lambda db, cursor: QAService(db).get_user_qa_page(self.user.id, cursor=cursor, page_size=PAGE_SIZE),
+            lambda db: QAService(db).count_user_qa(self.user.id),
+            self.create_qa_row,
+            self.update_qa_row,
+            "暂无问答记录",
+            row_height=70
+        )
 
         # 测验记录标签
-        quiz_tab = tabview.add("测验记录")
-        self.show_quiz_history(quiz_tab, completed_quizzes)
+        self.quiz_tab = tabview.add("测验记录")
+
+        # 先重试批改之前AI不可用时待批改的主观题，再加载统计数据和测验记录（重试失败时照常加载）
+        self.loader.submit(
+            "regrade",
+            lambda db: QuizService(db).regrade_student_pending(self.user.id),
+            lambda remaining: self.load_quiz_data(),
+            lambda error: self.load_quiz_data()
+        )
+
+    def load_quiz_data(self):
+        """在后台加载统计数据和测验记录"""
+        self.loader.submit(
+            "summary",
+            lambda db: DashboardService(db).get_student_summary(self.user.id),
+            self.show_summary,
+            lambda error: self.loading_label.configure(text=f"加载失败: {error}")
+        )
+        self.show_paged_history(
+            self.quiz_tab,
+            "quiz_history",
+            lambda db, cursor: QuizService(db).get_completed_attempt_page(self.user.id, cursor=cursor,
+                                                                          page_size=PAGE_SIZE),
+            lambda db: QuizService(db).count_student_attempts(self.user.id, completed_only=True),
+            self.create_attempt_row,
+            self.update_attempt_row,
+            "暂无测验记录",
+            row_height=75
+        )
+
+    def show_summary(self, summary):
+        """
+        显示统计卡片
+
+        Args:
+            summary: DashboardService.get_student_summary 的返回值
+        """
+        self.loading_label.destroy()
+        self.create_stat_card(self.stats_frame, "已选课程", str(summary['course_count']), 0)
+        self.create_stat_card(self.stats_frame, "提问次数", str(summary['question_count']), 1)
+        self.create_stat_card(self.stats_frame, "完成测验", str(summary['completed_quizzes']), 2)
+
+        if summary['completed_quizzes']:
+            # 待批改的题目未计入得分
+            title = f"平均分（{summary['pending_count']}题待批改）" if summary['pending_count'] else "平均分"
+            self.create_stat_card(self.stats_frame, title, f"{summary['average_score']:.1f}", 3)
 
     def create_stat_card(self, parent, title, value, column):
         """创建统计卡片"""
@@ -83,78 +128,93 @@ class StudentDashboardView(ctk.CTkFrame):
             font=ctk.CTkFont(size=24, weight="bold")
         ).pack(pady=(5, 10))
 
-    def show_qa_history(self, parent, records):
-        """显示问答历史"""
-        if not records:
-            ctk.CTkLabel(
-                parent,
-                text="暂无问答记录",
-                font=ctk.CTkFont(size=14)
-            ).pack(pady=20)
-            return
-
-        scroll_frame = ctk.CTkScrollableFrame(parent)
-        scroll_frame.pack(fill="both", expand=True, padx=10, pady=10)
-
-        for record in records[:20]:  # 显示最近20条
-            card = ctk.CTkFrame(scroll_frame)
-            card.pack(fill="x", pady=5, padx=5)
-
-            # 时间和课程
-            info_label = ctk.CTkLabel(
-                card,
-                text=f"{record.created_at.strftime('%Y-%m-%d %H:%M')} | {record.course.name}",
-                font=ctk.CTkFont(size=10)
-            )
-            info_label.pack(anchor="w", padx=10, pady=(5, 0))
-
-            # 问题
-            q_label = ctk.CTkLabel(
-                card,
-                text=f"问: {record.question[:100]}...",
-                font=ctk.CTkFont(size=12),
-                wraplength=700,
-                justify="left"
-            )
-            q_label.pack(anchor="w", padx=10, pady=2)
-
-    def show_quiz_history(self, parent, attempts):
-        """显示测验历史"""
-        if not attempts:
-            ctk.CTkLabel(
-                parent,
-                text="暂无测验记录",
-                font=ctk.CTkFont(size=14)
-            ).pack(pady=20)
-            return
-
-        scroll_frame = ctk.CTkScrollableFrame(parent)
-        scroll_frame.pack(fill="both", expand=True, padx=10, pady=10)
-
-        for attempt in attempts:
-            card = ctk.CTkFrame(scroll_frame)
-            card.pack(fill="x", pady=5, padx=5)
-
-            # 测验信息
-            info_frame = ctk.CTkFrame(card)
-            info_frame.pack(side="left", fill="both", expand=True, padx=10, pady=10)
-
-            ctk.CTkLabel(
-                info_frame,
-                text=attempt.quiz.title,
-                font=ctk.CTkFont(size=14, weight="bold")
-            ).pack(anchor="w")
-
-            ctk.CTkLabel(
-                info_frame,
-                text=f"完成时间: {attempt.submitted_at.strftime('%Y-%m-%d %H:%M')}",
-                font=ctk.CTkFont(size=11)
-            ).pack(anchor="w")
-
-            # 分数
-            score_label = ctk.CTkLabel(
-                card,
-                text=f"{attempt.score:.1f}/{attempt.total_points}",
-                font=ctk.CTkFont(size=16, weight="bold")
-            )
-            score_label.pack(side="right", padx=20, pady=10)
+    def show_paged_history(self, parent, name, load_page, count, create_row, update_row, empty_text, row_height):
+        """
+        以虚拟滚动列表显示历史记录，第一页和记录总数在后台加载，滚动时在后台按需加载其他页
+
+        Args:
+            parent: 父控件
+            name: 后台任务名
+            load_page: 加载一页记录的函数 load_page(数据库会话, 游标) -> (记录列表, 下一页游标)
+            count: 统计记录总数的函数 count(数据库会话)，用于设置滚动范围
+            create_row: 创建行控件的函数 create_row(行容器) -> 控件句柄
+            update_row: 用记录更新行控件的函数 update_row(控件句柄, 记录)
+            empty_text: 没有记录时的提示
+            row_height: 行高
+        """
+        history_list = VirtualList(parent, self.loader, load_page, create_row, update_row,
+                                   row_height=row_height, empty_text=empty_text)
+        history_list.pack(fill="both", expand=True, padx=10, pady=10)
+
+        loading_label = ctk.CTkLabel(parent, text="正在加载...", font=ctk.CTkFont(size=14))
+        loading_label.place(relx=0.5, rely=0.3, anchor="center")
+
+        def show(result):
+            first_page, total = result
+            loading_label.destroy()
+            history_list.load_first(first_page, total)
+
+        self.loader.submit(
+            name,
+            lambda db: (load_page(db, None), count(db)),
+            show,
+            lambda error: loading_label.configure(text=f"加载失败: {error}")
+        )
+
+    def create_qa_row(self, row):
+        """创建问答记录行"""
+        # 时间和课程
+        info_label = ctk.CTkLabel(row, text="", font=ctk.CTkFont(size=10))
+        info_label.pack(anchor="w", padx=10, pady=(5, 0))
+
+        # 问题
+        q_label = ctk.CTkLabel(
+            row,
+            text="",
+            font=ctk.CTkFont(size=12),
+            wraplength=700,
+            justify="left"
+        )
+        q_label.pack(anchor="w", padx=10, pady=2)
+        return info_label, q_label
+
+    def update_qa_row(self, labels, record):
+        """用问答记录更新行"""
+        info_label, q_label = labels
+        info_label.configure(text=f"{record.created_at.strftime('%Y-%m-%d %H:%M')} | {record.course.name}")
+        q_label.configure(text=f"问: {record.question[:100]}...")
+
+    def create_attempt_row(self, row):
+        """创建测验记录行"""
+        # 测验信息
+        info_frame = ctk.CTkFrame(row)
+        info_frame.pack(side="left", fill="both", expand=True, padx=10, pady=10)
+
+        title_label = ctk.CTkLabel(
+            info_frame,
+            text="",
+            font=ctk.CTkFont(size=14, weight="bold")
+        )
+        title_label.pack(anchor="w")
+
+        time_label = ctk.CTkLabel(info_frame, text="", font=ctk.CTkFont(size=11))
+        time_label.pack(anchor="w")
+
+        # 分数
+        score_label = ctk.CTkLabel(
+            row,
+            text="",
+            font=ctk.CTkFont(size=16, weight="bold")
+        )
+        score_label.pack(side="right", padx=20, pady=10)
+        return title_label, time_label, score_label
+
+    def update_attempt_row(self, labels, attempt):
+        """用测验记录更新行"""
+        title_label, time_label, score_label = labels
+        title_label.configure(text=attempt.quiz.title)
+        time = f"完成时间: {attempt.submitted_at.strftime('%Y-%m-%d %H:%M')}"
+        if attempt.pending_count:
+            time += f" | {attempt.pending_count}题待批改，未计入得分"
+        time_label.configure(text=time)
+        score_label.configure(text=f"{attempt.score:.1f}/{attempt.total_points}")
@@ -4,6 +4,8 @@
 import customtkinter as ctk
 from tkinter import messagebox
 from services.qa_service import QAService
+from models.database import session_scope
+from views.common import PagedLoader, StreamRenderer
 import threading
 
 
@@ -90,25 +92,27 @@ class StudentQAView(ctk.CTkFrame):
         if not self.current_course:
             return
 
-        # 获取历史记录
-        records = self.qa_service.get_user_qa_history(self.user.id, self.current_course.id)
+        # 历史记录放在独立容器中，新的问答追加在其后
+        history_frame = ctk.CTkFrame(self.chat_frame, fg_color="transparent")
+        history_frame.pack(fill="x")
 
-        if not records:
-            ctk.CTkLabel(
-                self.chat_frame,
-                text="暂无问答记录，开始提问吧！",
-                font=ctk.CTkFont(size=14)
-            ).pack(pady=20)
-            return
+        course_id = self.current_course.id
+
+        def render(parent, record):
+            self.add_message("问", record.question, is_user=True, parent=parent)
+            self.add_message("答", record.answer, is_user=False, parent=parent)
 
-        # 显示历史记录（最近10条）
-        for record in records[:10]:
-            self.add_message("问", record.question, is_user=True)
-            self.add_message("答", record.answer, is_user=False)
+        # 每次只加载最近的10条，点击"加载更多"继续加载更早的记录
+        PagedLoader(
+            history_frame,
+            lambda cursor: self.qa_service.get_user_qa_page(self.user.id, course_id, cursor, page_size=10),
+            render,
+            empty_text="暂无问答记录，开始提问吧！"
+        ).load_first()
 
-    def add_message(self, label, text, is_user=True):
+    def add_message(self, label, text, is_user=True, parent=None):
         """添加消息"""
-        msg_frame = ctk.CTkFrame(self.chat_frame)
+        msg_frame = ctk.CTkFrame(parent or self.chat_frame)
         msg_frame.pack(fill="x", pady=5, padx=5)
 
         # 标签
@@ -132,6 +136,7 @@ class StudentQAView(ctk.CTkFrame):
             justify="left"
         )
         content_label.pack(anchor="w", padx=10, pady=5)
+        return content_label
 
     def ask_question(self):
         """提问"""
@@ -149,30 +154,39 @@ class StudentQAView(ctk.CTkFrame):
         self.ask_btn.configure(state="disabled", text="思考中...")
         self.question_entry.delete("1.0", "end")
 
-        # 显示问题
+        # 显示问题，并预先放置回答控件用于逐步显示
         self.add_message("问", question, is_user=True)
+        answer_label = self.add_message("答", "...", is_user=False)
+
+        def on_update(text):
+            answer_label.configure(text=text)
+            self.chat_frame._parent_canvas.yview_moveto(1.0)
+
+        def on_done(text):
+            self.ask_btn.configure(state="normal", text="提问")
 
-        # 在后台线程中调用AI
+        def on_error(error):
+            # 不完整的回答不保留
+            answer_label.configure(text="（回答失败）")
+            messagebox.showerror("错误", f"AI服务错误: {str(error)}")
+            self.ask_btn.configure(state="normal", text="提问")
+
+        renderer = StreamRenderer(self, on_update, on_done, on_error)
+        # ORM对象属于界面线程的会话，只把ID传给后台线程
+        user_id, course_id = self.user.id, self.current_course.id
+
+        # 在后台线程中流式获取回答，界面在主线程按批次刷新
         def get_answer():
             try:
-                result = self.qa_service.ask_question(
-                    self.user.id,
-                    self.current_course.id,
-                    question
-                )
-                # 在主线程中更新UI
-                self.after(0, lambda: self.show_answer(result['answer']))
+                # 后台线程使用独立的数据库会话
+                with session_scope() as db:
+                    for delta in QAService(db).ask_question_stream(user_id, course_id, question):
+                        renderer.feed(delta)
+                renderer.finish()
             except Exception as e:
-                self.after(0, lambda: messagebox.showerror("错误", f"AI服务错误: {str(e)}"))
-            finally:
-                self.after(0, lambda: self.ask_btn.configure(state="normal", text="提问"))
+                renderer.fail(e)
 
         thread = threading.Thread(target=get_answer)
         thread.daemon = True
         thread.start()
-
-    def show_answer(self, answer):
-        """显示答案"""
-        self.add_message("答", answer, is_user=False)
-        # 滚动到底部
-        self.chat_frame._parent_canvas.yview_moveto(1.0)
+        renderer.start()
@@ -3,7 +3,9 @@
 """
 import customtkinter as ctk
 from tkinter import messagebox
+from models.database import session_scope
 from services.quiz_service import QuizService
+import threading
 import json
 
 
@@ -153,6 +155,9 @@ class StudentQuizView(ctk.CTkFrame):
         for i, question in enumerate(quiz.questions, 1):
             self.create_question_widget(questions_frame, i, question, answers)
 
+        # 批改进度
+        progress_label = ctk.CTkLabel(quiz_window, text="", font=ctk.CTkFont(size=12))
+
         # 提交按钮
         def submit():
             # 检查是否全部作答
@@ -161,17 +166,68 @@ class StudentQuizView(ctk.CTkFrame):
                 if not result:
                     return
 
-            # 提交答案
-            try:
-                for question_id, answer in answers.items():
-                    self.quiz_service.submit_answer(attempt.id, question_id, answer)
-                
-                self.quiz_service.complete_quiz(attempt.id)
-                messagebox.showinfo("成功", "测验已提交！")
-                quiz_window.destroy()
-                self.load_quizzes()
-            except Exception as e:
-                messagebox.showerror("错误", f"提交失败: {str(e)}")
+            submit_btn.configure(state="disabled", text="批改中...")
+            progress_label.pack(before=submit_btn)
+            progress = {'graded': 0, 'total': len(answers), 'finished': False, 'error': None, 'pending': 0}
+
+            def on_progress(graded, total):
+                progress['graded'], progress['total'] = graded, total
+
+            # 后台批改并保存（使用独立的数据库会话，只传入ID和答案的副本）
+            attempt_id, submitted = attempt.id, dict(answers)
+
+            def grade():
+                try:
+                    with session_scope() as db:
+                        quiz_service = QuizService(db)
+                        records = quiz_service.submit_answers(attempt_id, submitted, on_progress)
+                        quiz_service.complete_quiz(attempt_id)
+                        progress['pending'] = sum(1 for record in records if record.points_earned is None)
+                except Exception as e:
+                    progress['error'] = e
+                finally:
+                    progress['finished'] = True
+
+            # AI服务不可用时未能批改的主观题，可以重试
+            def regrade():
+                try:
+                    with session_scope() as db:
+                        progress['pending'] = QuizService(db).regrade_pending(attempt_id, on_progress)
+                except Exception:
+                    # 答案已经保存，重试失败时这些题目仍为待批改，再次询问是否重试
+                    pass
+                finally:
+                    progress['finished'] = True
+
+            def start(target):
+                progress['finished'] = False
+                thread = threading.Thread(target=target)
+                thread.daemon = True
+                thread.start()
+                poll()
+
+            def poll():
+                if not quiz_window.winfo_exists():
+                    return
+                progress_label.configure(text=f"正在批改: {progress['graded']}/{progress['total']}")
+                if not progress['finished']:
+                    quiz_window.after(100, poll)
+                elif progress['error'] is not None:
+                    messagebox.showerror("错误", f"提交失败: {str(progress['error'])}")
+                    submit_btn.configure(state="normal", text="提交测验")
+                    progress_label.pack_forget()
+                elif progress['pending'] and messagebox.askretrycancel(
+                        "提示", f"测验已提交，但有{progress['pending']}道主观题暂时无法批改（AI服务不可用），"
+                                f"已记为待批改，暂不计入得分（查看学习记录时会自动重试）。是否现在重试批改？", parent=quiz_window):
+                    progress['graded'], progress['total'] = 0, progress['pending']
+                    start(regrade)
+                else:
+                    if not progress['pending']:
+                        messagebox.showinfo("成功", "测验已提交！")
+                    quiz_window.destroy()
+                    self.load_quizzes()
+
+            start(grade)
 
         submit_btn = ctk.CTkButton(
             quiz_window,
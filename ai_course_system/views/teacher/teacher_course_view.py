@@ -5,6 +5,9 @@ import customtkinter as ctk
 from tkinter import messagebox, filedialog
 from services.course_service import CourseService
 from services.document_service import DocumentService
+from views.common import BackgroundLoader
+from models.database import session_scope
+import threading
 import os
 
 
@@ -17,7 +20,8 @@ class TeacherCourseView(ctk.CTkFrame):
         self.db = db
         self.course_service = CourseService(db)
         self.doc_service = DocumentService()
-        
+        self.loader = BackgroundLoader(self)
+
         self.setup_ui()
 
     def setup_ui(self):
@@ -52,8 +56,26 @@ class TeacherCourseView(ctk.CTkFrame):
         for widget in self.course_list_frame.winfo_children():
             widget.destroy()
 
-        # 获取教师的课程
-        courses = self.course_service.get_teacher_courses(self.user.id)
+        loading_label = ctk.CTkLabel(self.course_list_frame, text="正在加载...", font=ctk.CTkFont(size=14))
+        loading_label.pack(pady=20)
+
+        # 在后台获取教师的课程
+        self.loader.submit(
+            "courses",
+            lambda db: CourseService(db).get_teacher_courses_with_counts(self.user.id),
+            self.show_courses,
+            lambda error: loading_label.configure(text=f"加载失败: {error}")
+        )
+
+    def show_courses(self, courses):
+        """
+        显示课程列表
+
+        Args:
+            courses: (课程, 资料数) 列表
+        """
+        for widget in self.course_list_frame.winfo_children():
+            widget.destroy()
 
         if not courses:
             ctk.CTkLabel(
@@ -64,10 +86,10 @@ class TeacherCourseView(ctk.CTkFrame):
             return
 
         # 显示课程
-        for course in courses:
-            self.create_course_card(course)
+        for course, doc_count in courses:
+            self.create_course_card(course, doc_count)
 
-    def create_course_card(self, course):
+    def create_course_card(self, course, doc_count):
         """创建课程卡片"""
         card = ctk.CTkFrame(self.course_list_frame)
         card.pack(fill="x", pady=5, padx=5)
@@ -90,7 +112,6 @@ class TeacherCourseView(ctk.CTkFrame):
             ).pack(anchor="w", pady=2)
 
         # 文档数量
-        doc_count = len(course.documents)
         ctk.CTkLabel(
             info_frame,
             text=f"课程资料: {doc_count}个",
@@ -108,6 +129,13 @@ class TeacherCourseView(ctk.CTkFrame):
             command=lambda c=course: self.upload_document(c)
         ).pack(pady=2)
 
+        ctk.CTkButton(
+            btn_frame,
+            text="批量导入",
+            width=100,
+            command=lambda c=course: self.bulk_upload_documents(c)
+        ).pack(pady=2)
+
         ctk.CTkButton(
             btn_frame,
             text="查看详情",
@@ -183,21 +211,112 @@ class TeacherCourseView(ctk.CTkFrame):
         if not filepath:
             return
 
-        try:
-            # 读取文件
-            with open(filepath, 'rb') as f:
-                file_data = f.read()
+        dialog = ctk.CTkToplevel(self)
+        dialog.title("上传文档")
+        dialog.geometry("360x120")
+        dialog.transient(self.winfo_toplevel())
+        progress_label = ctk.CTkLabel(dialog, text="正在复制文件...", font=ctk.CTkFont(size=14))
+        progress_label.pack(expand=True)
+
+        progress = {'copied': 0, 'total': 0, 'stage': 'copy', 'finished': False, 'error': None}
+        course_id, teacher_id = course.id, self.user.id
+        filename = os.path.basename(filepath)
+
+        def on_progress(copied, total):
+            progress['copied'], progress['total'] = copied, total
+
+        # 后台分块复制并提取文本（使用独立的数据库会话），界面不被阻塞
+        def do_upload():
+            try:
+                # 保存文件（相同内容只存一份）
+                saved_path, content_hash = self.doc_service.store_file(filepath, filename, course_id, on_progress)
+                progress['stage'] = 'extract'
+                with session_scope() as db:
+                    CourseService(db).upload_document(course_id, teacher_id, saved_path, filename, content_hash)
+            except Exception as e:
+                progress['error'] = e
+            finally:
+                progress['finished'] = True
 
-            # 保存文件
-            filename = os.path.basename(filepath)
-            saved_path = self.doc_service.save_uploaded_file(file_data, filename, course.id)
+        # 在视图上轮询：用户关闭进度对话框后仍会在完成时提示结果并刷新列表
+        def poll():
+            if not self.winfo_exists():
+                return
+            if dialog.winfo_exists():
+                if progress['stage'] == 'extract':
+                    progress_label.configure(text="正在提取文本...")
+                elif progress['total']:
+                    percent = progress['copied'] * 100 // progress['total']
+                    progress_label.configure(text=f"正在复制文件: {percent}%")
+            if not progress['finished']:
+                self.after(100, poll)
+                return
+            if dialog.winfo_exists():
+                dialog.destroy()
+            if progress['error'] is not None:
+                messagebox.showerror("错误", f"上传失败: {str(progress['error'])}")
+            else:
+                messagebox.showinfo("成功", "文档上传成功")
+                self.load_courses()
 
-            # 上传文档
-            self.course_service.upload_document(course.id, self.user.id, saved_path, filename)
-            messagebox.showinfo("成功", "文档上传成功")
-            self.load_courses()
-        except Exception as e:
-            messagebox.showerror("错误", f"上传失败: {str(e)}")
+        thread = threading.Thread(target=do_upload)
+        thread.daemon = True
+        thread.start()
+        poll()
+
+    def bulk_upload_documents(self, course):
+        """批量导入目录中的全部文档"""
+        directory = filedialog.askdirectory(title="选择包含课程文档的文件夹")
+        if not directory:
+            return
+
+        dialog = ctk.CTkToplevel(self)
+        dialog.title("批量导入")
+        dialog.geometry("360x120")
+        dialog.transient(self.winfo_toplevel())
+        progress_label = ctk.CTkLabel(dialog, text="正在准备导入...", font=ctk.CTkFont(size=14))
+        progress_label.pack(expand=True)
+
+        progress = {'done': 0, 'total': 0, 'finished': False, 'result': None, 'error': None}
+        course_id, teacher_id = course.id, self.user.id
+
+        def on_progress(done, total):
+            progress['done'], progress['total'] = done, total
+
+        # 后台导入（使用独立的数据库会话）
+        def do_import():
+            try:
+                with session_scope() as db:
+                    documents = CourseService(db).bulk_upload_documents(course_id, teacher_id, [directory], on_progress)
+                    progress['result'] = len(documents)
+            except Exception as e:
+                progress['error'] = e
+            finally:
+                progress['finished'] = True
+
+        # 在视图上轮询：用户关闭进度对话框后仍会在完成时提示结果并刷新列表
+        def poll():
+            if not self.winfo_exists():
+                return
+            if dialog.winfo_exists() and progress['total']:
+                progress_label.configure(text=f"正在提取文本: {progress['done']}/{progress['total']}")
+            if not progress['finished']:
+                self.after(100, poll)
+                return
+            if dialog.winfo_exists():
+                dialog.destroy()
+            if progress['error'] is not None:
+                messagebox.showerror("错误", f"导入失败: {str(progress['error'])}")
+            elif not progress['result']:
+                messagebox.showinfo("提示", "文件夹中没有支持的文档（pdf、docx、txt）")
+            else:
+                messagebox.showinfo("成功", f"已导入{progress['result']}个文档")
+                self.load_courses()
+
+        thread = threading.Thread(target=do_import)
+        thread.daemon = True
+        thread.start()
+        poll()
 
     def show_course_detail(self, course):
         """显示课程详情"""
@@ -232,7 +351,7 @@ class TeacherCourseView(ctk.CTkFrame):
         docs_frame = ctk.CTkScrollableFrame(dialog, height=250)
         docs_frame.pack(fill="both", expand=True, padx=20, pady=10)
 
-        documents = course.documents
+        documents = self.course_service.get_course_documents(course.id)
         if documents:
             for doc in documents:
                 doc_card = ctk.CTkFrame(docs_frame)
@@ -244,6 +363,15 @@ class TeacherCourseView(ctk.CTkFrame):
                     font=ctk.CTkFont(size=12)
                 ).pack(side="left", padx=10, pady=5)
 
+                ctk.CTkButton(
+                    doc_card,
+                    text="删除",
+                    width=60,
+                    fg_color="red",
+                    hover_color="darkred",
+                    command=lambda d=doc: self.delete_document(d, dialog)
+                ).pack(side="right", padx=10, pady=5)
+
                 ctk.CTkLabel(
                     doc_card,
                     text=f"上传时间: {doc.uploaded_at.strftime('%Y-%m-%d')}",
@@ -256,6 +384,18 @@ class TeacherCourseView(ctk.CTkFrame):
                 font=ctk.CTkFont(size=12)
             ).pack(pady=20)
 
+    def delete_document(self, document, dialog):
+        """删除文档"""
+        result = messagebox.askyesno("确认", f"确定要删除文档 '{document.filename}' 吗？", parent=dialog)
+        if result:
+            try:
+                self.course_service.delete_document(document.id, self.user.id)
+                messagebox.showinfo("成功", "文档已删除", parent=dialog)
+                dialog.destroy()
+                self.load_courses()
+            except Exception as e:
+                messagebox.showerror("错误", f"删除失败: {str(e)}", parent=dialog)
+
     def delete_course(self, course):
         """删除课程"""
         result = messagebox.askyesno("确认", f"确定要删除课程 '{course.name}' 吗？\n此操作不可恢复！")
@@ -2,9 +2,8 @@
 教师数据统计视图
 """
 import customtkinter as ctk
-from services.course_service import CourseService
-from services.qa_service import QAService
-from services.quiz_service import QuizService
+from services.dashboard_service import DashboardService
+from views.common import BackgroundLoader
 
 
 class TeacherDashboardView(ctk.CTkFrame):
@@ -14,10 +13,8 @@ class TeacherDashboardView(ctk.CTkFrame):
         super().__init__(parent)
         self.user = user
         self.db = db
-        self.course_service = CourseService(db)
-        self.qa_service = QAService(db)
-        self.quiz_service = QuizService(db)
-        
+        self.loader = BackgroundLoader(self)
+
         self.setup_ui()
 
     def setup_ui(self):
@@ -30,33 +27,36 @@ class TeacherDashboardView(ctk.CTkFrame):
         )
         title_label.pack(pady=20)
 
+        # 统计数据在后台加载，加载完成前显示提示
+        self.loading_label = ctk.CTkLabel(self, text="正在加载统计数据...", font=ctk.CTkFont(size=14))
+        self.loading_label.pack(pady=20)
+
+        self.loader.submit(
+            "summary",
+            lambda db: DashboardService(db).get_teacher_summary(self.user.id),
+            self.show_summary,
+            self.show_error
+        )
+
+    def show_summary(self, summary):
+        """
+        显示统计数据
+
+        Args:
+            summary: DashboardService.get_teacher_summary 的返回值
+        """
+        self.loading_label.destroy()
+        courses = summary['courses']
+
         # 统计卡片区域
         stats_frame = ctk.CTkFrame(self)
         stats_frame.pack(fill="x", padx=20, pady=10)
 
-        # 获取统计数据
-        courses = self.course_service.get_teacher_courses(self.user.id)
-        
-        total_students = 0
-        total_quizzes = 0
-        total_questions = 0
-        
-        for course in courses:
-            total_students += len(course.enrollments)
-            quizzes = self.quiz_service.get_course_quizzes(course.id)
-            total_quizzes += len(quizzes)
-            
-            try:
-                qa_records = self.qa_service.get_course_qa_history(course.id, self.user.id)
-                total_questions += len(qa_records)
-            except:
-                pass
-
         # 统计卡片
-        self.create_stat_card(stats_frame, "创建课程", str(len(courses)), 0)
-        self.create_stat_card(stats_frame, "学生总数", str(total_students), 1)
-        self.create_stat_card(stats_frame, "生成试卷", str(total_quizzes), 2)
-        self.create_stat_card(stats_frame, "学生提问", str(total_questions), 3)
+        self.create_stat_card(stats_frame, "创建课程", str(summary['course_count']), 0)
+        self.create_stat_card(stats_frame, "学生总数", str(summary['total_students']), 1)
+        self.create_stat_card(stats_frame, "生成试卷", str(summary['total_quizzes']), 2)
+        self.create_stat_card(stats_frame, "学生提问", str(summary['total_questions']), 3)
 
         # 课程详情
         details_frame = ctk.CTkScrollableFrame(self, label_text="课程详情")
@@ -74,6 +74,10 @@ class TeacherDashboardView(ctk.CTkFrame):
         for course in courses:
             self.create_course_detail_card(details_frame, course)
 
+    def show_error(self, error):
+        """显示加载失败"""
+        self.loading_label.configure(text=f"加载失败: {error}")
+
     def create_stat_card(self, parent, title, value, column):
         """创建统计卡片"""
         card = ctk.CTkFrame(parent)
@@ -93,14 +97,20 @@ class TeacherDashboardView(ctk.CTkFrame):
         ).pack(pady=(5, 10))
 
     def create_course_detail_card(self, parent, course):
-        """创建课程详情卡片"""
+        """
+        创建课程详情卡片
+
+        Args:
+            parent: 父控件
+            course: DashboardService 返回的课程统计字典
+        """
         card = ctk.CTkFrame(parent)
         card.pack(fill="x", pady=5, padx=5)
 
         # 课程名称
         ctk.CTkLabel(
             card,
-            text=course.name,
+            text=course['name'],
             font=ctk.CTkFont(size=16, weight="bold")
         ).pack(anchor="w", padx=10, pady=(10, 5))
 
@@ -108,9 +118,9 @@ class TeacherDashboardView(ctk.CTkFrame):
         info_frame = ctk.CTkFrame(card)
         info_frame.pack(fill="x", padx=10, pady=5)
 
-        student_count = len(course.enrollments)
-        doc_count = len(course.documents)
-        quiz_count = len(self.quiz_service.get_course_quizzes(course.id))
+        student_count = course['student_count']
+        doc_count = course['document_count']
+        quiz_count = course['quiz_count']
 
         ctk.CTkLabel(
             info_frame,
@@ -120,8 +130,8 @@ class TeacherDashboardView(ctk.CTkFrame):
 
         # 学生列表
         if student_count > 0:
-            students_text = "学生: " + ", ".join([e.student.real_name for e in course.enrollments[:10]])
-            if student_count > 10:
+            students_text = "学生: " + ", ".join(course['student_names'])
+            if student_count > len(course['student_names']):
                 students_text += f" 等{student_count}人"
             
             ctk.CTkLabel(
@@ -4,7 +4,9 @@
 import customtkinter as ctk
 from tkinter import messagebox
 from services.qa_service import QAService
+from models.database import session_scope
 from services.course_service import CourseService
+from views.common import BackgroundLoader, StreamRenderer, VirtualList
 import threading
 
 
@@ -17,6 +19,7 @@ class TeacherQAView(ctk.CTkFrame):
         self.db = db
         self.qa_service = QAService(db)
         self.course_service = CourseService(db)
+        self.loader = BackgroundLoader(self)
         
         self.setup_ui()
 
@@ -112,26 +115,43 @@ class TeacherQAView(ctk.CTkFrame):
             )
             q_label.pack(anchor="w", padx=10, pady=5)
 
+            # 回答控件先放在主线程中创建，流式内容按批次刷新
+            a_label = ctk.CTkLabel(
+                chat_frame,
+                text="答: ...",
+                font=ctk.CTkFont(size=12),
+                wraplength=600,
+                justify="left"
+            )
+            a_label.pack(anchor="w", padx=10, pady=5)
+
+            def on_update(text):
+                a_label.configure(text=f"答: {text}")
+
+            def on_error(error):
+                # 不完整的回答不保留
+                a_label.configure(text="答: （回答失败）")
+                messagebox.showerror("错误", f"AI服务错误: {str(error)}")
+
+            renderer = StreamRenderer(chat_frame, on_update, on_error=on_error)
+            # ORM对象属于界面线程的会话，只把ID传给后台线程
+            user_id, course_id = self.user.id, current_course.id
+
             # 后台获取答案
             def get_answer():
                 try:
-                    result = self.qa_service.ask_question(self.user.id, current_course.id, question)
-                    answer = result['answer']
-                    
-                    a_label = ctk.CTkLabel(
-                        chat_frame,
-                        text=f"答: {answer}",
-                        font=ctk.CTkFont(size=12),
-                        wraplength=600,
-                        justify="left"
-                    )
-                    a_label.pack(anchor="w", padx=10, pady=5)
+                    # 后台线程使用独立的数据库会话
+                    with session_scope() as db:
+                        for delta in QAService(db).ask_question_stream(user_id, course_id, question):
+                            renderer.feed(delta)
+                    renderer.finish()
                 except Exception as e:
-                    messagebox.showerror("错误", f"AI服务错误: {str(e)}")
+                    renderer.fail(e)
 
             thread = threading.Thread(target=get_answer)
             thread.daemon = True
             thread.start()
+            renderer.start()
 
         ask_btn = ctk.CTkButton(
             input_frame,
@@ -185,15 +205,64 @@ class TeacherQAView(ctk.CTkFrame):
         )
         refresh_btn.pack(side="left", padx=10)
 
-        # 问题列表
-        qa_list_frame = ctk.CTkScrollableFrame(parent)
-        qa_list_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        # 复用统计
+        stats_label = ctk.CTkLabel(
+            top_frame,
+            text="",
+            font=ctk.CTkFont(size=12),
+            text_color="gray"
+        )
+        stats_label.pack(side="left", padx=10)
 
-        def load_student_questions(course_name):
-            # 清空列表
-            for widget in qa_list_frame.winfo_children():
-                widget.destroy()
+        # 问题列表（虚拟滚动，滚动到末尾时加载下一页）
+        def create_row(row):
+            # 学生和时间
+            info_label = ctk.CTkLabel(row, text="", font=ctk.CTkFont(size=10))
+            info_label.pack(anchor="w", padx=10, pady=(5, 0))
 
+            # 问题
+            q_label = ctk.CTkLabel(
+                row,
+                text="",
+                font=ctk.CTkFont(size=12),
+                wraplength=700,
+                justify="left"
+            )
+            q_label.pack(anchor="w", padx=10, pady=2)
+
+            # 答案（截断显示）
+            a_label = ctk.CTkLabel(
+                row,
+                text="",
+                font=ctk.CTkFont(size=11),
+                wraplength=700,
+                justify="left",
+                text_color="gray"
+            )
+            a_label.pack(anchor="w", padx=10, pady=(0, 5))
+            return info_label, q_label, a_label
+
+        def update_row(labels, record):
+            info_label, q_label, a_label = labels
+            info_label.configure(
+                text=f"{record.user.real_name} | {record.created_at.strftime('%Y-%m-%d %H:%M')}"
+                     + (" | 复用相似问题回答" if record.reused_from_id else "")
+            )
+            q_label.configure(text=f"问: {record.question[:100]}")
+            a_label.configure(text=f"答: {record.answer[:200]}...")
+
+        qa_list = VirtualList(
+            parent,
+            self.loader,
+            lambda db, cursor: ([], None),
+            create_row,
+            update_row,
+            row_height=120,
+            empty_text="暂无学生提问"
+        )
+        qa_list.pack(fill="both", expand=True, padx=10, pady=10)
+
+        def load_student_questions(course_name):
             # 获取当前课程
             current_course = None
             for c in courses:
@@ -204,53 +273,31 @@ class TeacherQAView(ctk.CTkFrame):
             if not current_course:
                 return
 
-            # 获取学生提问
-            try:
-                records = self.qa_service.get_course_qa_history(current_course.id, self.user.id)
-                
-                if not records:
-                    ctk.CTkLabel(
-                        qa_list_frame,
-                        text="暂无学生提问",
-                        font=ctk.CTkFont(size=14)
-                    ).pack(pady=20)
-                    return
-
-                for record in records[:50]:  # 显示最近50条
-                    card = ctk.CTkFrame(qa_list_frame)
-                    card.pack(fill="x", pady=5, padx=5)
-
-                    # 学生和时间
-                    info_label = ctk.CTkLabel(
-                        card,
-                        text=f"{record.user.real_name} | {record.created_at.strftime('%Y-%m-%d %H:%M')}",
-                        font=ctk.CTkFont(size=10)
-                    )
-                    info_label.pack(anchor="w", padx=10, pady=(5, 0))
-
-                    # 问题
-                    q_label = ctk.CTkLabel(
-                        card,
-                        text=f"问: {record.question}",
-                        font=ctk.CTkFont(size=12),
-                        wraplength=700,
-                        justify="left"
-                    )
-                    q_label.pack(anchor="w", padx=10, pady=2)
-
-                    # 答案（可折叠）
-                    a_label = ctk.CTkLabel(
-                        card,
-                        text=f"答: {record.answer[:200]}...",
-                        font=ctk.CTkFont(size=11),
-                        wraplength=700,
-                        justify="left",
-                        text_color="gray"
-                    )
-                    a_label.pack(anchor="w", padx=10, pady=(0, 5))
-
-            except Exception as e:
-                messagebox.showerror("错误", f"加载失败: {str(e)}")
+            # 在后台获取复用统计和第一页学生提问（切换课程时未完成的加载被取代）
+            course_id, teacher_id = current_course.id, self.user.id
+            load_page = lambda db, cursor: QAService(db).get_course_qa_page(
+                course_id, teacher_id, cursor, page_size=50
+            )
+
+            def load(db):
+                stats = QAService(db).get_course_reuse_stats(course_id, teacher_id)
+                return stats, load_page(db, None)
+
+            def on_done(result):
+                stats, first_page = result
+                stats_label.configure(
+                    text=f"共{stats['total_questions']}条提问，相似问题复用回答{stats['reused_answers']}条"
+                )
+                qa_list.load_page = load_page
+                qa_list.load_first(first_page, stats['total_questions'])
+
+            stats_label.configure(text="正在加载...")
+            self.loader.submit(
+                "student_questions",
+                load,
+                on_done,
+                lambda error: messagebox.showerror("错误", f"加载失败: {str(error)}")
+            )
 
         # 初始加载
         if course_names:
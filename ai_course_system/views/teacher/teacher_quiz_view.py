@@ -5,6 +5,7 @@ import customtkinter as ctk
 from tkinter import messagebox
 from services.quiz_service import QuizService
 from services.course_service import CourseService
+from views.common import BackgroundLoader
 
 
 class TeacherQuizView(ctk.CTkFrame):
@@ -16,7 +17,9 @@ class TeacherQuizView(ctk.CTkFrame):
         self.db = db
         self.quiz_service = QuizService(db)
         self.course_service = CourseService(db)
-        
+        self.loader = BackgroundLoader(self)
+        self.courses = []
+
         self.setup_ui()
 
     def setup_ui(self):
@@ -39,8 +42,21 @@ class TeacherQuizView(ctk.CTkFrame):
         )
         create_btn.pack(side="right")
 
+        # 课程列表在后台加载
+        self.loading_label = ctk.CTkLabel(self, text="正在加载...", font=ctk.CTkFont(size=14))
+        self.loading_label.pack(pady=20)
+        self.loader.submit(
+            "courses",
+            lambda db: CourseService(db).get_teacher_courses(self.user.id),
+            self.show_course_selector,
+            lambda error: self.loading_label.configure(text=f"加载失败: {error}")
+        )
+
+    def show_course_selector(self, courses):
+        """显示课程选择和试卷列表"""
+        self.loading_label.destroy()
+
         # 课程选择
-        courses = self.course_service.get_teacher_courses(self.user.id)
         if not courses:
             ctk.CTkLabel(
                 self,
@@ -96,8 +112,27 @@ class TeacherQuizView(ctk.CTkFrame):
         if not current_course:
             return
 
-        # 获取试卷
-        quizzes = self.quiz_service.get_course_quizzes(current_course.id)
+        loading_label = ctk.CTkLabel(self.quiz_list_frame, text="正在加载...", font=ctk.CTkFont(size=14))
+        loading_label.pack(pady=20)
+
+        # 在后台获取试卷（切换课程时未完成的加载被取代）
+        course_id = current_course.id
+        self.loader.submit(
+            "quizzes",
+            lambda db: QuizService(db).get_course_quizzes_with_counts(course_id),
+            self.show_quizzes,
+            lambda error: loading_label.configure(text=f"加载失败: {error}")
+        )
+
+    def show_quizzes(self, quizzes):
+        """
+        显示试卷列表
+
+        Args:
+            quizzes: (试卷, 题目数) 列表
+        """
+        for widget in self.quiz_list_frame.winfo_children():
+            widget.destroy()
 
         if not quizzes:
             ctk.CTkLabel(
@@ -108,10 +143,10 @@ class TeacherQuizView(ctk.CTkFrame):
             return
 
         # 显示试卷
-        for quiz in quizzes:
-            self.create_quiz_card(quiz)
+        for quiz, question_count in quizzes:
+            self.create_quiz_card(quiz, question_count)
 
-    def create_quiz_card(self, quiz):
+    def create_quiz_card(self, quiz, question_count):
         """创建试卷卡片"""
         card = ctk.CTkFrame(self.quiz_list_frame)
         card.pack(fill="x", pady=5, padx=5)
@@ -134,7 +169,7 @@ class TeacherQuizView(ctk.CTkFrame):
 
         ctk.CTkLabel(
             info_frame,
-            text=f"题目数: {len(quiz.questions)}  时限: {quiz.time_limit}分钟",
+            text=f"题目数: {question_count}  时限: {quiz.time_limit}分钟",
             font=ctk.CTkFont(size=11)
         ).pack(anchor="w")
 
@@ -236,20 +271,64 @@ class TeacherQuizView(ctk.CTkFrame):
         ).pack(pady=20)
 
     def show_statistics(self, quiz):
-        """显示试卷统计"""
-        try:
-            stats = self.quiz_service.get_quiz_statistics(quiz.id, self.user.id)
-            
-            msg = f"""试卷统计信息
+        """在后台统计试卷，统计前先重试批改之前AI不可用时待批改的主观题"""
+        quiz_id, teacher_id = quiz.id, self.user.id
 
-试卷名称: {quiz.title}
+        def load(db):
+            quiz_service = QuizService(db)
+            try:
+                quiz_service.regrade_quiz_pending(quiz_id, teacher_id)
+            except Exception:
+                # 重试失败时这些题目仍为待批改，统计中单独列出
+                db.rollback()
+            return quiz_service.get_quiz_statistics(quiz_id, teacher_id)
+
+        self.loader.submit(
+            f"statistics_{quiz_id}",
+            load,
+            lambda stats: self.show_statistics_dialog(quiz, stats),
+            lambda error: messagebox.showerror("错误", f"获取统计失败: {str(error)}")
+        )
+
+    def show_statistics_dialog(self, quiz, stats):
+        """显示试卷统计"""
+        pending = f"\n待批改答案: {stats['pending_answers']}（AI批改暂不可用，未计入得分）" if stats['pending_answers'] else ""
+        msg = f"""试卷名称: {quiz.title}
 知识点: {quiz.knowledge_point}
 
-参与人数: {stats['total_attempts']}
+参与人数: {stats['total_attempts']}{pending}
 平均分: {stats['average_score']:.1f}
+中位数: {stats['median_score']:.1f}
+标准差: {stats['std_dev']:.1f}
 最高分: {stats['max_score']:.1f}
 最低分: {stats['min_score']:.1f}
+
+分数段分布（得分率）:
 """
-            messagebox.showinfo("统计信息", msg)
-        except Exception as e:
-            messagebox.showerror("错误", f"获取统计失败: {str(e)}")
+        peak = max(bucket['count'] for bucket in stats['histogram']) or 1
+        for bucket in stats['histogram']:
+            bar = "█" * round(bucket['count'] / peak * 30)
+            msg += f"{bucket['range']:>8}  {bar} {bucket['count']}\n"
+
+        msg += "\n各题正确率:\n"
+        for i, question in enumerate(stats['question_stats'], 1):
+            text = question['question_text']
+            if len(text) > 30:
+                text = text[:30] + "..."
+            if question['average_points'] is None:
+                # 全部答案待评分
+                msg += f"第{i}题 待评分（{question['pending']}份） {text}\n"
+                continue
+            pending = f"，{question['pending']}份待评分" if question['pending'] else ""
+            msg += (f"第{i}题 {question['correct_rate'] * 100:.0f}%"
+                    f"（平均{question['average_points']:.1f}/{question['points']:.0f}分{pending}） {text}\n")
+
+        dialog = ctk.CTkToplevel(self)
+        dialog.title(f"统计信息 - {quiz.title}")
+        dialog.geometry("600x550")
+        dialog.transient(self.winfo_toplevel())
+
+        stats_text = ctk.CTkTextbox(dialog, font=ctk.CTkFont(size=13))
+        stats_text.pack(fill="both", expand=True, padx=20, pady=20)
+        stats_text.insert("1.0", msg)
+        stats_text.configure(state="disabled")